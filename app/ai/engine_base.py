@@ -17,3 +17,8 @@ class AIEngineBase(ABC):
         根据观察到的局面，返回要出的牌（可以为空列表 => PASS）。
         """
         raise NotImplementedError
+
+    def reset(self) -> None:
+        """
+        新的一局开始前调用：清掉跨决策保留的内部状态（如循环网络的隐藏状态）。无状态引擎什么都不用做。
+        """
@@ -8,7 +8,9 @@
 
 import os
 import torch
+from app.ai.rl.encoding import encode_state
 from app.ai.rl.model_ppo import PPOPolicy
+from app.utils.tracing import span
 
 
 class DeepRL_AI:
@@ -33,31 +35,15 @@ class DeepRL_AI:
         self.model.eval()
         self.lstm_state = None
 
+    def reset(self):
+        """新的一局开始：LSTM 隐藏状态只在同一局、同一座位的连续决策之间延续"""
+        self.lstm_state = None
+
     # ---------------------------------------------------------
-    # 状态编码（必须与训练时一致）
+    # 状态编码：直接用训练共用的编码器（app.ai.rl.encoding），保证与训练一致
     # ---------------------------------------------------------
     def encode_state(self, obs):
-        vec = []
-
-        # 1) 我方手牌
-        hand = sorted(obs.my_hand, key=lambda c: (c.rank, c.suit))
-        for c in hand:
-            vec.append(c.rank / 17.0)
-        while len(vec) < 20:
-            vec.append(0.0)
-
-        # 2) last_non_pass
-        last = obs.last_non_pass
-        if last:
-            for c in last.cards:
-                vec.append(c.rank / 17.0)
-            while len(vec) < 40:
-                vec.append(0.0)
-        else:
-            while len(vec) < 40:
-                vec.append(0.0)
-
-        return torch.tensor([vec], dtype=torch.float32, device=self.device)
+        return torch.from_numpy(encode_state(obs)).unsqueeze(0).to(self.device)
 
     # ---------------------------------------------------------
     # 选择动作（真实对战）
@@ -71,13 +57,13 @@ class DeepRL_AI:
         if not moves:
             return []  # 只能 PASS
 
-        state = self.encode_state(obs)
+        with span("encode"):
+            state = self.encode_state(obs)
 
-        with torch.no_grad():
+        with span("forward"), torch.no_grad():
             logits, value, self.lstm_state = self.model.forward(state, self.lstm_state)
-
-        # logits: (1, 128)
-        logits_np = logits.cpu().numpy()[0]
+            # logits: (1, 128)
+            logits_np = logits.cpu().numpy()[0]
 
         # 截断到当前合法动作数量
         logits_np = logits_np[: len(moves)]
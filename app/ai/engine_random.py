@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+随机 AI：在合法动作中均匀随机选择一个（评测基线用）
+"""
+
+import random
+from typing import List, Optional
+
+from app.ai.engine_base import AIEngineBase
+from app.game.dealer_moves import get_valid_moves_from_obs
+from app.models.card import Card, Observation
+
+
+class RandomAIEngine(AIEngineBase):
+    def __init__(self, device: str = "cpu", seed: Optional[int] = None) -> None:
+        super().__init__(device)
+        self.rng = random.Random(seed)
+
+    def choose_action(self, obs: Observation) -> List[Card]:
+        moves = get_valid_moves_from_obs(obs)
+        if not moves:
+            return []
+        return moves[self.rng.randrange(len(moves))]
@@ -20,6 +20,7 @@ from typing import List
 from app.ai.engine_deeprl import DeepRL_AI
 from app.game.rules import DouDiZhuRules
 from app.models.card import Card
+from app.utils.tracing import span
 
 logger = logging.getLogger("doudizhu")
 
@@ -62,7 +63,8 @@ class SmartAI:
         logger.info(f"SmartAI({self.name}) thinking... hand={hand_str}")
 
         # 生成合法动作列表（和训练时规则保持一致：单张 / 对子 / 三张 / 炸弹）
-        moves = self._generate_legal_moves(obs)
+        with span("movegen"):
+            moves = self._generate_legal_moves(obs)
 
         if not moves:
             # 没有任何合法动作，只能 PASS
@@ -72,14 +74,19 @@ class SmartAI:
         chosen = self.rl_ai.choose_action(obs, moves)
 
         # 保险起见，如果模型返回了一个不在 moves 里的动作，就用第一个合法动作兜底
-        if chosen not in moves:
-            logger.warning(
-                f"SmartAI({self.name}) 模型返回了非法动作，使用 fallback 第一个合法动作"
-            )
-            chosen = moves[0]
+        with span("fallback"):
+            if chosen not in moves:
+                logger.warning(
+                    f"SmartAI({self.name}) 模型返回了非法动作，使用 fallback 第一个合法动作"
+                )
+                chosen = moves[0]
 
         return chosen
 
+    def reset(self):
+        """新的一局开始：清掉深度模型的 LSTM 隐藏状态"""
+        self.rl_ai.reset()
+
     # ---------------------------------------------------------
     # 生成合法动作（与 RL 训练环境中 env_doudizhu 的逻辑保持一致）
     # ---------------------------------------------------------
@@ -159,3 +166,6 @@ class SmartAIEngine:
 
     def choose_action(self, obs):
         return self.smart_ai.choose_action(obs)
+
+    def reset(self):
+        self.smart_ai.reset()
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Actor / Learner 解耦训练管线
+- 每个 actor 子进程在本进程内跑若干个 DouDiZhuEnv，并持有一份 CPU 上的策略副本
+- actor 按 (T, N) 收集一段轨迹后放入本地队列，learner 进程从队列中取数据更新
+- learner 定期把新权重广播给所有 actor
+- actor 使用的策略可能落后 learner 若干版本，learner 用 V-trace（截断重要性采样）修正策略滞后
+- actor 用 spawn 启动：learner 进程里可能已经初始化了 CUDA，fork 出来的子进程不能再用 CUDA
+"""
+
+import logging
+import multiprocessing as mp
+import queue
+import random
+import time
+
+import numpy as np
+import torch
+
+from app.ai.rl.encoding import STATE_DIM
+from app.ai.rl.env_doudizhu import DouDiZhuEnv
+from app.ai.rl.model_ppo import PPOPolicy
+
+
+def _state_dict_to_numpy(policy):
+    return {k: v.detach().cpu().numpy() for k, v in policy.state_dict().items()}
+
+
+def _load_numpy_state_dict(policy, weights):
+    policy.load_state_dict({k: torch.from_numpy(v) for k, v in weights.items()})
+
+
+# ---------------------------------------------------------
+# actor 子进程入口
+# ---------------------------------------------------------
+def actor_worker(
+    actor_id,
+    num_envs,
+    rollout_steps,
+    compact,
+    policy_kwargs,
+    traj_queue,
+    weight_queue,
+    stop_event,
+    seed,
+):
+    """
+    每个 actor：num_envs 个环境 + 一份 CPU 策略。
+    每收集 rollout_steps 步，就把 (T, N) 轨迹放进 traj_queue。
+    """
+    logging.disable(logging.CRITICAL)
+    torch.set_num_threads(1)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    envs = [DouDiZhuEnv(compact=compact, seed=seed * 1000 + i) for i in range(num_envs)]
+
+    policy = PPOPolicy(**policy_kwargs, device="cpu")
+    policy.eval()
+
+    # 等待 learner 的第一份权重
+    version, weights = weight_queue.get()
+    _load_numpy_state_dict(policy, weights)
+
+    obs = np.stack([env.reset()[0] for env in envs])
+
+    T, N = rollout_steps, num_envs
+    while not stop_event.is_set():
+        # 只保留最新的一份权重
+        latest = None
+        while True:
+            try:
+                latest = weight_queue.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            version, weights = latest
+            _load_numpy_state_dict(policy, weights)
+
+        states = np.zeros((T, N, STATE_DIM), dtype=obs.dtype)
+        actions = np.zeros((T, N), dtype=np.int64)
+        rewards = np.zeros((T, N), dtype=np.float32)
+        logprobs = np.zeros((T, N), dtype=np.float32)
+        dones = np.zeros((T, N), dtype=np.float32)
+        episodes = 0
+        timings = {"forward": 0.0, "env_step": 0.0}
+
+        for t in range(T):
+            t0 = time.perf_counter()
+            with torch.no_grad():
+                logits, _, _ = policy.forward(torch.from_numpy(obs))
+                dist = torch.distributions.Categorical(logits=logits)
+                action = dist.sample()
+                logprob = dist.log_prob(action)
+
+            states[t] = obs
+            actions[t] = action.numpy()
+            logprobs[t] = logprob.numpy()
+            t1 = time.perf_counter()
+            timings["forward"] += t1 - t0
+
+            for i, env in enumerate(envs):
+                next_obs, reward, done, _ = env.step(int(actions[t, i]))
+                if done:
+                    # 结束后自动重置一局
+                    next_obs, _ = env.reset()
+                    episodes += 1
+                obs[i] = next_obs
+                rewards[t, i] = reward
+                dones[t, i] = done
+            timings["env_step"] += time.perf_counter() - t1
+
+        traj = {
+            "actor_id": actor_id,
+            "policy_version": version,
+            "states": states,
+            "actions": actions,
+            "rewards": rewards,
+            "logprobs": logprobs,
+            "dones": dones,
+            "last_obs": obs.copy(),
+            "episodes": episodes,
+            "env_steps": T * N,
+            "timings": timings,
+            "sent_at": time.time(),  # learner 据此计算队列/IPC 延迟
+        }
+
+        # 队列满时等待（对 actor 形成背压，间接限制策略滞后）
+        while not stop_event.is_set():
+            try:
+                traj_queue.put(traj, timeout=1.0)
+                break
+            except queue.Full:
+                continue
+
+
+class ActorPool:
+    """
+    管理所有 actor 子进程：
+    - broadcast(policy, version)：把 learner 当前权重发给每个 actor
+    - get()：取一段轨迹
+    """
+
+    def __init__(
+        self,
+        num_actors=4,
+        envs_per_actor=8,
+        rollout_steps=128,
+        compact=False,
+        policy_kwargs=None,
+        queue_size=None,
+        seed=0,
+    ):
+        self.num_actors = num_actors
+        self.envs_per_actor = envs_per_actor
+        self.rollout_steps = rollout_steps
+
+        ctx = mp.get_context("spawn")
+        self.traj_queue = ctx.Queue(maxsize=queue_size or 2 * num_actors)
+        # 权重队列不限长：actor 每段 rollout 开始时会一次性取空，只用最新的一份
+        self.weight_queues = [ctx.Queue() for _ in range(num_actors)]
+        self.stop_event = ctx.Event()
+        self.processes = []
+
+        for actor_id in range(num_actors):
+            p = ctx.Process(
+                target=actor_worker,
+                args=(
+                    actor_id,
+                    envs_per_actor,
+                    rollout_steps,
+                    compact,
+                    policy_kwargs or {},
+                    self.traj_queue,
+                    self.weight_queues[actor_id],
+                    self.stop_event,
+                    seed + actor_id,
+                ),
+            )
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+
+    # ---------------------------------------------------------
+    def broadcast(self, policy, version):
+        weights = _state_dict_to_numpy(policy)
+        for q in self.weight_queues:
+            q.put((version, weights))
+
+    # ---------------------------------------------------------
+    def get(self, timeout=None):
+        return self.traj_queue.get(timeout=timeout)
+
+    # ---------------------------------------------------------
+    def close(self):
+        self.stop_event.set()
+
+        # 排空队列，避免子进程卡在 put 上
+        try:
+            while True:
+                self.traj_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        for p in self.processes:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+
+
+# ---------------------------------------------------------
+# 把多段轨迹沿环境维拼接成 (T, sum(N)) 的一个 batch
+# ---------------------------------------------------------
+def merge_trajectories(trajs):
+    keys = ("states", "actions", "rewards", "logprobs", "dones")
+    batch = {k: np.concatenate([tr[k] for tr in trajs], axis=1) for k in keys}
+    batch["last_obs"] = np.concatenate([tr["last_obs"] for tr in trajs], axis=0)
+    return batch
+
+
+# ---------------------------------------------------------
+# V-trace：用截断重要性权重修正 actor 与 learner 的策略差异
+# ---------------------------------------------------------
+def vtrace_batch(policy, batch, gamma=0.99, lam=0.95, rho_bar=1.0, c_bar=1.0, device=None):
+    """
+    返回展平后的 (states, actions, learner_logprobs, advantages, value_targets)，
+    可直接交给 PPOAgent.update。
+    - learner_logprobs 作为 PPO 的“旧策略”对数概率（以 learner 当前策略为近端中心）
+    - advantages 已乘以截断重要性权重 rho，并做了归一化
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    states = batch["states"]
+    T, N = states.shape[:2]
+    n = T * N
+
+    states_t = torch.from_numpy(states.reshape(n, -1)).to(device)
+    actions_t = torch.from_numpy(batch["actions"].reshape(n)).to(device)
+
+    with torch.no_grad():
+        logits, values, _ = policy.forward(states_t)
+        dist = torch.distributions.Categorical(logits=logits)
+        learner_logprobs = dist.log_prob(actions_t)
+        _, last_values, _ = policy.forward(torch.from_numpy(batch["last_obs"]).to(device))
+
+    values = values.cpu().numpy().reshape(T, N)
+    last_values = last_values.cpu().numpy()
+    log_rhos = learner_logprobs.cpu().numpy().reshape(T, N) - batch["logprobs"]
+    ratios = np.exp(log_rhos)
+    rhos = np.minimum(ratios, rho_bar)
+    cs = lam * np.minimum(ratios, c_bar)
+
+    rewards = batch["rewards"]
+    not_done = 1.0 - batch["dones"]
+
+    next_values = np.empty_like(values)
+    next_values[:-1] = values[1:]
+    next_values[-1] = last_values
+
+    deltas = rhos * (rewards + gamma * not_done * next_values - values)
+
+    # vs_t - V_t 沿时间倒序递推，在环境维上向量化
+    vs_minus_v = np.zeros_like(values)
+    acc = np.zeros(N, dtype=np.float32)
+    for t in reversed(range(T)):
+        acc = deltas[t] + gamma * not_done[t] * cs[t] * acc
+        vs_minus_v[t] = acc
+    vs = values + vs_minus_v
+
+    next_vs = np.empty_like(vs)
+    next_vs[:-1] = vs[1:]
+    next_vs[-1] = last_values
+    advantages = rhos * (rewards + gamma * not_done * next_vs - values)
+
+    adv = advantages.reshape(n).astype(np.float32)
+    adv = (adv - adv.mean()) / (adv.std() + 1e-8)
+
+    return (
+        states_t,
+        actions_t,
+        learner_logprobs,
+        torch.from_numpy(adv).to(device),
+        torch.from_numpy(vs.reshape(n).astype(np.float32)).to(device),
+    )
@@ -2,78 +2,113 @@
 """
 PPO Rollout Buffer
 用于存储一个 rollout 内的样本，并计算 GAE 优势和 returns。
+
+存储布局为 (T, N)：
+- T = rollout 步数（ROLLOUT_STEPS）
+- N = 并行环境数（NUM_ENVS）
+每个环境的轨迹互不交叉，GAE 沿时间维倒序、在环境维上向量化计算。
+
+compact=True 时状态按 uint8 rank 编码存储（见 encoding.py），
+get() 返回的 states 也是 uint8，由 PPOPolicy.forward 解码为浮点。
 """
 
 import numpy as np
 import torch
 
+from app.ai.rl.encoding import RANK_SCALE
+
 
 class RolloutBuffer:
-    def __init__(self, buffer_size, state_dim, action_dim):
-        self.buffer_size = buffer_size
+    def __init__(self, rollout_steps, num_envs, state_dim, action_dim, compact=False):
+        self.rollout_steps = rollout_steps
+        self.num_envs = num_envs
+        self.buffer_size = rollout_steps * num_envs
         self.state_dim = state_dim
         self.action_dim = action_dim
+        self.compact = compact
 
-        self.states = np.zeros((buffer_size, state_dim), dtype=np.float32)
-        self.actions = np.zeros((buffer_size,), dtype=np.int64)
-        self.rewards = np.zeros((buffer_size,), dtype=np.float32)
-        self.logprobs = np.zeros((buffer_size,), dtype=np.float32)
-        self.values = np.zeros((buffer_size,), dtype=np.float32)
-        self.dones = np.zeros((buffer_size,), dtype=np.float32)
+        state_dtype = np.uint8 if compact else np.float32
+        self.states = np.zeros((rollout_steps, num_envs, state_dim), dtype=state_dtype)
+        self.actions = np.zeros((rollout_steps, num_envs), dtype=np.int64)
+        self.rewards = np.zeros((rollout_steps, num_envs), dtype=np.float32)
+        self.logprobs = np.zeros((rollout_steps, num_envs), dtype=np.float32)
+        self.values = np.zeros((rollout_steps, num_envs), dtype=np.float32)
+        self.dones = np.zeros((rollout_steps, num_envs), dtype=np.float32)
+
+        self.advantages = np.zeros((rollout_steps, num_envs), dtype=np.float32)
+        self.returns = np.zeros((rollout_steps, num_envs), dtype=np.float32)
 
         self.ptr = 0
-        self.path_start_idx = 0
-
-    def store(self, state, action, reward, value, logprob, done):
-        self.states[self.ptr] = state
-        self.actions[self.ptr] = action
-        self.rewards[self.ptr] = reward
-        self.values[self.ptr] = value
-        self.logprobs[self.ptr] = logprob
-        self.dones[self.ptr] = done
+
+    # ---------------------------------------------------------
+    # 一次写入所有环境在当前时间步的数据（每个参数形状为 (N, ...)）
+    # ---------------------------------------------------------
+    def store_batch(self, states, actions, rewards, values, logprobs, dones):
+        t = self.ptr
+        if self.compact and states.dtype != np.uint8:
+            # 环境返回的是 rank / 17 浮点，还原成整数 rank 编码
+            states = np.rint(states * RANK_SCALE)
+        self.states[t] = states
+        self.actions[t] = actions
+        self.rewards[t] = rewards
+        self.values[t] = values
+        self.logprobs[t] = logprobs
+        self.dones[t] = dones
         self.ptr += 1
 
     def is_full(self):
-        return self.ptr >= self.buffer_size
+        return self.ptr >= self.rollout_steps
+
+    def reset(self):
+        """清空指针，准备下一轮收集（数组原地复用，不重新分配）。"""
+        self.ptr = 0
 
-    def finish_path(self, last_value=0.0, gamma=0.99, lam=0.95):
+    def finish_path(self, last_values=0.0, gamma=0.99, lam=0.95):
         """
         使用 GAE 计算优势函数。
+        last_values: 每个环境最后一个 next_obs 的价值估计，形状 (N,) 或标量
+        dones[t, i] 表示环境 i 在第 t 步后结束（随后自动 reset），此时不向后自举。
         """
-        path_end = self.ptr
-        rewards = self.rewards[self.path_start_idx : path_end]
-        values = self.values[self.path_start_idx : path_end]
-        dones = self.dones[self.path_start_idx : path_end]
+        T = self.ptr
+        rewards = self.rewards[:T]
+        values = self.values[:T]
+        not_done = 1.0 - self.dones[:T]
 
-        values = np.append(values, last_value)
+        next_values = np.empty_like(values)
+        next_values[:-1] = values[1:]
+        next_values[-1] = last_values
 
-        deltas = rewards + gamma * values[1:] * (1 - dones) - values[:-1]
-        adv = np.zeros_like(deltas)
+        deltas = rewards + gamma * next_values * not_done - values
 
-        last_adv = 0
-        for t in reversed(range(len(deltas))):
-            last_adv = deltas[t] + gamma * lam * (1 - dones[t]) * last_adv
+        adv = self.advantages
+        last_adv = np.zeros(self.num_envs, dtype=np.float32)
+        for t in reversed(range(T)):
+            last_adv = deltas[t] + gamma * lam * not_done[t] * last_adv
             adv[t] = last_adv
 
-        returns = adv + values[:-1]
-
-        self.advantages = adv
-        self.returns = returns
-        self.path_start_idx = self.ptr
+        np.add(adv[:T], values, out=self.returns[:T])
 
-    def get(self):
+    def get(self, device=None):
         """
-        返回所有样本，并归一化优势
+        返回所有样本（展平为 (T*N, ...)），并归一化优势。
+        CPU 上直接返回共享内存的 torch.from_numpy 视图，不做拷贝。
         """
-        adv = self.advantages
+        T = self.ptr
+        n = T * self.num_envs
+
+        adv = self.advantages[:T].reshape(n)
         adv = (adv - adv.mean()) / (adv.std() + 1e-8)
 
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if device is None:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        return (
-            torch.tensor(self.states, dtype=torch.float32, device=device),
-            torch.tensor(self.actions, dtype=torch.long, device=device),
-            torch.tensor(self.logprobs, dtype=torch.float32, device=device),
-            torch.tensor(adv, dtype=torch.float32, device=device),
-            torch.tensor(self.returns, dtype=torch.float32, device=device),
+        arrays = (
+            self.states[:T].reshape(n, self.state_dim),
+            self.actions[:T].reshape(n),
+            self.logprobs[:T].reshape(n),
+            adv,
+            self.returns[:T].reshape(n),
+        )
+        return tuple(
+            torch.from_numpy(a).to(device, non_blocking=True) for a in arrays
         )
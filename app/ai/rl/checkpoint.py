@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+训练断点（可恢复的完整训练状态）
+- 内容：模型参数、Adam 优化器状态、步数/局数等计数器、随机数状态
+- 主线程只做一次 CPU 快照，真正的 torch.save 在后台线程完成，不阻塞训练循环
+- 先写临时文件再 os.replace 原子替换，进程中途被杀也不会留下半个文件
+- 只保留最近 keep_last 个完整断点
+"""
+
+import glob
+import os
+import queue
+import random
+import re
+import threading
+
+import numpy as np
+import torch
+
+
+def _snapshot(obj):
+    """递归复制到 CPU，保证后台线程写盘时训练可以继续修改原张量。"""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_snapshot(v) for v in obj]
+    if isinstance(obj, tuple):
+        return tuple(_snapshot(v) for v in obj)
+    return obj
+
+
+def capture_rng_state():
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointManager:
+    """
+    完整训练断点管理：
+        ckpt = CheckpointManager("model/run")
+        ckpt.save_async(policy, optimizer, counters)
+        path = ckpt.latest()
+        data = ckpt.load(path)
+    """
+
+    FILE_PATTERN = re.compile(r"ppo_run_(\d+)\.pt$")
+
+    def __init__(self, directory="model/run", keep_last=3):
+        self.directory = directory
+        self.keep_last = keep_last
+        os.makedirs(directory, exist_ok=True)
+
+        # 同一时间最多一个待写断点：上一个还没写完时，新的保存会等待（背压）
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------------------------
+    def path_for(self, step):
+        return os.path.join(self.directory, f"ppo_run_{step}.pt")
+
+    def list_checkpoints(self):
+        """按 step 升序返回所有完整断点路径。"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "ppo_run_*.pt")):
+            m = self.FILE_PATTERN.search(path)
+            if m:
+                found.append((int(m.group(1)), path))
+        return [p for _, p in sorted(found)]
+
+    def latest(self):
+        paths = self.list_checkpoints()
+        return paths[-1] if paths else None
+
+    # ---------------------------------------------------------
+    def save_async(self, policy, optimizer, counters, step=None, extra_files=None):
+        """
+        counters: dict，例如 {"global_step": ..., "episode_count": ...}
+        step: 文件名中的编号，默认用 counters["global_step"]
+        extra_files: {path: obj}，顺带写出的附加文件（例如只含 policy 参数的推理用 checkpoint）
+        """
+        if self._error is not None:
+            raise RuntimeError("checkpoint writer failed") from self._error
+
+        if step is None:
+            step = counters["global_step"]
+
+        payload = {
+            "policy": _snapshot(policy.state_dict()),
+            "optimizer": _snapshot(optimizer.state_dict()),
+            "counters": dict(counters),
+            "rng": capture_rng_state(),
+        }
+        files = {self.path_for(step): payload}
+        for path, obj in (extra_files or {}).items():
+            files[path] = _snapshot(obj)
+
+        self._queue.put(files)
+
+    def load(self, path=None, map_location="cpu"):
+        if path is None:
+            path = self.latest()
+        if path is None:
+            return None
+        return torch.load(path, map_location=map_location, weights_only=False)
+
+    def close(self):
+        """等待所有待写断点落盘。"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("checkpoint writer failed") from self._error
+
+    # ---------------------------------------------------------
+    # 后台写盘
+    # ---------------------------------------------------------
+    def _writer_loop(self):
+        while True:
+            files = self._queue.get()
+            if files is None:
+                break
+            try:
+                for path, obj in files.items():
+                    self._atomic_save(obj, path)
+                self._prune()
+            except Exception as e:  # 记录下来，由主线程下一次调用时抛出
+                self._error = e
+
+    @staticmethod
+    def _atomic_save(obj, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _prune(self):
+        if not self.keep_last:
+            return
+        for path in self.list_checkpoints()[: -self.keep_last]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
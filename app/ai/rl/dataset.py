@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""
+回放 -> 训练样本分片（监督预训练 / 离线分析用）
+
+流水线：
+    .ddzr 回放（线上对局归档 + arena --record 自对弈）
+      -> 在裁判上逐手重放，每个决策点用共享编码器（encoding.py）编码
+      -> 定长 NumPy 分片 shard-00000.npz ...（+ manifest.json）
+      -> ShardDataset（torch IterableDataset）按 worker 切分分片、洗牌缓冲后流式读出
+
+每条样本（一个决策点）：
+    states    uint8 (STATE_DIM,)      rank 编码，与 RolloutBuffer(compact=True) 相同
+    legal     uint8 (ACTION_DIM / 8,) 合法动作掩码（np.packbits），读出时解包成 bool (ACTION_DIM,)
+    actions   uint8                   实际出牌在候选列表里的下标
+    outcomes  int8                    出牌方所在一方最终 +1 赢 / -1 输
+    seats     uint8                   出牌方座位（PLAYER_IDS 下标）
+动作空间与 PPO 训练一致：策略输出的第 i 个 logit 对应 DouDiZhuEnv.generate_legal_moves 的第 i 个候选，
+没有全局固定的动作表，所以掩码就是“前 len(候选) 个有效”。候选生成器覆盖不到的出牌
+（顺子、三带、有牌可压时主动 PASS 等）无法表示成下标，这些决策点跳过并计数。
+
+- 构建按回放文件的 chunk 分任务，多进程并行；主进程攒满 shard_size 条就写一个分片（先写 .tmp 再改名），
+  每次构建剩下不满一个分片的样本单独成为最后一个分片
+- 同一个输出目录可以反复构建：manifest 记下已经处理过的回放文件，新归档的文件接着往后编号；
+  构建中途失败时删掉本次写出的分片、不更新 manifest，重跑不会重复收录
+- 读取时内存里最多只有“一个分片 + 洗牌缓冲”，几百万条样本也不需要一次性装进内存
+
+示例：
+    python -m app.ai.rl.dataset build data/replays/*.ddzr --out data/shards
+    python -m app.ai.rl.dataset info data/shards
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+from app.ai.rl.encoding import STATE_DIM, encode_state_codes
+from app.ai.rl.env_doudizhu import DouDiZhuEnv
+from app.game.constants import PLAYER_IDS
+from app.game.replay import NO_WINNER, ReplayReader, expand_paths
+
+
+ACTION_DIM = 128            # 与 PPOPolicy 策略头输出维度一致
+SHARD_SIZE = 65536          # 每个分片的样本数（最后一个分片可能不满）
+SHUFFLE_BUFFER = 65536      # 读取时洗牌缓冲的样本数
+TASK_GAMES = 256            # 构建时每个任务编码的局数（一个 chunk 拆成多个任务，小文件也能并行）
+MANIFEST_NAME = "manifest.json"
+SHARD_PATTERN = "shard-{:05d}.npz"
+
+FIELDS = ("states", "legal", "actions", "outcomes", "seats")
+_MASK_BYTES = ACTION_DIM // 8
+_SEAT = {pid: i for i, pid in enumerate(PLAYER_IDS)}
+
+
+# ---------------------------------------------------------
+# 单局 -> 样本
+# ---------------------------------------------------------
+def _move_key(cards) -> Tuple[int, ...]:
+    # 编码只看 rank，同 rank 不同花色的出牌视为同一个动作
+    return tuple(sorted(c.rank for c in cards))
+
+
+def encode_game(game, env: DouDiZhuEnv, out: Dict[str, list]) -> Tuple[int, int]:
+    """
+    在 env.dealer 上重放一局，把每个决策点追加进 out（各字段一个 list）。
+    返回 (样本数, 跳过的决策点数)；未结束的对局不产生样本，出现不合法出牌时抛 ValueError。
+    """
+    if game.winner == NO_WINNER:
+        return 0, 0
+    dealer = env.dealer
+    dealer.restore_game(game.deck(), game.landlord_id)
+
+    start = len(out["actions"])
+    skipped = 0
+    for pid, cards in game.moves():
+        obs = dealer.get_observation(pid)
+        candidates = env.generate_legal_moves(obs)
+        key = _move_key(cards)
+        index = next((i for i, m in enumerate(candidates) if _move_key(m) == key), None)
+        if index is None or index >= ACTION_DIM:
+            skipped += 1
+        else:
+            mask = np.zeros(ACTION_DIM, dtype=np.uint8)
+            mask[: min(len(candidates), ACTION_DIM)] = 1
+            out["states"].append(encode_state_codes(obs))
+            out["legal"].append(np.packbits(mask))
+            out["actions"].append(index)
+            out["seats"].append(_SEAT[pid])
+
+        ok, err = dealer.play_cards(pid, cards)
+        if not ok:
+            del out["states"][start:], out["legal"][start:], out["actions"][start:], out["seats"][start:]
+            raise ValueError(f"illegal move in replay: {pid} {err}")
+
+    state = dealer.state
+    landlord_won = state.winner_side == "landlord"
+    for seat in out["seats"][start:]:
+        is_landlord = PLAYER_IDS[seat] == state.landlord_id
+        out["outcomes"].append(1 if is_landlord == landlord_won else -1)
+    return len(out["actions"]) - start, skipped
+
+
+def _to_arrays(out: Dict[str, list]) -> Dict[str, np.ndarray]:
+    n = len(out["actions"])
+    return {
+        "states": np.array(out["states"], dtype=np.uint8).reshape(n, STATE_DIM),
+        "legal": np.array(out["legal"], dtype=np.uint8).reshape(n, _MASK_BYTES),
+        "actions": np.array(out["actions"], dtype=np.uint8),
+        "outcomes": np.array(out["outcomes"], dtype=np.int8),
+        "seats": np.array(out["seats"], dtype=np.uint8),
+    }
+
+
+# ---------------------------------------------------------
+# 构建：worker 进程
+# ---------------------------------------------------------
+_env: Optional[DouDiZhuEnv] = None
+
+
+def _init_worker():
+    # 裁判每一手都会打 INFO 日志，批量重放时关掉
+    logging.disable(logging.CRITICAL)
+    torch.set_num_threads(1)
+
+
+def _encode_task(path: str, chunk: int, start: int, stop: int):
+    """编码一个回放 chunk 里的第 [start, stop) 局，返回 (arrays, stats)"""
+    global _env
+    if _env is None:
+        _env = DouDiZhuEnv(compact=True)
+    # 每个任务各自打开、用完即关：worker 不会随着回放文件数累积 fd 和 mmap（读索引只是读文件尾）
+    with ReplayReader(path) as reader:
+        games = reader.chunk(chunk)[start:stop]
+
+    out = {name: [] for name in FIELDS}
+    stats = {"games": 0, "unfinished": 0, "invalid": 0, "decisions": 0, "skipped": 0}
+    for game in games:
+        stats["games"] += 1
+        if game.winner == NO_WINNER:
+            stats["unfinished"] += 1
+            continue
+        try:
+            samples, skipped = encode_game(game, _env, out)
+        except ValueError:
+            stats["invalid"] += 1
+            continue
+        stats["decisions"] += samples + skipped
+        stats["skipped"] += skipped
+    return _to_arrays(out), stats
+
+
+# ---------------------------------------------------------
+# 构建：分片写入
+# ---------------------------------------------------------
+class ShardWriter:
+    """把样本攒成定长分片写进 out_dir，并维护 manifest.json"""
+
+    def __init__(self, out_dir, shard_size: int = SHARD_SIZE):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = load_manifest(self.out_dir) or {
+            "state_dim": STATE_DIM,
+            "action_dim": ACTION_DIM,
+            "shard_size": shard_size,
+            "rows": 0,
+            "shards": [],
+            "sources": [],
+            "stats": {},
+        }
+        if self.manifest["action_dim"] != ACTION_DIM or self.manifest["state_dim"] != STATE_DIM:
+            raise ValueError(f"{self.out_dir} was built with a different encoding")
+        self.shard_size = self.manifest["shard_size"]
+        self._first_new_shard = len(self.manifest["shards"])
+        self._pending: List[Dict[str, np.ndarray]] = []
+        self._pending_rows = 0
+
+    def add(self, arrays: Dict[str, np.ndarray]) -> None:
+        n = len(arrays["actions"])
+        if not n:
+            return
+        self._pending.append(arrays)
+        self._pending_rows += n
+        while self._pending_rows >= self.shard_size:
+            merged = _concat(self._pending)
+            self._write_shard({k: v[: self.shard_size] for k, v in merged.items()})
+            rest = {k: v[self.shard_size:] for k, v in merged.items()}
+            self._pending = [rest]
+            self._pending_rows = len(rest["actions"])
+
+    def add_source(self, path, stats: Dict[str, int]) -> None:
+        self.manifest["sources"].append(str(Path(path).resolve()))
+        total = self.manifest["stats"]
+        for k, v in stats.items():
+            total[k] = total.get(k, 0) + v
+
+    def close(self) -> None:
+        """写出不满一个分片的剩余样本，更新 manifest"""
+        if self._pending_rows:
+            self._write_shard(_concat(self._pending))
+        self._pending = []
+        self._pending_rows = 0
+        _atomic_write(self.out_dir / MANIFEST_NAME,
+                      json.dumps(self.manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def abort(self) -> None:
+        """构建失败：删掉本次写出的分片，磁盘上的 manifest 保持构建前的样子"""
+        for entry in self.manifest["shards"][self._first_new_shard:]:
+            try:
+                os.remove(self.out_dir / entry["file"])
+            except OSError:
+                pass
+        self._pending = []
+        self._pending_rows = 0
+
+    def _write_shard(self, arrays: Dict[str, np.ndarray]) -> None:
+        name = SHARD_PATTERN.format(len(self.manifest["shards"]))
+        tmp = self.out_dir / (name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.out_dir / name)
+        rows = len(arrays["actions"])
+        self.manifest["shards"].append({"file": name, "rows": rows})
+        self.manifest["rows"] += rows
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if len(parts) == 1:
+        return parts[0]
+    return {k: np.concatenate([p[k] for p in parts]) for k in FIELDS}
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_manifest(root) -> Optional[dict]:
+    path = Path(root) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_shards(paths, out_dir, shard_size: int = SHARD_SIZE, workers: Optional[int] = None,
+                 task_games: int = TASK_GAMES) -> dict:
+    """
+    把回放文件编码成分片，返回本次构建的统计。
+    已经在 manifest 里的回放文件会被跳过（可以对同一个目录定期增量构建）。
+    """
+    writer = ShardWriter(out_dir, shard_size)
+    done = set(writer.manifest["sources"])
+    files = [p for p in expand_paths(paths) if str(p.resolve()) not in done]
+
+    # 任务 = (文件, chunk 下标, 局号区间)；记下每个文件的最后一个任务，收完它就把文件记进 manifest
+    tasks: List[Tuple[str, int, int, int]] = []
+    last_task: Dict[int, Path] = {}
+    for path in files:
+        before = len(tasks)
+        with ReplayReader(path) as reader:
+            for i, entry in enumerate(reader.index):
+                n = entry[3]
+                tasks.extend((str(path), i, s, min(s + task_games, n)) for s in range(0, n, task_games))
+        if len(tasks) > before:
+            last_task[len(tasks) - 1] = path
+        else:
+            writer.add_source(path, {})
+
+    totals: Dict[str, int] = {"files": len(files), "rows": 0}
+    stats: Dict[str, int] = {}
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker) as pool:
+            # 并行编码、按任务顺序收结果：分片内容与 worker 数无关
+            results = pool.map(_encode_task, *zip(*tasks)) if tasks else []
+            for i, (arrays, chunk_stats) in enumerate(results):
+                writer.add(arrays)
+                totals["rows"] += len(arrays["actions"])
+                for k, v in chunk_stats.items():
+                    stats[k] = stats.get(k, 0) + v
+                if i in last_task:
+                    writer.add_source(last_task[i], stats)
+                    for k, v in stats.items():
+                        totals[k] = totals.get(k, 0) + v
+                    stats = {}
+    except BaseException:
+        # 未处理完的文件可能已经有一部分样本写进了分片：整次构建作废，下次从头收录这些文件
+        writer.abort()
+        raise
+    writer.close()
+    totals["shards"] = len(writer.manifest["shards"])
+    totals["wall_sec"] = time.perf_counter() - t0
+    return totals
+
+
+# ---------------------------------------------------------
+# 读取：流式 IterableDataset
+# ---------------------------------------------------------
+def load_shard(path) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {k: data[k] for k in FIELDS}
+
+
+class ShardDataset(IterableDataset):
+    """
+    流式读取分片：
+        ds = ShardDataset("data/shards", batch_size=1024)
+        loader = DataLoader(ds, batch_size=None, num_workers=4)
+        for states, legal, actions, outcomes in loader: ...
+    - 每个 DataLoader worker 只读 shards[worker_id::num_workers]（分片数应不少于 worker 数）
+    - 分片顺序每个 epoch 重新打乱；样本经过 shuffle_buffer 大小的洗牌缓冲后输出
+    - batch_size 给定时直接输出整批（DataLoader 用 batch_size=None），否则逐条输出
+    输出：states uint8 (B, 40)、legal bool (B, 128)、actions int64 (B,)、outcomes float32 (B,)
+    """
+
+    def __init__(self, root, batch_size: Optional[int] = None, shuffle: bool = True,
+                 shuffle_buffer: int = SHUFFLE_BUFFER, seed: int = 0):
+        super().__init__()
+        self.root = Path(root)
+        manifest = load_manifest(self.root)
+        if manifest is None:
+            raise FileNotFoundError(f"no {MANIFEST_NAME} in {self.root}")
+        self.shards = [entry["file"] for entry in manifest["shards"]]
+        self.rows = manifest["rows"]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer if shuffle else 0
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """每个 epoch 开始前调用，换一种分片顺序 / 洗牌结果"""
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        """样本数（batch_size 给定时为批数的上界）"""
+        if self.batch_size:
+            return -(-self.rows // self.batch_size)
+        return self.rows
+
+    def _my_shards(self, worker_id: int, num_workers: int) -> List[str]:
+        shards = list(self.shards)
+        if self.shuffle:
+            random.Random(self.seed * 1000003 + self.epoch).shuffle(shards)
+        return shards[worker_id::num_workers]
+
+    def __iter__(self) -> Iterator:
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        rng = np.random.default_rng((self.seed, self.epoch, worker_id))
+
+        buf: Optional[Dict[str, np.ndarray]] = None
+        for name in self._my_shards(worker_id, num_workers):
+            shard = load_shard(self.root / name)
+            buf = shard if buf is None else _concat([buf, shard])
+            n = len(buf["actions"])
+            if self.shuffle:
+                perm = rng.permutation(n)
+                buf = {k: v[perm] for k, v in buf.items()}
+            # 留 shuffle_buffer 条和下一个分片混在一起，其余输出
+            ready = max(0, n - self.shuffle_buffer)
+            if self.batch_size:
+                ready -= ready % self.batch_size
+            if ready:
+                yield from self._emit({k: v[:ready] for k, v in buf.items()})
+                buf = {k: v[ready:] for k, v in buf.items()}
+        if buf is not None and len(buf["actions"]):
+            yield from self._emit(buf)
+
+    def _emit(self, arrays: Dict[str, np.ndarray]) -> Iterator:
+        n = len(arrays["actions"])
+        step = self.batch_size or n
+        for start in range(0, n, step):
+            batch = _to_tensors({k: v[start:start + step] for k, v in arrays.items()})
+            if self.batch_size:
+                yield batch
+            else:
+                yield from zip(*batch)
+
+
+def _to_tensors(arrays: Dict[str, np.ndarray]):
+    legal = np.unpackbits(arrays["legal"], axis=1, count=ACTION_DIM).astype(bool)
+    return (
+        torch.from_numpy(np.ascontiguousarray(arrays["states"])),
+        torch.from_numpy(legal),
+        torch.from_numpy(arrays["actions"].astype(np.int64)),
+        torch.from_numpy(arrays["outcomes"].astype(np.float32)),
+    )
+
+
+# ---------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------
+def _cmd_build(args) -> None:
+    totals = build_shards(args.paths, args.out, shard_size=args.shard_size, workers=args.workers)
+    if not totals["files"]:
+        print("[INFO] Nothing new to build.")
+        return
+    decisions = totals.get("decisions", 0)
+    print(f"[INFO] {totals['files']} file(s), {totals.get('games', 0)} games "
+          f"(unfinished {totals.get('unfinished', 0)}, invalid {totals.get('invalid', 0)})")
+    print(f"[INFO] {totals['rows']} samples from {decisions} decisions "
+          f"(skipped {totals.get('skipped', 0)} not in candidate list)")
+    print(f"[INFO] {totals['shards']} shard(s) in {args.out}, "
+          f"{totals['wall_sec']:.1f}s ({totals.get('games', 0) / max(totals['wall_sec'], 1e-9):.0f} games/s)")
+
+
+def _cmd_info(args) -> None:
+    manifest = load_manifest(args.root)
+    if manifest is None:
+        raise SystemExit(f"no {MANIFEST_NAME} in {args.root}")
+    size = sum(os.path.getsize(Path(args.root) / s["file"]) for s in manifest["shards"])
+    print(f"{args.root}: {manifest['rows']} samples in {len(manifest['shards'])} shard(s), "
+          f"{size / 1e6:.1f} MB, {len(manifest['sources'])} source file(s)")
+    for k, v in sorted(manifest["stats"].items()):
+        print(f"  {k:12s} {v}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 -> 训练样本分片")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("build", help="把回放文件编码成 NumPy 分片")
+    p.add_argument("paths", nargs="+", help="回放文件 / 目录 / glob")
+    p.add_argument("--out", required=True, help="分片输出目录")
+    p.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=_cmd_build)
+
+    p = sub.add_parser("info", help="查看分片目录")
+    p.add_argument("root")
+    p.set_defaults(func=_cmd_info)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
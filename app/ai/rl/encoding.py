@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+状态编码（训练 / 推理共用）
+固定 40 维：
+- 前 20 维：自己的手牌 rank（升序，补零到 20）
+- 后 20 维：上一手非 PASS 出牌的 rank（补零到 20）
+
+网络输入是 rank / 17 的浮点数；紧凑存储时直接保存 uint8 的 rank 编码（0 表示空位），
+只在批量前向时再解码成浮点，内存约为 float32 的 1/4。
+"""
+
+from typing import List
+
+import numpy as np
+
+from app.models.card import Card
+
+STATE_DIM = 40
+HALF_DIM = 20
+RANK_SCALE = 17.0
+
+
+def encode_state_codes(obs) -> np.ndarray:
+    """Observation → uint8 rank 编码（40 维）。"""
+    codes = np.zeros(STATE_DIM, dtype=np.uint8)
+
+    # 1) 自己手牌
+    hand: List[Card] = sorted(obs.my_hand, key=lambda c: (c.rank, c.suit))
+    ranks = [c.rank for c in hand[:HALF_DIM]]
+    codes[: len(ranks)] = ranks
+
+    # 2) 上一手有效出牌（last_non_pass）
+    last = obs.last_non_pass
+    if last:
+        ranks = [c.rank for c in last.cards[:HALF_DIM]]
+        codes[HALF_DIM : HALF_DIM + len(ranks)] = ranks
+
+    return codes
+
+
+def decode_codes(codes: np.ndarray) -> np.ndarray:
+    """uint8 rank 编码 → 网络输入浮点（rank / 17）。"""
+    return codes.astype(np.float32) / np.float32(RANK_SCALE)
+
+
+def encode_state(obs) -> np.ndarray:
+    """Observation → float32 网络输入（40 维）。"""
+    return decode_codes(encode_state_codes(obs))
@@ -6,12 +6,14 @@
 """
 
 import random
+import time
 import numpy as np
 from typing import Tuple, List
 
 from app.game.dealer import DealerReferee
 from app.models.card import Card
 from app.game.rules import DouDiZhuRules
+from app.ai.rl.encoding import encode_state_codes, decode_codes
 
 
 class DouDiZhuEnv:
@@ -21,9 +23,14 @@ class DouDiZhuEnv:
     - step(action_index)
     - action_index 为“从候选动作列表中选择第 idx 个”
     - 自动推进三名玩家（self-play）
+    - compact=True 时状态以 uint8 rank 编码返回（见 encoding.py）
+    - 发牌使用环境自己的 random.Random（seed 为 None 时由系统熵播种一次），不走 SystemRandom
     """
 
-    def __init__(self):
+    def __init__(self, compact: bool = False, seed: int = None):
+        self.compact = compact
+        self.rng = random.Random(seed)
+        self.encode_time = 0.0  # 累计花在 encode_state 上的秒数（性能统计用）
         self.dealer = DealerReferee()
         self.current_player = "human"
         self.last_obs = None
@@ -35,9 +42,11 @@ class DouDiZhuEnv:
     # ---------------------------------------------------------
     # 重置环境
     # ---------------------------------------------------------
-    def reset(self) -> Tuple[np.ndarray, dict]:
-        """开始新局，返回初始状态表示"""
-        self.dealer.start_new_game()
+    def reset(self, seed: int = None) -> Tuple[np.ndarray, dict]:
+        """开始新局，返回初始状态表示；给定 seed 时先重新播种（之后的局面完全可复现）"""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.dealer.start_new_game(rng=self.rng)
         self.current_player = "human"
         self.done = False
         self.reward = 0.0
@@ -102,7 +111,7 @@ class DouDiZhuEnv:
             if len(ai_moves) == 0:
                 ai_choice = []
             else:
-                idx = random.randrange(len(ai_moves))
+                idx = self.rng.randrange(len(ai_moves))
                 ai_choice = ai_moves[idx]
 
             self.dealer.play_cards(pid, ai_choice)
@@ -205,26 +214,11 @@ class DouDiZhuEnv:
         把 Observation 编码成固定大小向量（40 维）：
         - 前 20 维：自己的手牌（rank / 17，补零到 20）
         - 后 20 维：上一手非 PASS 出牌（rank / 17，补零到 20）
+        compact 模式下直接返回 uint8 rank 编码，由模型前向时解码。
         """
-
-        vec: List[float] = []
-
-        # 1) 自己手牌
-        hand = sorted(obs.my_hand, key=lambda c: (c.rank, c.suit))
-        for c in hand:
-            vec.append(c.rank / 17.0)
-        while len(vec) < 20:
-            vec.append(0.0)
-
-        # 2) 上一手有效出牌（last_non_pass）
-        last = obs.last_non_pass
-        if last:
-            for c in last.cards:
-                vec.append(c.rank / 17.0)
-            while len(vec) < 40:
-                vec.append(0.0)
-        else:
-            while len(vec) < 40:
-                vec.append(0.0)
-
-        return np.array(vec, dtype=np.float32)
+        t0 = time.perf_counter()
+        codes = encode_state_codes(obs)
+        if not self.compact:
+            codes = decode_codes(codes)
+        self.encode_time += time.perf_counter() - t0
+        return codes
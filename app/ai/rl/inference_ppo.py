@@ -6,6 +6,7 @@ PPO 推理模块
 """
 
 import torch
+from app.ai.rl.encoding import encode_state
 from app.ai.rl.model_ppo import PPOPolicy
 from app.game.rules import DouDiZhuRules
 from app.models.card import Card
@@ -24,28 +25,10 @@ class DeepRLInferenceEngine:
         self.lstm_state = None
 
     # ---------------------------------------------------------
-    # 状态编码（与你训练时一致）
+    # 状态编码（训练共用的编码器，见 app.ai.rl.encoding）
     # ---------------------------------------------------------
     def encode_state(self, obs):
-        vec = []
-
-        hand = sorted(obs.my_hand, key=lambda c: (c.rank, c.suit))
-        for c in hand:
-            vec.append(c.rank / 17.0)
-        while len(vec) < 20:
-            vec.append(0.0)
-
-        last = obs.last_non_pass
-        if last:
-            for c in last.cards:
-                vec.append(c.rank / 17.0)
-            while len(vec) < 40:
-                vec.append(0.0)
-        else:
-            while len(vec) < 40:
-                vec.append(0.0)
-
-        return torch.tensor([vec], dtype=torch.float32, device=self.device)
+        return torch.from_numpy(encode_state(obs)).unsqueeze(0).to(self.device)
 
     # ---------------------------------------------------------
     # 主入口：选择出牌
@@ -8,12 +8,17 @@ PPO 模型结构：MLP + LSTM 双路网络
 import torch
 import torch.nn as nn
 
+from app.ai.rl.encoding import RANK_SCALE
+
 
 class PPOPolicy(nn.Module):
-    def __init__(self, state_dim=40, hidden_dim=128, lstm_hidden=128):
+    def __init__(self, state_dim=40, hidden_dim=128, lstm_hidden=128, device=None):
+        """device: None 表示有 GPU 就用 GPU；actor 子进程显式传 "cpu"，避免在子进程里初始化 CUDA"""
         super().__init__()
 
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
 
         # ---- MLP 路径：提取手牌、历史等结构特征 ----
         self.mlp = nn.Sequential(
@@ -52,9 +57,13 @@ class PPOPolicy(nn.Module):
 
     # ---------------------------------------------------------
     # 前向：obs.shape = (batch, state_dim)
+    # obs 可以是 float（rank / 17）或 uint8 紧凑编码（在这里解码）
     # LSTM 需要 (batch, seq=1, hidden_dim)
     # ---------------------------------------------------------
     def forward(self, obs, lstm_state=None):
+        if obs.dtype == torch.uint8:
+            obs = obs.float() / RANK_SCALE
+
         x = self.mlp(obs)                  # (batch, hidden_dim)
         x_lstm_in = x.unsqueeze(1)         # (batch, 1, hidden_dim)
 
@@ -4,9 +4,11 @@ PPO 算法实现
 - 计算 clipped policy loss
 - 计算 value loss
 - 计算 entropy（鼓励探索）
-- 更新模型
+- 更新模型（打乱后的 minibatch 迭代 + 梯度累积 + 可选 KL 早停）
 """
 
+import time
+
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -23,8 +25,16 @@ class PPOAgent:
         update_epochs=10,
         entropy_coef=0.01,
         value_coef=0.5,
-        max_grad_norm=0.5
+        max_grad_norm=0.5,
+        minibatch_size=None,
+        grad_accum_steps=1,
+        target_kl=None,
     ):
+        """
+        minibatch_size: 每个 minibatch 的样本数；None 表示整批（旧行为）
+        grad_accum_steps: 累积多少个 minibatch 的梯度再执行一次 optimizer.step()
+        target_kl: 近似 KL 超过该值时提前结束本轮更新；None 表示不早停
+        """
         self.policy = policy_model
         self.optimizer = optim.Adam(self.policy.parameters(), lr=lr)
 
@@ -35,41 +45,118 @@ class PPOAgent:
         self.entropy_coef = entropy_coef
         self.value_coef = value_coef
         self.max_grad_norm = max_grad_norm
+        self.minibatch_size = minibatch_size
+        self.grad_accum_steps = max(1, int(grad_accum_steps))
+        self.target_kl = target_kl
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+        # 最近一次 update 的统计信息（epoch 耗时、KL、早停等），供训练脚本写日志
+        self.last_update_stats = {}
+
+    # ---------------------------------------------------------
+    # 单个 minibatch 的损失
+    # ---------------------------------------------------------
+    def _compute_loss(self, states, actions, old_logprobs, advantages, returns):
+        logits, values, _ = self.policy.forward(states)
+        dist = torch.distributions.Categorical(logits=logits)
+
+        logprobs = dist.log_prob(actions)
+        entropy = dist.entropy().mean()
+
+        log_ratios = logprobs - old_logprobs
+        ratios = torch.exp(log_ratios)
+
+        # clipped surrogate objective
+        surr1 = ratios * advantages
+        surr2 = torch.clamp(ratios, 1 - self.clip_ratio, 1 + self.clip_ratio) * advantages
+        policy_loss = -torch.min(surr1, surr2).mean()
+
+        # value loss
+        value_loss = (returns - values).pow(2).mean()
+
+        # 总损失
+        loss = (
+            policy_loss
+            + self.value_coef * value_loss
+            - self.entropy_coef * entropy
+        )
+
+        # 近似 KL（k3 估计，恒非负）
+        with torch.no_grad():
+            approx_kl = ((ratios - 1) - log_ratios).mean()
+
+        return loss, policy_loss, value_loss, entropy, approx_kl
+
+    def _optimizer_step(self):
+        nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
+        self.optimizer.step()
+        self.optimizer.zero_grad()
+
     # ---------------------------------------------------------
     # 使用 PPO 更新参数
     # ---------------------------------------------------------
     def update(self, states, actions, old_logprobs, advantages, returns):
+        n = states.shape[0]
+        mb_size = self.minibatch_size or n
+        accum = self.grad_accum_steps
+        num_minibatches = -(-n // mb_size)
+
+        epoch_times = []
+        optimizer_steps = 0
+        early_stopped = False
+        approx_kl = torch.zeros(())
+
         for _ in range(self.update_epochs):
-            logits, values, _ = self.policy.forward(states)
-            dist = torch.distributions.Categorical(logits=logits)
+            t0 = time.perf_counter()
+            perm = torch.randperm(n, device=states.device)
+            self.optimizer.zero_grad()
 
-            logprobs = dist.log_prob(actions)
-            entropy = dist.entropy().mean()
+            pending = 0
+            kl_sum = torch.zeros((), device=states.device)
+            for k, start in enumerate(range(0, n, mb_size)):
+                idx = perm[start : start + mb_size]
+                # 本组实际的 minibatch 数：最后一组可能不足 accum 个，按实际个数平均，梯度量级不被缩小
+                group_size = min(accum, num_minibatches - (k // accum) * accum)
+                loss, policy_loss, value_loss, entropy, approx_kl = self._compute_loss(
+                    states[idx],
+                    actions[idx],
+                    old_logprobs[idx],
+                    advantages[idx],
+                    returns[idx],
+                )
+                (loss / group_size).backward()
+                kl_sum += approx_kl
+                pending += 1
 
-            ratios = torch.exp(logprobs - old_logprobs)
+                if pending == accum:
+                    self._optimizer_step()
+                    optimizer_steps += 1
 
-            # clipped surrogate objective
-            surr1 = ratios * advantages
-            surr2 = torch.clamp(ratios, 1 - self.clip_ratio, 1 + self.clip_ratio) * advantages
-            policy_loss = -torch.min(surr1, surr2).mean()
+                    if self.target_kl is not None and (kl_sum / pending).item() > self.target_kl:
+                        early_stopped = True
+                        break
+                    pending = 0
+                    kl_sum.zero_()
 
-            # value loss
-            value_loss = (returns - values).pow(2).mean()
+            # 剩余不足 accum 个 minibatch 的梯度也要用掉
+            if pending and not early_stopped:
+                self._optimizer_step()
+                optimizer_steps += 1
+                if self.target_kl is not None and (kl_sum / pending).item() > self.target_kl:
+                    early_stopped = True
 
-            # 总损失
-            loss = (
-                policy_loss
-                + self.value_coef * value_loss
-                - self.entropy_coef * entropy
-            )
+            epoch_times.append(time.perf_counter() - t0)
+            if early_stopped:
+                break
 
-            self.optimizer.zero_grad()
-            loss.backward()
-            nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
-            self.optimizer.step()
+        self.last_update_stats = {
+            "epochs": len(epoch_times),
+            "epoch_times": epoch_times,
+            "optimizer_steps": optimizer_steps,
+            "approx_kl": approx_kl.item(),
+            "early_stopped": early_stopped,
+        }
 
         return (
             loss.item(),
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+PPOPolicy 监督预训练（行为克隆 warm start）
+- 数据：app.ai.rl.dataset 构建的分片目录，ShardDataset 流式读取，不需要一次装进内存
+- 策略头：只在合法候选上做 softmax，交叉熵拟合实际出牌
+- 价值头：拟合出牌方最终胜负（按 DouDiZhuEnv 的终局奖励 ±10 缩放）
+- 输出的 state_dict 可以直接给 train_ppo --init 或 DeepRL_AI 使用
+
+示例：
+    python -m app.ai.rl.pretrain --data data/shards --epochs 2 --workers 4
+    python -m app.ai.rl.train_ppo --init model/ppo_pretrained.pt
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from app.ai.rl.dataset import ShardDataset
+from app.ai.rl.model_ppo import PPOPolicy
+
+
+# ---------------------------------------------------------
+# 配置
+# ---------------------------------------------------------
+BATCH_SIZE = 1024
+LR = 1e-3
+VALUE_COEF = 0.5
+WIN_REWARD = 10.0          # 与 DouDiZhuEnv._calc_final_reward 一致
+MAX_GRAD_NORM = 0.5
+LOG_INTERVAL = 100         # 每多少个 batch 刷新一次进度条上的指标
+OUT_PATH = "model/ppo_pretrained.pt"
+
+
+def pretrain(data, epochs=1, batch_size=BATCH_SIZE, lr=LR, workers=0, init=None,
+             out=OUT_PATH, seed=0):
+    logging.getLogger("doudizhu").setLevel(logging.WARNING)
+    torch.manual_seed(seed)
+
+    policy = PPOPolicy()
+    device = policy.device
+    if init:
+        policy.load_state_dict(torch.load(init, map_location=device))
+        print(f"[INFO] Initialized from: {init}")
+    optimizer = torch.optim.Adam(policy.parameters(), lr=lr)
+
+    dataset = ShardDataset(data, batch_size=batch_size, seed=seed)
+    print(f"[INFO] {dataset.rows} samples in {len(dataset.shards)} shard(s), device: {device}")
+
+    policy.train()
+    for epoch in range(epochs):
+        # 非 persistent 的 worker 每个 epoch 重新拿到 dataset 副本，set_epoch 会生效
+        dataset.set_epoch(epoch)
+        loader = DataLoader(
+            dataset, batch_size=None, num_workers=workers, pin_memory=device.type == "cuda",
+        )
+        t0 = time.perf_counter()
+        seen = 0
+        correct = 0
+        sums = torch.zeros(2, device=device)
+        bar = tqdm(loader, total=len(dataset), desc=f"epoch {epoch}", unit="batch")
+        for step, (states, legal, actions, outcomes) in enumerate(bar, 1):
+            states = states.to(device, non_blocking=True)
+            legal = legal.to(device, non_blocking=True)
+            actions = actions.to(device, non_blocking=True)
+            outcomes = outcomes.to(device, non_blocking=True)
+
+            logits, values, _ = policy.forward(states)
+            logits = logits.masked_fill(~legal, float("-inf"))
+            policy_loss = F.cross_entropy(logits, actions)
+            value_loss = F.mse_loss(values, outcomes * WIN_REWARD)
+            loss = policy_loss + VALUE_COEF * value_loss
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), MAX_GRAD_NORM)
+            optimizer.step()
+
+            with torch.no_grad():
+                n = len(actions)
+                sums += torch.stack([policy_loss, value_loss]) * n
+                correct += int((logits.argmax(-1) == actions).sum())
+                seen += n
+            if step % LOG_INTERVAL == 0:
+                bar.set_postfix(policy=f"{sums[0].item() / seen:.3f}", value=f"{sums[1].item() / seen:.2f}",
+                                acc=f"{correct / seen:.3f}")
+
+        elapsed = time.perf_counter() - t0
+        print(f"[INFO] epoch {epoch}: policy_loss={sums[0].item() / max(seen, 1):.4f} "
+              f"value_loss={sums[1].item() / max(seen, 1):.3f} acc={correct / max(seen, 1):.3f} "
+              f"({seen / elapsed:.0f} samples/s)")
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    torch.save(policy.state_dict(), out)
+    print(f"[INFO] Pretrained model saved: {out}")
+    return policy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PPOPolicy 监督预训练")
+    parser.add_argument("--data", required=True, help="分片目录（python -m app.ai.rl.dataset build 生成）")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--lr", type=float, default=LR)
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker 数（按分片切分）")
+    parser.add_argument("--init", help="从已有的 state_dict 继续训练")
+    parser.add_argument("--out", default=OUT_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pretrain(
+        args.data, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+        workers=args.workers, init=args.init, out=args.out, seed=args.seed,
+    )
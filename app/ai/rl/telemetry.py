@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+训练循环性能统计
+- PhaseTimer：按阶段（env 等待 / 编码 / 前向 / 写 buffer / GAE / 更新 ...）累计耗时
+- AsyncScalarWriter：把 TensorBoard 写入放到后台线程，训练循环只做一次入队
+"""
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    用法：
+        timer = PhaseTimer()
+        with timer.phase("forward"):
+            ...
+        timer.add("encode", seconds)     # 已经在别处测好的耗时
+        stats = timer.reset()            # {"forward": 秒数, ...}，并清零
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - t0
+
+    def add(self, name, seconds):
+        self.totals[name] += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def reset(self):
+        totals = dict(self.totals)
+        self.totals.clear()
+        self.started_at = time.perf_counter()
+        return totals
+
+
+class AsyncScalarWriter:
+    """
+    SummaryWriter 的非阻塞包装：add_scalar 只入队，后台线程负责写入并按 flush_secs 定期 flush。
+    队列满时直接丢弃该条指标（绝不阻塞训练）。
+    """
+
+    def __init__(self, writer, flush_secs=10.0, max_queue=10000):
+        self.writer = writer
+        self.flush_secs = flush_secs
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def add_scalar(self, tag, value, global_step=None):
+        try:
+            self._queue.put_nowait((tag, float(value), global_step))
+        except queue.Full:
+            self.dropped += 1
+
+    def add_scalars(self, prefix, values, global_step=None):
+        for name, value in values.items():
+            self.add_scalar(f"{prefix}/{name}", value, global_step)
+
+    def flush(self):
+        """兼容 SummaryWriter 接口；实际 flush 由后台线程定期完成。"""
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.flush()
+        self.writer.close()
+
+    def _loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_secs)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self.writer.add_scalar(*item)
+            if time.monotonic() - last_flush >= self.flush_secs:
+                self.writer.flush()
+                last_flush = time.monotonic()
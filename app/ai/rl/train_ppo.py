@@ -4,7 +4,11 @@ PPO 训练脚本（可直接运行）
 支持：
 - 多进程并行环境
 - PPO 更新
-- TensorBoard
+- actor / learner 解耦模式（python -m app.ai.rl.train_ppo --mode async）
+- 完整断点续训（python -m app.ai.rl.train_ppo --resume [path]）
+- 从监督预训练的权重开始（python -m app.ai.rl.train_ppo --init model/ppo_pretrained.pt，见 pretrain.py）
+- 训练结束写出 model/ppo_candidate.pt；是否替换线上冠军 ppo_final.pt 由 app.eval.gate 评测决定
+- TensorBoard（后台线程写入，含分阶段耗时与吞吐统计）
 - tqdm 进度条
 - GPU 加速（如果 torch.cuda.is_available 为 True）
 """
@@ -12,6 +16,7 @@ PPO 训练脚本（可直接运行）
 import os
 import time
 import logging
+import argparse
 import torch
 import numpy as np
 from torch.utils.tensorboard import SummaryWriter
@@ -21,6 +26,9 @@ from app.ai.rl.vector_env import VectorEnv
 from app.ai.rl.model_ppo import PPOPolicy
 from app.ai.rl.ppo_agent import PPOAgent
 from app.ai.rl.buffer import RolloutBuffer
+from app.ai.rl.actor_learner import ActorPool, merge_trajectories, vtrace_batch
+from app.ai.rl.checkpoint import CheckpointManager, restore_rng_state
+from app.ai.rl.telemetry import PhaseTimer, AsyncScalarWriter
 
 
 # ---------------------------------------------------------
@@ -29,9 +37,25 @@ from app.ai.rl.buffer import RolloutBuffer
 NUM_ENVS = 32              # 你的 7900X 完全能跑 32 环境
 ROLLOUT_STEPS = 128        # 每个环境 rollout 步数
 TOTAL_EPISODES = 1_000_000  # 一百万局
-CHECKPOINT_INTERVAL = 50000
+CHECKPOINT_INTERVAL = 50000  # 每跨过多少局写一次 ppo_checkpoint_*.pt + 完整断点
+CHECKPOINT_SECONDS = 600     # 距上次完整断点超过该秒数也会保存一次（防抢占）
+RUN_CHECKPOINT_DIR = "model/run"
+CANDIDATE_PATH = "model/ppo_candidate.pt"  # 最终权重；由 app.eval.gate 评测后决定是否晋升为 ppo_final.pt
+KEEP_LAST_CHECKPOINTS = 3    # 只保留最近几个完整断点
 STATE_DIM = 40
 ACTION_DIM = 128           # 策略输出维度 (与策略网络一致)
+COMPACT_STATES = True      # 状态以 uint8 rank 编码传输/存储，前向时再解码
+UPDATE_EPOCHS = 10
+MINIBATCH_SIZE = 1024      # PPO 更新时每个 minibatch 的样本数
+GRAD_ACCUM_STEPS = 1       # 累积几个 minibatch 再 step 一次
+TARGET_KL = 0.02           # 近似 KL 超过该值提前结束本轮更新（None 关闭）
+
+# actor / learner 模式
+NUM_ACTORS = 8             # actor 进程数
+ENVS_PER_ACTOR = 4         # 每个 actor 内的环境数
+TRAJS_PER_UPDATE = 8       # learner 每次更新使用的轨迹段数
+BROADCAST_INTERVAL = 1     # learner 每更新几次广播一次权重
+MAX_POLICY_LAG = 4         # 落后超过该版本数的轨迹直接丢弃
 
 
 def create_dirs():
@@ -39,10 +63,114 @@ def create_dirs():
     os.makedirs("model", exist_ok=True)
 
 
+def log_update(writer, agent, losses, global_step, episode_count):
+    loss, ploss, vloss, entropy = losses
+    writer.add_scalar("loss/total", loss, global_step)
+    writer.add_scalar("loss/policy", ploss, global_step)
+    writer.add_scalar("loss/value", vloss, global_step)
+    writer.add_scalar("loss/entropy", entropy, global_step)
+    writer.add_scalar("train/episode_count", episode_count, global_step)
+
+    stats = agent.last_update_stats
+    writer.add_scalar("update/approx_kl", stats["approx_kl"], global_step)
+    writer.add_scalar("update/epochs", stats["epochs"], global_step)
+    writer.add_scalar("update/optimizer_steps", stats["optimizer_steps"], global_step)
+    writer.add_scalar(
+        "update/epoch_time_sec",
+        sum(stats["epoch_times"]) / stats["epochs"],
+        global_step,
+    )
+
+
+def log_throughput(writer, timer, env_steps, episodes, global_step, ipc_latency=None):
+    """
+    写入本轮各阶段耗时、env-steps/sec、games/sec、每个 worker 的 IPC 延迟，返回 env-steps/sec。
+    """
+    elapsed = timer.elapsed()
+    phases = timer.reset()
+    steps_per_sec = env_steps / elapsed if elapsed > 0 else 0.0
+
+    writer.add_scalars("perf/phase_sec", phases, global_step)
+    writer.add_scalar("perf/iteration_sec", elapsed, global_step)
+    writer.add_scalar("perf/env_steps_per_sec", steps_per_sec, global_step)
+    writer.add_scalar("perf/games_per_sec", episodes / elapsed if elapsed > 0 else 0.0, global_step)
+    if ipc_latency:
+        for worker_id, latency in ipc_latency.items():
+            writer.add_scalar(f"perf/ipc_latency_ms/worker_{worker_id}", latency * 1000.0, global_step)
+    return steps_per_sec
+
+
+# ---------------------------------------------------------
+# 断点：恢复 / 定期保存
+# ---------------------------------------------------------
+def resume_run(ckpt, resume, policy, agent, init=None):
+    """
+    resume: None（不恢复）/ "latest" / 断点文件路径
+    init: 不恢复断点时，用这个 state_dict 文件初始化策略权重（监督预训练的结果）
+    返回保存时的计数器 dict（不恢复时为空 dict）
+    """
+    if not resume:
+        if init:
+            policy.load_state_dict(torch.load(init, map_location=policy.device))
+            print(f"[INFO] Initialized policy from: {init}")
+        return {}
+
+    path = ckpt.latest() if resume == "latest" else resume
+    if path is None:
+        print("[WARN] No run checkpoint found, starting from scratch.")
+        return {}
+
+    data = ckpt.load(path)
+    policy.load_state_dict(data["policy"])
+    agent.optimizer.load_state_dict(data["optimizer"])
+    restore_rng_state(data["rng"])
+    print(f"[INFO] Resumed from: {path}")
+    return data["counters"]
+
+
+def save_candidate(policy):
+    """最终权重写成候选（先写临时文件再替换，门禁进程不会读到半个文件），不直接覆盖冠军"""
+    tmp = CANDIDATE_PATH + ".tmp"
+    torch.save(policy.state_dict(), tmp)
+    os.replace(tmp, CANDIDATE_PATH)
+    print(f"[INFO] Final model saved as candidate: {CANDIDATE_PATH} (promote via app.eval.gate)")
+
+
+class CheckpointSchedule:
+    """
+    判断什么时候该存断点：
+    - 局数跨过 CHECKPOINT_INTERVAL 的整数倍（局数每次会跳好几局，不能用 % == 0 判断）
+    - 或者距离上次完整断点超过 CHECKPOINT_SECONDS
+    """
+
+    def __init__(self, episode_count, next_episode_mark=None):
+        self.next_episode_mark = next_episode_mark or (
+            (episode_count // CHECKPOINT_INTERVAL + 1) * CHECKPOINT_INTERVAL
+        )
+        self.last_save_time = time.time()
+
+    def save_if_due(self, ckpt, policy, agent, counters):
+        episode_count = counters["episode_count"]
+        extra_files = None
+
+        if episode_count >= self.next_episode_mark:
+            cp_path = f"model/ppo_checkpoint_{episode_count}.pt"
+            extra_files = {cp_path: policy.state_dict()}
+            while self.next_episode_mark <= episode_count:
+                self.next_episode_mark += CHECKPOINT_INTERVAL
+            print(f"[INFO] Saving checkpoint: {cp_path}")
+        elif time.time() - self.last_save_time < CHECKPOINT_SECONDS:
+            return
+
+        counters = dict(counters, next_episode_mark=self.next_episode_mark)
+        ckpt.save_async(policy, agent.optimizer, counters, extra_files=extra_files)
+        self.last_save_time = time.time()
+
+
 # ---------------------------------------------------------
 # 主训练函数
 # ---------------------------------------------------------
-def train():
+def train(resume=None, init=None):
     create_dirs()
 
     # 关掉训练时的详细日志，避免刷屏，把 tqdm 顶掉
@@ -53,106 +181,272 @@ def train():
     print(f"[INFO] Using device: {device}")
 
     # 多环境加速
-    envs = VectorEnv(NUM_ENVS)
+    envs = VectorEnv(NUM_ENVS, compact=COMPACT_STATES)
 
     # 初始化模型
     policy = PPOPolicy(state_dim=STATE_DIM, hidden_dim=128, lstm_hidden=128)
-    agent = PPOAgent(policy)
-
-    # TensorBoard
-    writer = SummaryWriter("logs/ppo_train")
-
-    # Rollout Buffer
-    buffer_size = NUM_ENVS * ROLLOUT_STEPS
-    buffer = RolloutBuffer(buffer_size, STATE_DIM, 1)
+    agent = PPOAgent(
+        policy,
+        update_epochs=UPDATE_EPOCHS,
+        minibatch_size=MINIBATCH_SIZE,
+        grad_accum_steps=GRAD_ACCUM_STEPS,
+        target_kl=TARGET_KL,
+    )
+
+    # TensorBoard（后台线程写入）+ 分阶段计时
+    writer = AsyncScalarWriter(SummaryWriter("logs/ppo_train"))
+    timer = PhaseTimer()
+
+    # Rollout Buffer：(ROLLOUT_STEPS, NUM_ENVS) 布局
+    buffer = RolloutBuffer(
+        ROLLOUT_STEPS, NUM_ENVS, STATE_DIM, 1, compact=COMPACT_STATES
+    )
+
+    # 断点
+    ckpt = CheckpointManager(RUN_CHECKPOINT_DIR, keep_last=KEEP_LAST_CHECKPOINTS)
+    counters = resume_run(ckpt, resume, policy, agent, init)
 
     # 重置所有环境
     obs, _ = envs.reset()
 
-    global_step = 0
-    episode_count = 0
+    global_step = counters.get("global_step", 0)
+    episode_count = counters.get("episode_count", 0)
+    schedule = CheckpointSchedule(episode_count, counters.get("next_episode_mark"))
 
-    pbar = tqdm(total=TOTAL_EPISODES, desc="训练进度（按局数）", ncols=120)
+    pbar = tqdm(
+        total=TOTAL_EPISODES, initial=episode_count, desc="训练进度（按局数）", ncols=120
+    )
 
     # ---------------------------------------------------------
     # 训练循环
     # ---------------------------------------------------------
     while episode_count < TOTAL_EPISODES:
+        iter_episodes = 0
+        ipc_latency = np.zeros(NUM_ENVS)
 
         # rollout steps
         for t in range(ROLLOUT_STEPS):
             global_step += NUM_ENVS
 
             # 模型动作
-            obs_tensor = torch.tensor(obs, dtype=torch.float32, device=device)
+            with timer.phase("forward"), torch.no_grad():
+                obs_tensor = torch.as_tensor(obs, device=device)
 
-            logits, value, _ = policy.forward(obs_tensor)
-            dist = torch.distributions.Categorical(logits=logits)
-            action_tensor = dist.sample()
+                logits, value, _ = policy.forward(obs_tensor)
+                dist = torch.distributions.Categorical(logits=logits)
+                action_tensor = dist.sample()
 
-            actions = action_tensor.cpu().numpy()
-            logprobs = dist.log_prob(action_tensor).detach().cpu().numpy()
-            values = value.detach().cpu().numpy()
+                actions = action_tensor.cpu().numpy()
+                logprobs = dist.log_prob(action_tensor).cpu().numpy()
+                values = value.cpu().numpy()
 
             # 多环境步进
-            next_obs, rewards, dones, infos = envs.step(actions)
-
-            # 收集经验
-            for i in range(NUM_ENVS):
-                buffer.store(
-                    obs[i],
-                    actions[i],
-                    rewards[i],
-                    values[i],
-                    logprobs[i],
-                    dones[i],
-                )
-
-                if dones[i]:
-                    episode_count += 1
-                    pbar.update(1)
+            with timer.phase("env_step_wait"):
+                next_obs, rewards, dones, infos = envs.step(actions)
+            # 编码在子进程里并行完成，这里记平均每个 worker 的耗时
+            timer.add("encode", float(envs.last_encode_times.mean()))
+            ipc_latency += envs.last_ipc_latency
+
+            # 收集经验（整批写入所有环境）
+            with timer.phase("buffer_store"):
+                buffer.store_batch(obs, actions, rewards, values, logprobs, dones)
+
+            finished = int(np.count_nonzero(dones))
+            if finished:
+                episode_count += finished
+                iter_episodes += finished
+                pbar.update(finished)
 
             obs = next_obs
 
-        # 计算 GAE
-        last_value = 0.0
-        buffer.finish_path(last_value)
+        # 计算 GAE（用每个环境最后的 next_obs 自举）
+        with timer.phase("gae"):
+            with torch.no_grad():
+                obs_tensor = torch.as_tensor(obs, device=device)
+                _, last_values, _ = policy.forward(obs_tensor)
+            buffer.finish_path(last_values.cpu().numpy(), agent.gamma, agent.lam)
 
-        # 采集 rollout
-        states, actions_t, old_logprobs, advantages, returns = buffer.get()
+            # 采集 rollout
+            states, actions_t, old_logprobs, advantages, returns = buffer.get(device)
 
         # PPO 更新
-        loss, ploss, vloss, entropy = agent.update(
-            states, actions_t, old_logprobs, advantages, returns
+        with timer.phase("update"):
+            losses = agent.update(states, actions_t, old_logprobs, advantages, returns)
+
+        # 记录日志（后台线程写入，不在这里 flush）
+        log_update(writer, agent, losses, global_step, episode_count)
+        steps_per_sec = log_throughput(
+            writer,
+            timer,
+            ROLLOUT_STEPS * NUM_ENVS,
+            iter_episodes,
+            global_step,
+            dict(enumerate(ipc_latency / ROLLOUT_STEPS)),
+        )
+        pbar.set_postfix(steps_s=f"{steps_per_sec:.0f}")
+
+        # 保存 checkpoint（后台线程写盘）
+        schedule.save_if_due(
+            ckpt,
+            policy,
+            agent,
+            {"global_step": global_step, "episode_count": episode_count},
         )
-
-        # 记录日志
-        writer.add_scalar("loss/total", loss, global_step)
-        writer.add_scalar("loss/policy", ploss, global_step)
-        writer.add_scalar("loss/value", vloss, global_step)
-        writer.add_scalar("loss/entropy", entropy, global_step)
-        writer.add_scalar("train/episode_count", episode_count, global_step)
-
-        # 立刻 flush 一次，让 TensorBoard 更接近实时
-        writer.flush()
-
-        # 保存 checkpoint
-        if episode_count > 0 and episode_count % CHECKPOINT_INTERVAL == 0:
-            cp_path = f"model/ppo_checkpoint_{episode_count}.pt"
-            torch.save(policy.state_dict(), cp_path)
-            print(f"[INFO] Saved checkpoint: {cp_path}")
 
         # 清空 buffer 指针，准备下一轮收集
-        buffer.ptr = 0
-        buffer.path_start_idx = 0
+        buffer.reset()
 
     pbar.close()
     envs.close()
     writer.close()
+    ckpt.close()
 
-    torch.save(policy.state_dict(), "model/ppo_final.pt")
-    print("[INFO] Final model saved: model/ppo_final.pt")
+    save_candidate(policy)
+
+
+# ---------------------------------------------------------
+# actor / learner 解耦训练
+# ---------------------------------------------------------
+def train_async(resume=None, init=None):
+    create_dirs()
+
+    logging.getLogger("doudizhu").setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"[INFO] Using device: {device}")
+
+    policy_kwargs = dict(state_dim=STATE_DIM, hidden_dim=128, lstm_hidden=128)
+    policy = PPOPolicy(**policy_kwargs)
+    agent = PPOAgent(
+        policy,
+        update_epochs=UPDATE_EPOCHS,
+        minibatch_size=MINIBATCH_SIZE,
+        grad_accum_steps=GRAD_ACCUM_STEPS,
+        target_kl=TARGET_KL,
+    )
+
+    writer = AsyncScalarWriter(SummaryWriter("logs/ppo_train"))
+    timer = PhaseTimer()
+
+    ckpt = CheckpointManager(RUN_CHECKPOINT_DIR, keep_last=KEEP_LAST_CHECKPOINTS)
+    counters = resume_run(ckpt, resume, policy, agent, init)
+
+    # 启动 actor 并下发初始权重
+    pool = ActorPool(
+        num_actors=NUM_ACTORS,
+        envs_per_actor=ENVS_PER_ACTOR,
+        rollout_steps=ROLLOUT_STEPS,
+        compact=COMPACT_STATES,
+        policy_kwargs=policy_kwargs,
+    )
+    version = counters.get("policy_version", 0)
+    pool.broadcast(policy, version)
+
+    global_step = counters.get("global_step", 0)
+    episode_count = counters.get("episode_count", 0)
+    schedule = CheckpointSchedule(episode_count, counters.get("next_episode_mark"))
+    dropped = 0
+
+    pbar = tqdm(
+        total=TOTAL_EPISODES, initial=episode_count, desc="训练进度（按局数）", ncols=120
+    )
+
+    while episode_count < TOTAL_EPISODES:
+        # 从队列收集足够的轨迹；过于陈旧的直接丢弃
+        trajs = []
+        lags = []
+        iter_steps = 0
+        iter_episodes = 0
+        ipc_latency = {}
+        while len(trajs) < TRAJS_PER_UPDATE:
+            with timer.phase("queue_wait"):
+                traj = pool.get()
+            ipc_latency[traj["actor_id"]] = time.time() - traj["sent_at"]
+            for name, seconds in traj["timings"].items():
+                timer.add(f"actor_{name}", seconds / NUM_ACTORS)
+
+            global_step += traj["env_steps"]
+            episode_count += traj["episodes"]
+            iter_steps += traj["env_steps"]
+            iter_episodes += traj["episodes"]
+            pbar.update(traj["episodes"])
+
+            lag = version - traj["policy_version"]
+            if lag > MAX_POLICY_LAG:
+                dropped += 1
+                continue
+            trajs.append(traj)
+            lags.append(lag)
+
+        with timer.phase("vtrace"):
+            batch = merge_trajectories(trajs)
+            states, actions_t, old_logprobs, advantages, returns = vtrace_batch(
+                policy, batch, gamma=agent.gamma, lam=agent.lam, device=device
+            )
+
+        with timer.phase("update"):
+            losses = agent.update(states, actions_t, old_logprobs, advantages, returns)
+        version += 1
+        if version % BROADCAST_INTERVAL == 0:
+            with timer.phase("broadcast"):
+                pool.broadcast(policy, version)
+
+        log_update(writer, agent, losses, global_step, episode_count)
+        writer.add_scalar("async/policy_lag", sum(lags) / len(lags), global_step)
+        writer.add_scalar("async/dropped_trajs", dropped, global_step)
+        writer.add_scalar("async/queue_size", pool.traj_queue.qsize(), global_step)
+        steps_per_sec = log_throughput(
+            writer, timer, iter_steps, iter_episodes, global_step, ipc_latency
+        )
+        pbar.set_postfix(steps_s=f"{steps_per_sec:.0f}")
+
+        # 保存 checkpoint（后台线程写盘）
+        schedule.save_if_due(
+            ckpt,
+            policy,
+            agent,
+            {
+                "global_step": global_step,
+                "episode_count": episode_count,
+                "policy_version": version,
+            },
+        )
+
+    pbar.close()
+    pool.close()
+    writer.close()
+    ckpt.close()
+
+    save_candidate(policy)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DouDiZhu PPO 训练")
+    parser.add_argument(
+        "--mode",
+        choices=("sync", "async"),
+        default="sync",
+        help="sync：收集/更新交替进行；async：多 actor 进程 + learner",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        help=f"从完整断点恢复；不带参数时使用 {RUN_CHECKPOINT_DIR} 下最新的断点",
+    )
+    parser.add_argument(
+        "--init",
+        default=None,
+        help="不恢复断点时，从该 state_dict 初始化策略（如 pretrain.py 的输出）",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    train()
+    args = parse_args()
+    if args.mode == "async":
+        train_async(resume=args.resume, init=args.init)
+    else:
+        train(resume=args.resume, init=args.init)
@@ -5,13 +5,15 @@
 """
 
 import multiprocessing as mp
+from multiprocessing.connection import wait
 import numpy as np
 import logging
+import time
 
 from .env_doudizhu import DouDiZhuEnv
 
 
-def worker(remote, parent_remote):
+def worker(remote, parent_remote, compact=False, seed=None):
     """
     每个子进程的入口。
     在这里直接全局关闭 logging，避免刷屏影响训练进度条。
@@ -21,7 +23,7 @@ def worker(remote, parent_remote):
     # 彻底关闭本进程所有日志输出
     logging.disable(logging.CRITICAL)
 
-    env = DouDiZhuEnv()
+    env = DouDiZhuEnv(compact=compact, seed=seed)
 
     while True:
         cmd, data = remote.recv()
@@ -31,11 +33,16 @@ def worker(remote, parent_remote):
             remote.send((obs, info))
 
         elif cmd == "step":
+            t0 = time.perf_counter()
+            encode_before = env.encode_time
             obs, reward, done, info = env.step(data)
             if done:
                 # 结束后自动重置一局，方便连续训练
                 obs, info_reset = env.reset()
                 info["reset"] = True
+            # 本次 step 在子进程内的耗时，主进程据此扣除得到 IPC 延迟
+            info["step_time"] = time.perf_counter() - t0
+            info["encode_time"] = env.encode_time - encode_before
             remote.send((obs, reward, done, info))
 
         elif cmd == "close":
@@ -47,14 +54,21 @@ def worker(remote, parent_remote):
 
 
 class VectorEnv:
-    def __init__(self, num_envs=16):
+    def __init__(self, num_envs=16, compact=False, seed=None):
         self.num_envs = num_envs
+        self.compact = compact
 
         self.remotes, self.work_remotes = zip(*[mp.Pipe() for _ in range(num_envs)])
         self.processes = []
 
-        for wr, r in zip(self.work_remotes, self.remotes):
-            p = mp.Process(target=worker, args=(wr, r))
+        # 最近一次 step 的性能统计（每个 worker 一项，单位秒）
+        self.last_step_times = np.zeros(num_envs)
+        self.last_encode_times = np.zeros(num_envs)
+        self.last_ipc_latency = np.zeros(num_envs)
+
+        for i, (wr, r) in enumerate(zip(self.work_remotes, self.remotes)):
+            env_seed = None if seed is None else seed + i
+            p = mp.Process(target=worker, args=(wr, r, compact, env_seed))
             p.daemon = True
             p.start()
             wr.close()
@@ -71,11 +85,27 @@ class VectorEnv:
 
     # ---------------------------------------------------------
     def step(self, actions):
-        for remote, act in zip(self.remotes, actions):
+        sent_at = np.zeros(self.num_envs)
+        for i, (remote, act) in enumerate(zip(self.remotes, actions)):
+            sent_at[i] = time.perf_counter()
             remote.send(("step", act))
 
-        results = [remote.recv() for remote in self.remotes]
+        # 按完成顺序接收，记录每个 worker 的往返时间
+        results = [None] * self.num_envs
+        round_trip = np.zeros(self.num_envs)
+        pending = {remote: i for i, remote in enumerate(self.remotes)}
+        while pending:
+            for remote in wait(list(pending)):
+                i = pending.pop(remote)
+                results[i] = remote.recv()
+                round_trip[i] = time.perf_counter() - sent_at[i]
+
         obs, rewards, dones, infos = zip(*results)
+
+        for i, info in enumerate(infos):
+            self.last_step_times[i] = info.get("step_time", 0.0)
+            self.last_encode_times[i] = info.get("encode_time", 0.0)
+        self.last_ipc_latency = round_trip - self.last_step_times
         return (
             np.array(obs),
             np.array(rewards),
@@ -1,38 +1,220 @@
-from typing import Dict, Any
-from fastapi import APIRouter, Query, HTTPException
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Header, Query, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from app.config import ADMIN_TOKEN
-from app.game.runtime import dealer
-from app.utils.helpers import cards_to_str
+from app.game.rooms import Room, rooms as room_registry
+from app.utils.broadcast import Event
+from app.utils.profiler import profiler
+from app.utils.tracing import tracer
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# 还没有任何房间时 /admin/state 返回的空局面
+_IDLE_ROOM = Room("")
 
-@router.get("/state")
-def admin_state(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+HISTORY_PAGE_LIMIT = 500
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _check_token(token: str) -> None:
     if token != ADMIN_TOKEN:
         raise HTTPException(status_code=403, detail="unauthorized")
 
-    state = dealer.state
-    players_info = {}
-    for pid, ps in state.players.items():
-        players_info[pid] = {
-            "role": ps.role.value,
-            "hand_count": len(ps.hand),
-            "hand": [c.dict() for c in ps.hand],
-        }
 
-    history = [
-        {"player_id": r.player_id, "cards": cards_to_str(r.cards), "action_type": r.action_type}
-        for r in state.history
-    ]
+def _get_room(room_id: str) -> Room:
+    room = room_registry.get(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="room not found")
+    return room
+
+
+@router.get("/state")
+async def admin_state(
+    token: str = Query(..., description="管理员 token"),
+    room_id: Optional[str] = Query(None, description="房间 ID；不传时返回最近有动作的房间"),
+) -> Dict[str, Any]:
+    _check_token(token)
+    if room_id is not None:
+        room = _get_room(room_id)
+    else:
+        room = room_registry.latest() or _IDLE_ROOM
+    return room.full_state()
+
+
+# ---------------------------------------------------------
+# 多房间
+# 这些接口都是 async：直接在事件循环里读房间表，和对局推进不会交错
+# ---------------------------------------------------------
+@router.get("/rooms")
+async def admin_rooms(
+    token: str = Query(..., description="管理员 token"),
+    limit: int = Query(200, ge=1, le=5000),
+) -> Dict[str, Any]:
+    """按最近活动时间倒序的房间摘要"""
+    _check_token(token)
+    listed = room_registry.list()
+    return {"total": len(listed), "rooms": [r.summary() for r in listed[:limit]]}
+
 
+@router.get("/rooms/{room_id}/state")
+async def admin_room_state(
+    room_id: str,
+    token: str = Query(..., description="管理员 token"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    单个房间的完整局面。快照按房间 version 缓存（下一次出牌前不会重新序列化），
+    带 ETag；客户端带 If-None-Match 且局面未变时返回 304。
+    """
+    _check_token(token)
+    room = _get_room(room_id)
+    etag = room.etag()
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    etag, body = room.snapshot()
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/rooms/{room_id}/history")
+async def admin_room_history(
+    room_id: str,
+    token: str = Query(..., description="管理员 token"),
+    cursor: Optional[str] = Query(None, description="上一次返回的 next_cursor"),
+    limit: int = Query(HISTORY_PAGE_LIMIT, ge=1, le=HISTORY_PAGE_LIMIT),
+) -> Dict[str, Any]:
+    """
+    增量出牌记录。cursor 形如 "<game_no>:<index>"；
+    房间已经开了新的一局时从头返回，并带 reset=true。
+    """
+    _check_token(token)
+    room = _get_room(room_id)
+
+    start, reset = 0, cursor is not None
+    if cursor:
+        game_part, _, index_part = cursor.partition(":")
+        try:
+            game_no, index = int(game_part), int(index_part)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bad cursor")
+        if game_no == room.game_no:
+            start, reset = index, False
+
+    end = min(len(room.state.history), start + limit)
     return {
-        "players": players_info,
-        "bottom_cards": [c.dict() for c in state.bottom_cards],
-        "landlord_id": state.landlord_id,
-        "current_turn": state.current_turn,
-        "history": history,
-        "multiplier": state.multiplier,
-        "game_over": state.game_over,
-        "winner_side": state.winner_side,
+        "game_no": room.game_no,
+        "reset": reset,
+        "actions": room.history_entries(start, end),
+        "next_cursor": f"{room.game_no}:{end}",
+        "has_more": end < len(room.state.history),
     }
+
+
+@router.get("/rooms/{room_id}/events")
+async def admin_room_events(
+    room_id: str,
+    request: Request,
+    token: str = Query(..., description="管理员 token"),
+):
+    """
+    Server-Sent Events：每一手出牌推送一条增量（move），开新局推送 new_game。
+    连接建立时先发 hello（当前 version），客户端据此拉一次全量快照；
+    客户端太慢导致队列溢出时发 resync，客户端重新拉全量。
+    事件在房间里只编码一次，所有订阅者共用同一份文本。
+    """
+    _check_token(token)
+    room = _get_room(room_id)
+    sub = room.events.subscribe()
+
+    async def stream():
+        try:
+            yield Event(room.version, "hello", room.summary()).sse
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if sub.overflowed:
+                    sub.overflowed = False
+                    yield Event(room.version, "resync", room.summary()).sse
+                elif event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield event.sse
+        finally:
+            room.events.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------------------------------------
+# 采样分析器
+# ---------------------------------------------------------
+@router.post("/profile/start")
+def admin_profile_start(
+    token: str = Query(..., description="管理员 token"),
+    seconds: float = Query(10.0, description="采样时长（秒），上限 300"),
+    interval_ms: float = Query(5.0, description="采样间隔（毫秒）"),
+    ai_only: bool = Query(False, description="只保留 AI 决策（choose_action）中的样本"),
+    rooms: Optional[str] = Query(None, description="只保留这些房间的样本，逗号分隔"),
+) -> Dict[str, Any]:
+    _check_token(token)
+    room_ids = [r for r in rooms.split(",") if r] if rooms else None
+    if not profiler.start(seconds, interval_ms / 1000.0, ai_only=ai_only, rooms=room_ids):
+        raise HTTPException(status_code=409, detail="profile already running")
+    return profiler.status()
+
+
+@router.post("/profile/stop")
+def admin_profile_stop(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+    _check_token(token)
+    profiler.stop()
+    return profiler.status()
+
+
+@router.get("/profile/status")
+def admin_profile_status(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+    _check_token(token)
+    return profiler.status()
+
+
+@router.get("/profile/collapsed", response_class=PlainTextResponse)
+def admin_profile_collapsed(token: str = Query(..., description="管理员 token")):
+    """collapsed stack 文本，可直接喂给 flamegraph.pl / speedscope。"""
+    _check_token(token)
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed.txt"'},
+    )
+
+
+# ---------------------------------------------------------
+# AI 决策耗时拆解
+# ---------------------------------------------------------
+@router.get("/traces/summary")
+def admin_traces_summary(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+    """最近若干次决策中各阶段的 p50/p95/p99"""
+    _check_token(token)
+    return tracer.summary()
+
+
+@router.get("/traces/recent")
+def admin_traces_recent(
+    token: str = Query(..., description="管理员 token"),
+    limit: int = Query(100, ge=1, le=2048),
+) -> Dict[str, Any]:
+    _check_token(token)
+    return {"traces": tracer.recent(limit)}
+
+
+@router.get("/traces/slowest")
+def admin_traces_slowest(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+    _check_token(token)
+    return {"traces": tracer.slowest()}
+
+
+@router.post("/traces/clear")
+def admin_traces_clear(token: str = Query(..., description="管理员 token")) -> Dict[str, Any]:
+    _check_token(token)
+    tracer.clear()
+    return {"status": "ok"}
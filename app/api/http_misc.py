@@ -1,5 +1,7 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from app.config import HOST, PORT
+from app.utils.metrics import registry
 
 router = APIRouter()
 
@@ -18,3 +20,9 @@ def app_info():
         "host": HOST,
         "port": PORT,
     }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 文本格式"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
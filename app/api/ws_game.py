@@ -1,156 +1,313 @@
+import asyncio
 from typing import Dict
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.game.runtime import dealer, ai_engine
-from app.models.card import Card
-from app.utils.logger import logger
+from app.api.ws_protocol import (
+    BINARY_SUBPROTOCOL,
+    PROTOCOL_DELTA,
+    PROTOCOL_LEGACY,
+    SUPPORTED_PROTOCOLS,
+    make_frames,
+    parse_cards,
+)
+from app.game.runtime import ai_engine
+from app.game.rooms import Room, rooms
+from app.utils.broadcast import Subscription
+from app.utils.logger import logger, sampling_filter, set_log_room
+from app.utils.profiler import room_scope
+from app.utils.tracing import span, tracer
 from app.utils.helpers import cards_to_str
+from app.utils.metrics import (
+    AI_DECISIONS,
+    AI_DECISION_SECONDS,
+    GAMES_FINISHED,
+    GAMES_STARTED,
+    PLAY_CARDS_SECONDS,
+    WS_CONNECTIONS,
+    WS_SEND_PENDING,
+    WS_SEND_SECONDS,
+    registry,
+    timed,
+)
 
 router = APIRouter()
 
-# 一个 room_id 对应一个 human 连接
-human_connections: Dict[str, WebSocket] = {}
+# 收到但还没处理的玩家命令上限；满了就暂停读 socket（TCP 自然反压到客户端）
+INBOX_SIZE = 16
+# 待写出的下行帧上限；溢出时积压全部丢弃，合并成一条 sync（玩家视角的完整局面）
+OUTBOX_SIZE = 64
+# 单条消息写不出去超过这么久，认为客户端已经卡死，断开
+SEND_TIMEOUT = 5.0
+# 连续合并（中间一次都没追平）这么多次，说明客户端持续跟不上，断开
+MAX_COALESCES = 3
 
+# 一个 room_id 对应一个 human 连接（一个 RoomActor）；房间本身（裁判 / 局面）在 app.game.rooms 里
+actors: Dict[str, "RoomActor"] = {}
 
-@router.websocket("/ws/game/{room_id}")
-async def ws_game(websocket: WebSocket, room_id: str):
-    await websocket.accept()
-    human_connections[room_id] = websocket
-    logger.info("Human connected room_id=%s", room_id)
-
-    # 开新局
-    dealer.start_new_game()
-    obs = dealer.get_observation("human")
-
-    # 初始化消息：带上当前回合
-    await websocket.send_json(
-        {
-            "type": "init",
-            "you": obs.my_id,
-            "hand": [c.dict() for c in obs.my_hand],
-            "landlord_id": dealer.state.landlord_id,
-            "current_turn": dealer.state.current_turn,
+registry.gauge("doudizhu_active_rooms", "当前有玩家连接的房间数", func=lambda: len(actors))
+WS_SEND_PENDING.set_function(lambda: sum(a.outbox.queue.qsize() for a in actors.values()))
+
+# 按引擎类名打标签；子指标提前取好，热路径上不再查字典
+_ENGINE_NAME = type(ai_engine).__name__
+_AI_DECISIONS = AI_DECISIONS.labels(_ENGINE_NAME)
+_AI_DECISION_SECONDS = AI_DECISION_SECONDS.labels(_ENGINE_NAME)
+
+_LOG_FILTER = sampling_filter()
+
+
+def play_cards(room: Room, player_id: str, cards):
+    with room_scope(room.room_id):
+        with timed(PLAY_CARDS_SECONDS):
+            ok, err = room.dealer.play_cards(player_id, cards)
+    if ok:
+        room.record_move(player_id, cards)
+        if room.state.game_over:
+            # 只有让对局结束的那一手会走到这里（结束后再出牌 ok=False）
+            GAMES_FINISHED.labels(room.state.winner_side).inc()
+    return ok, err
+
+
+class RoomActor:
+    """
+    一个玩家连接 = 三个协程，互相只通过队列交流：
+      reader：收客户端消息放进 inbox（inbox 满时不再读 socket）
+      game：  独占本房间的裁判，逐条处理 inbox 里的命令、驱动 AI；
+              下行帧由 self.frames（按协议版本，见 ws_protocol）编码后放进 outbox，从不等待网络
+      writer：从 outbox 取消息写到 socket；积压溢出时合并成一条 sync，
+              发送超时或持续跟不上则放弃这个连接
+    任何一个协程结束，整个连接就收尾；慢客户端最多占用 OUTBOX_SIZE 条消息的内存。
+    """
+
+    def __init__(self, room: Room, websocket: WebSocket, protocol: int = PROTOCOL_LEGACY,
+                 binary: bool = False, resume: bool = False):
+        self.room = room
+        self.ws = websocket
+        self.resume = resume
+        self._tasks = set()
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=INBOX_SIZE)
+        self.outbox = Subscription(OUTBOX_SIZE)
+        self.frames = make_frames(protocol, self.outbox.offer, binary)
+
+    async def run(self) -> None:
+        self._tasks = tasks = {
+            asyncio.create_task(self.read_loop(), name="reader"),
+            asyncio.create_task(self.game_loop(), name="game"),
+            asyncio.create_task(self.write_loop(), name="writer"),
         }
-    )
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 收掉被取消的协程（以及它们可能抛出的异常），不留 "never retrieved" 警告
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-    # 如果开局就轮到 AI（目前地主固定 human，不会触发），走一遍 AI
-    await drive_ai_until_human(room_id)
+        for task in done:
+            if task.cancelled():
+                continue
+            exc = task.exception()
+            if exc is not None:
+                logger.error("Room %s %s task failed: %r", self.room.room_id, task.get_name(), exc)
+            elif task.get_name() == "writer" and task.result() is not None:
+                logger.warning("Dropping slow client room_id=%s reason=%s dropped=%d",
+                               self.room.room_id, task.result(), self.outbox.dropped)
+                try:
+                    await asyncio.wait_for(self.ws.close(code=1008, reason="too slow"), SEND_TIMEOUT)
+                except Exception:
+                    pass
+
+    async def replace(self) -> None:
+        """同一房间来了新连接：结束本连接（新连接接管对局）"""
+        for task in self._tasks:
+            task.cancel()
+        try:
+            await asyncio.wait_for(self.ws.close(code=4001, reason="replaced"), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    # ---------------------------------------------------------
+    # reader
+    # ---------------------------------------------------------
+    async def read_loop(self) -> None:
+        try:
+            while True:
+                data = await self.frames.receive(self.ws)
+                await self.inbox.put(data)
+        except WebSocketDisconnect:
+            logger.info("Human disconnected room_id=%s", self.room.room_id)
+
+    # ---------------------------------------------------------
+    # writer
+    # ---------------------------------------------------------
+    async def write_loop(self):
+        """连接断开时返回 None；因客户端太慢而放弃时返回原因。"""
+        coalesced = 0
+        send = self.ws.send_bytes if self.frames.binary else self.ws.send_text
+        while True:
+            frame = await self.outbox.get()
+            if self.outbox.overflowed:
+                self.outbox.overflowed = False
+                coalesced += 1
+                if coalesced > MAX_COALESCES:
+                    return "overflow"
+                # sync 反映的是此刻的局面，溢出之后又排进来的消息已经包含在内
+                frame = self.frames.sync(self.room)
+                while not self.outbox.queue.empty():
+                    self.outbox.queue.get_nowait()
+                    self.outbox.dropped += 1
+            elif frame is None:
+                continue
+            elif self.outbox.queue.empty():
+                coalesced = 0
+
+            with timed(WS_SEND_SECONDS):
+                try:
+                    await asyncio.wait_for(send(frame), SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return "send_timeout"
+                except (WebSocketDisconnect, RuntimeError):
+                    return None
+
+    # ---------------------------------------------------------
+    # game
+    # ---------------------------------------------------------
+    async def game_loop(self) -> None:
+        room = self.room
+        dealer = room.dealer
+        frames = self.frames
+
+        if self.resume:
+            # 重连 / 服务重启后续局：不重新发牌
+            frames.resume(room)
+        else:
+            # 开新局
+            room.start_new_game()
+            GAMES_STARTED.inc()
+
+            # 初始化消息：带上当前回合
+            frames.init(room)
+
+        # 如果开局（或断线时）轮到 AI，走一遍 AI
+        await self.drive_ai_until_human()
+        frames.flush(dealer.state)
 
-    try:
         while True:
-            data = await websocket.receive_json()
+            data = await self.inbox.get()
             msg_type = data.get("type")
+            if msg_type == "resync":
+                self.outbox.offer(frames.sync(room))
+                continue
             if msg_type == "play":
-                cards_data = data.get("cards", [])
-                cards = [Card(**c) for c in cards_data]
-                ok, err = dealer.play_cards("human", cards)
+                try:
+                    cards = parse_cards(data.get("cards", []))
+                except ValueError:
+                    # 格式不对的出牌不交给裁判，只回一个失败的 play_result
+                    frames.play_result(False, "invalid_cards")
+                    frames.flush(dealer.state)
+                    continue
+            elif msg_type == "pass":
+                cards = []
+            else:
+                continue
 
-                # 给出牌请求本身的反馈
-                await websocket.send_json(
-                    {"type": "play_result", "ok": ok, "error": err}
-                )
+            ok, err = play_cards(room, "human", cards)
 
-                # 广播人类出牌（含当前回合信息）
-                await broadcast_state(room_id, "human", cards, ok, err)
+            # 给出牌请求本身的反馈
+            frames.play_result(ok, err)
 
-                # 若游戏结束，广播 game_over
-                if dealer.state.game_over:
-                    await send_game_over(room_id)
-                    continue
+            # 广播人类出牌（含当前回合信息）
+            frames.move(dealer.state, "human", cards, ok, err)
+
+            if not dealer.state.game_over:
+                if frames.version == PROTOCOL_LEGACY:
+                    # 先让 writer 把 play_result 写出去，再算 AI
+                    await asyncio.sleep(0)
 
                 # 轮到 AI 的话，一路驱动到再次轮到 human 或结束
-                await drive_ai_until_human(room_id)
+                await self.drive_ai_until_human()
+            else:
+                # 若游戏结束，广播 game_over
+                frames.game_over(dealer.state)
 
-            elif msg_type == "pass":
-                ok, err = dealer.play_cards("human", [])
-                await websocket.send_json(
-                    {"type": "play_result", "ok": ok, "error": err}
-                )
-                await broadcast_state(room_id, "human", [], ok, err)
-
-                if dealer.state.game_over:
-                    await send_game_over(room_id)
-                    continue
+            # v2：本次操作产生的所有事件合并成一帧
+            frames.flush(dealer.state)
 
-                await drive_ai_until_human(room_id)
+    async def drive_ai_until_human(self) -> None:
+        """
+        如果轮到 bot，就循环调用 AI，直到轮到 human 或游戏结束。
+        每次 AI 出牌后都通知前端（v1 立即发 bot_play；v2 攒进本次的 update 帧）。
+        每手之间让出一次事件循环，其它房间和本连接的 writer 不必等整轮 AI 跑完。
+        """
+        room = self.room
+        dealer = room.dealer
+        while (
+            not dealer.state.game_over
+            and dealer.state.current_turn in ("bot1", "bot2")
+        ):
+            pid = dealer.state.current_turn
+            # 采样分析器按 room_scope 把这段（含 choose_action）归到本房间
+            with tracer.trace(room.room_id, pid, _ENGINE_NAME), room_scope(room.room_id):
+                with span("get_observation"):
+                    obs = dealer.get_observation(pid)
+                with timed(_AI_DECISION_SECONDS):
+                    ai_cards = ai_engine.choose_action(obs)
+                _AI_DECISIONS.inc()
+                with span("play_cards"):
+                    ok, err = play_cards(room, pid, ai_cards)
+            logger.info(
+                "AI %s play result: ok=%s, err=%s, cards=%s",
+                pid,
+                ok,
+                err,
+                cards_to_str(ai_cards),
+            )
 
-    except WebSocketDisconnect:
-        logger.info("Human disconnected room_id=%s", room_id)
-        human_connections.pop(room_id, None)
+            # 此时 current_turn 已经被 play_cards 更新为下一家
+            self.frames.move(dealer.state, pid, ai_cards, ok, err)
 
+            if dealer.state.game_over:
+                self.frames.game_over(dealer.state)
+                break
 
-async def drive_ai_until_human(room_id: str):
-    """
-    如果轮到 bot，就循环调用 AI，直到轮到 human 或游戏结束。
-    每次 AI 出牌后，都会向前端发送 bot_play 消息，附带当前回合信息。
-    """
-    ws = human_connections.get(room_id)
-    while (
-        not dealer.state.game_over
-        and dealer.state.current_turn in ("bot1", "bot2")
-    ):
-        pid = dealer.state.current_turn
-        obs = dealer.get_observation(pid)
-        ai_cards = ai_engine.choose_action(obs)
-        ok, err = dealer.play_cards(pid, ai_cards)
-        logger.info(
-            "AI %s play result: ok=%s, err=%s, cards=%s",
-            pid,
-            ok,
-            err,
-            cards_to_str(ai_cards),
-        )
-
-        # 通知前端 AI 出牌，带当前回合信息（此时 current_turn 已经被 play_cards 更新为下一家）
-        if ws:
-            await ws.send_json(
-                {
-                    "type": "bot_play",
-                    "player_id": pid,
-                    "cards": [c.dict() for c in ai_cards],
-                    "ok": ok,
-                    "error": err,
-                    "current_turn": dealer.state.current_turn,
-                    "multiplier": dealer.state.multiplier,
-                }
-            )
+            await asyncio.sleep(0)
 
-        if dealer.state.game_over:
-            await send_game_over(room_id)
-            break
+        # 循环结束时，要么轮到 human，要么游戏结束
 
-    # 循环结束时，要么轮到 human，要么游戏结束
 
+@router.websocket("/ws/game/{room_id}")
+async def ws_game(websocket: WebSocket, room_id: str):
+    # 客户端在 Sec-WebSocket-Protocol 里带 ddz.bin.v1 时用二进制帧（语义同 v2），否则 JSON
+    binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+    await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+    # 本连接任务内的日志都带上 room_id（按房间采样 / JSON 输出用）；子协程会继承
+    set_log_room(room_id)
+    room = rooms.get_or_create(room_id)
+    # ?v=2 选用合并增量帧协议（见 ws_protocol）；不认识的版本按 v1 处理
+    try:
+        protocol = int(websocket.query_params.get("v", PROTOCOL_LEGACY))
+    except ValueError:
+        protocol = PROTOCOL_LEGACY
+    if protocol not in SUPPORTED_PROTOCOLS:
+        protocol = PROTOCOL_LEGACY
+    if binary:
+        protocol = PROTOCOL_DELTA
+    # 同一个 room_id 上还有旧连接（半开的 socket 等）：让新连接接管
+    previous = actors.get(room_id)
+    if previous is not None:
+        await previous.replace()
+    # 对局还没结束就续局，否则开新局
+    resume = room.in_progress
+    actor = RoomActor(room, websocket, protocol, binary, resume)
+    actors[room_id] = actor
+    room.connections += 1
+    WS_CONNECTIONS.inc()
+    logger.info("Human connected room_id=%s resume=%s", room_id, resume)
 
-async def broadcast_state(room_id: str, player_id: str, cards, ok: bool, err):
-    """
-    向前端广播 human 的出牌结果，带上当前回合信息。
-    """
-    ws = human_connections.get(room_id)
-    if not ws:
-        return
-    await ws.send_json(
-        {
-            "type": "human_play",
-            "player_id": player_id,
-            "cards": [c.dict() for c in cards],
-            "ok": ok,
-            "error": err,
-            "current_turn": dealer.state.current_turn,
-            "multiplier": dealer.state.multiplier,
-        }
-    )
-
-
-async def send_game_over(room_id: str):
-    ws = human_connections.get(room_id)
-    if not ws:
-        return
-    state = dealer.state
-    await ws.send_json(
-        {
-            "type": "game_over",
-            "winner_side": state.winner_side,
-            "landlord_id": state.landlord_id,
-            "multiplier": state.multiplier,
-        }
-    )
+    try:
+        await actor.run()
+    finally:
+        WS_CONNECTIONS.dec()
+        room.connections -= 1
+        if actors.get(room_id) is actor:
+            actors.pop(room_id, None)
+        if _LOG_FILTER is not None:
+            _LOG_FILTER.forget_room(room_id)
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+游戏 WebSocket 的下行帧格式
+
+v1（默认，原有格式）：每个事件一帧，牌是完整的 {"rank", "suit"}
+    init / play_result / human_play / bot_play / game_over，客户端太慢时是 sync
+
+v2（连接时带 ?v=2 选用）：一次人类操作产生的所有事件合并成一帧，只带增量
+    {"type": "init", "v": 2, "seq": 0, "you", "hand": [id...], "landlord_id", "current_turn", "multiplier"}
+    {"type": "update", "seq": n,
+     "ok": bool, "error": str|null,              # 本次人类操作的结果（开局 AI 先出时没有）
+     "moves": [[player_id, [id...]], ...],        # 按顺序生效的出牌，[] 为 PASS
+     "turn": player_id,
+     "multiplier": int,                           # 只在倍数变化时出现
+     "game_over": {"winner_side", "landlord_id"}} # 只在本帧结束对局时出现
+    {"type": "sync", "seq": n, ...完整的玩家视角局面...}
+  - 用同一个 room_id 重连且对局还没结束时续局：init 带 "resume": true，之后紧跟一条 sync（v1 同样如此）；
+    客户端应以这条 sync 为准（init 里的 hand / current_turn 是此刻的，但没有上一手牌）
+  - 牌用 deck.card_id 编号：0..51 = (rank-3)*4 + 花色(S/H/D/C = 0..3)，52 小王，53 大王
+  - seq 每帧 +1；客户端发现跳号可以发 {"type": "resync"}，服务端回一条 sync，
+    sync 的 seq 是服务端当前最新的 seq，之后的帧从 seq+1 继续
+  - 上行 play 的 cards 既可以是 id 列表，也可以是原来的 dict 列表
+
+二进制子协议（握手时 Sec-WebSocket-Protocol 带 ddz.bin.v1 选用；不带就是上面的 JSON）：
+    语义与 v2 完全相同，只是每一帧都是二进制消息：
+    固定 4 字节头 <BBH：消息类型、flags、seq（uint16，回绕）
+    座位号 = PLAYER_IDS 下标（human=0, bot1=1, bot2=2），0xFF 表示无
+    牌 = 单字节 card_id；整手牌用 54 位掩码（uint64，第 id 位）
+    下行
+      INIT   (1)  <BBBHQ  you, landlord, turn, multiplier, hand_mask
+                  flags: 32=续局（之后紧跟一条 SYNC）
+      UPDATE (2)  <B turn；[<H multiplier]；[<BB winner, landlord]；[<B len + utf-8 error]；
+                  <B 出牌数，每手 <BB seat, n + n 个 card_id
+                  flags: 1=带本次操作结果 2=ok 4=倍数变化 8=对局结束
+      SYNC   (3)  <BBBHQBBB you, landlord, turn, multiplier, hand_mask, 三家手牌数；
+                  <BB last_non_pass 的 seat, n + n 个 card_id
+                  flags: 8=对局已结束 16=农民胜
+    上行
+      PLAY (0x81) <B n + n 个 card_id；PASS (0x82)、RESYNC (0x83) 只有消息头
+    winner 字节：0=地主胜 1=农民胜
+"""
+
+import json
+import struct
+from typing import Callable, Dict, List, Optional
+
+from app.game.constants import PLAYER_IDS
+from app.game.deck import CARDS_BY_ID, DECK_SIZE, card_id
+from app.models.card import Card
+
+
+PROTOCOL_LEGACY = 1
+PROTOCOL_DELTA = 2
+SUPPORTED_PROTOCOLS = (PROTOCOL_LEGACY, PROTOCOL_DELTA)
+
+BINARY_SUBPROTOCOL = "ddz.bin.v1"
+
+MSG_INIT = 1
+MSG_UPDATE = 2
+MSG_SYNC = 3
+MSG_PLAY = 0x81
+MSG_PASS = 0x82
+MSG_RESYNC = 0x83
+
+FLAG_RESULT = 1
+FLAG_OK = 2
+FLAG_MULTIPLIER = 4
+FLAG_GAME_OVER = 8
+FLAG_FARMERS_WIN = 16
+FLAG_RESUME = 32
+
+NO_SEAT = 0xFF
+
+_HEADER = struct.Struct("<BBH")
+_INIT = struct.Struct("<BBBHQ")
+_SYNC = struct.Struct("<BBBHQBBB")
+_SEAT = {pid: i for i, pid in enumerate(PLAYER_IDS)}
+_WINNER = {"landlord": 0, "farmers": 1}
+_WINNER_NAME = {v: k for k, v in _WINNER.items()}
+
+
+def parse_cards(data) -> List[Card]:
+    """上行 cards：[{"rank", "suit"}, ...] 或 [id, ...]；格式不对（含越界 id）时抛 ValueError"""
+    if not isinstance(data, list):
+        raise ValueError("cards must be a list")
+    cards = []
+    for c in data:
+        if isinstance(c, dict):
+            try:
+                cards.append(Card(**c))
+            except TypeError as e:
+                raise ValueError(f"bad card: {c!r}") from e
+        elif isinstance(c, int) and not isinstance(c, bool) and 0 <= c < DECK_SIZE:
+            cards.append(CARDS_BY_ID[c])
+        else:
+            raise ValueError(f"bad card id: {c!r}")
+    return cards
+
+
+def _ids(cards) -> List[int]:
+    return [card_id(c) for c in cards]
+
+
+def ids_mask(ids) -> int:
+    mask = 0
+    for i in ids:
+        mask |= 1 << i
+    return mask
+
+
+def mask_ids(mask: int) -> List[int]:
+    return [i for i in range(54) if mask >> i & 1]
+
+
+class LegacyFrames:
+    """v1：事件一产生就编码成一帧"""
+
+    version = PROTOCOL_LEGACY
+
+    binary = False
+
+    def __init__(self, emit: Callable[[str], None]):
+        self.emit = emit
+        self.seq = 0
+
+    async def receive(self, websocket) -> Dict:
+        """读一条上行命令，统一成 {"type": ..., "cards": [...]}"""
+        return await websocket.receive_json()
+
+    def _encode(self, payload: dict):
+        return json.dumps(payload, ensure_ascii=False)
+
+    def _send(self, payload: dict) -> None:
+        self.emit(self._encode(payload))
+
+    def init(self, room, resume: bool = False) -> None:
+        obs = room.dealer.get_observation("human")
+        payload = {
+            "type": "init",
+            "you": obs.my_id,
+            "hand": [c.dict() for c in obs.my_hand],
+            "landlord_id": room.state.landlord_id,
+            "current_turn": room.state.current_turn,
+        }
+        if resume:
+            payload["resume"] = True
+        self._send(payload)
+
+    def resume(self, room) -> None:
+        """断线重连续局：init（带 resume 标记）之后紧跟一条 sync（上一手牌、各家手牌数等）"""
+        self.init(room, resume=True)
+        self.emit(self.sync(room))
+
+    def play_result(self, ok: bool, err) -> None:
+        self._send({"type": "play_result", "ok": ok, "error": err})
+
+    def move(self, state, player_id: str, cards, ok: bool, err) -> None:
+        self._send(
+            {
+                "type": "human_play" if player_id == "human" else "bot_play",
+                "player_id": player_id,
+                "cards": [c.dict() for c in cards],
+                "ok": ok,
+                "error": err,
+                "current_turn": state.current_turn,
+                "multiplier": state.multiplier,
+            }
+        )
+
+    def game_over(self, state) -> None:
+        self._send(
+            {
+                "type": "game_over",
+                "winner_side": state.winner_side,
+                "landlord_id": state.landlord_id,
+                "multiplier": state.multiplier,
+            }
+        )
+
+    def flush(self, state) -> None:
+        pass
+
+    def sync(self, room):
+        """玩家视角的完整局面（编码好的帧），用来替代被合并掉的若干帧"""
+        return self._encode(self._sync_payload(room, lambda cards: [c.dict() for c in cards]))
+
+    def _sync_payload(self, room, cards_out) -> dict:
+        state = room.state
+        obs = room.dealer.get_observation("human")
+        last = obs.last_non_pass
+        return {
+            "type": "sync",
+            "seq": self.seq,
+            "you": obs.my_id,
+            "hand": cards_out(obs.my_hand),
+            "landlord_id": state.landlord_id,
+            "current_turn": state.current_turn,
+            "multiplier": state.multiplier,
+            "hand_counts": state.hands_left(),
+            "last_non_pass": (
+                {"player_id": last.player_id, "cards": cards_out(last.cards)} if last else None
+            ),
+            "game_over": state.game_over,
+            "winner_side": state.winner_side,
+        }
+
+
+class DeltaFrames(LegacyFrames):
+    """v2：攒一批，flush() 时合并成一帧 update"""
+
+    version = PROTOCOL_DELTA
+
+    def __init__(self, emit: Callable[[str], None]):
+        super().__init__(emit)
+        self.multiplier = None
+        self._batch: Optional[dict] = None
+
+    def _encode(self, payload: dict):
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def _pending(self) -> dict:
+        if self._batch is None:
+            self._batch = {"moves": []}
+        return self._batch
+
+    def init(self, room, resume: bool = False) -> None:
+        obs = room.dealer.get_observation("human")
+        self.seq = 0
+        self.multiplier = room.state.multiplier
+        self._batch = None
+        payload = {
+            "type": "init",
+            "v": self.version,
+            "seq": self.seq,
+            "you": obs.my_id,
+            "hand": _ids(obs.my_hand),
+            "landlord_id": room.state.landlord_id,
+            "current_turn": room.state.current_turn,
+            "multiplier": self.multiplier,
+        }
+        if resume:
+            payload["resume"] = True
+        self._send(payload)
+
+    def play_result(self, ok: bool, err) -> None:
+        batch = self._pending()
+        batch["ok"] = ok
+        batch["error"] = err
+
+    def move(self, state, player_id: str, cards, ok: bool, err) -> None:
+        # 没生效的出牌不改变局面；人类的错误已经在 play_result 里
+        if ok:
+            self._pending()["moves"].append([player_id, _ids(cards)])
+
+    def game_over(self, state) -> None:
+        self._pending()["game_over"] = {
+            "winner_side": state.winner_side,
+            "landlord_id": state.landlord_id,
+        }
+
+    def flush(self, state) -> None:
+        batch = self._batch
+        if batch is None:
+            return
+        self._batch = None
+        self.seq += 1
+        frame = {"type": "update", "seq": self.seq}
+        frame.update(batch)
+        frame["turn"] = state.current_turn
+        if state.multiplier != self.multiplier:
+            self.multiplier = state.multiplier
+            frame["multiplier"] = self.multiplier
+        self._send(frame)
+
+    def sync(self, room) -> str:
+        # 还没 flush 的增量已经包含在这份完整局面里，丢掉以免客户端重复应用
+        self._batch = None
+        self.multiplier = room.state.multiplier
+        return self._encode(self._sync_payload(room, _ids))
+
+
+class BinaryFrames(DeltaFrames):
+    """ddz.bin.v1：与 v2 同样的批次，编码成二进制帧（格式见模块说明）"""
+
+    binary = True
+
+    async def receive(self, websocket) -> Dict:
+        return decode_command(await websocket.receive_bytes())
+
+    def _encode(self, payload: dict) -> bytes:
+        kind = payload["type"]
+        if kind == "update":
+            return encode_update(payload)
+        if kind == "init":
+            flags = FLAG_RESUME if payload.get("resume") else 0
+            return _HEADER.pack(MSG_INIT, flags, 0) + _INIT.pack(
+                _SEAT[payload["you"]],
+                _SEAT.get(payload["landlord_id"], NO_SEAT),
+                _SEAT.get(payload["current_turn"], NO_SEAT),
+                payload["multiplier"],
+                ids_mask(payload["hand"]),
+            )
+        if kind == "sync":
+            return encode_sync(payload)
+        raise ValueError(f"unknown frame type: {kind}")
+
+
+def make_frames(version: int, emit: Callable, binary: bool = False) -> LegacyFrames:
+    if binary:
+        return BinaryFrames(emit)
+    if version == PROTOCOL_DELTA:
+        return DeltaFrames(emit)
+    return LegacyFrames(emit)
+
+
+# ---------------------------------------------------------
+# 二进制编解码（服务端用 encode_* / decode_command，客户端用 decode_frame / encode_command）
+# ---------------------------------------------------------
+def _pack_ids(seat: int, ids) -> bytes:
+    return bytes((seat, len(ids))) + bytes(ids)
+
+
+def encode_update(frame: dict) -> bytes:
+    flags = 0
+    body = [bytes((_SEAT.get(frame["turn"], NO_SEAT),))]
+    if "multiplier" in frame:
+        flags |= FLAG_MULTIPLIER
+        body.append(struct.pack("<H", frame["multiplier"]))
+    over = frame.get("game_over")
+    if over is not None:
+        flags |= FLAG_GAME_OVER
+        body.append(bytes((_WINNER[over["winner_side"]], _SEAT.get(over["landlord_id"], NO_SEAT))))
+    if "ok" in frame:
+        flags |= FLAG_RESULT
+        if frame["ok"]:
+            flags |= FLAG_OK
+        else:
+            err = (frame.get("error") or "").encode("utf-8")[:255]
+            body.append(bytes((len(err),)) + err)
+    moves = frame["moves"]
+    body.append(bytes((len(moves),)))
+    for pid, ids in moves:
+        body.append(_pack_ids(_SEAT[pid], ids))
+    return _HEADER.pack(MSG_UPDATE, flags, frame["seq"] & 0xFFFF) + b"".join(body)
+
+
+def encode_sync(payload: dict) -> bytes:
+    flags = 0
+    if payload["game_over"]:
+        flags |= FLAG_GAME_OVER
+        if payload["winner_side"] == "farmers":
+            flags |= FLAG_FARMERS_WIN
+    counts = payload["hand_counts"]
+    last = payload["last_non_pass"]
+    return (
+        _HEADER.pack(MSG_SYNC, flags, payload["seq"] & 0xFFFF)
+        + _SYNC.pack(
+            _SEAT[payload["you"]],
+            _SEAT.get(payload["landlord_id"], NO_SEAT),
+            _SEAT.get(payload["current_turn"], NO_SEAT),
+            payload["multiplier"],
+            ids_mask(payload["hand"]),
+            *(counts[pid] for pid in PLAYER_IDS),
+        )
+        + (_pack_ids(_SEAT[last["player_id"]], last["cards"]) if last else bytes((NO_SEAT, 0)))
+    )
+
+
+def decode_command(data: bytes) -> Dict:
+    """上行二进制命令 -> 与 JSON 上行相同的 dict（cards 为 card_id 列表）"""
+    kind, _, _ = _HEADER.unpack_from(data)
+    if kind == MSG_PLAY:
+        n = data[_HEADER.size]
+        start = _HEADER.size + 1
+        return {"type": "play", "cards": list(data[start:start + n])}
+    if kind == MSG_PASS:
+        return {"type": "pass"}
+    if kind == MSG_RESYNC:
+        return {"type": "resync"}
+    return {"type": None}
+
+
+def encode_command(kind: str, ids=()) -> bytes:
+    if kind == "play":
+        return _HEADER.pack(MSG_PLAY, 0, 0) + bytes((len(ids),)) + bytes(ids)
+    if kind == "pass":
+        return _HEADER.pack(MSG_PASS, 0, 0)
+    if kind == "resync":
+        return _HEADER.pack(MSG_RESYNC, 0, 0)
+    raise ValueError(f"unknown command: {kind}")
+
+
+def _seat_id(seat: int) -> Optional[str]:
+    return None if seat == NO_SEAT else PLAYER_IDS[seat]
+
+
+def decode_frame(data: bytes) -> Dict:
+    """下行二进制帧 -> 与 v2 JSON 相同结构的 dict（客户端 / 压测用）"""
+    kind, flags, seq = _HEADER.unpack_from(data)
+    pos = _HEADER.size
+    if kind == MSG_INIT:
+        you, landlord, turn, multiplier, mask = _INIT.unpack_from(data, pos)
+        frame = {
+            "type": "init", "v": PROTOCOL_DELTA, "seq": seq, "you": PLAYER_IDS[you],
+            "hand": mask_ids(mask), "landlord_id": _seat_id(landlord),
+            "current_turn": _seat_id(turn), "multiplier": multiplier,
+        }
+        if flags & FLAG_RESUME:
+            frame["resume"] = True
+        return frame
+
+    if kind == MSG_UPDATE:
+        frame = {"type": "update", "seq": seq, "turn": _seat_id(data[pos])}
+        pos += 1
+        if flags & FLAG_MULTIPLIER:
+            frame["multiplier"], = struct.unpack_from("<H", data, pos)
+            pos += 2
+        if flags & FLAG_GAME_OVER:
+            frame["game_over"] = {"winner_side": _WINNER_NAME[data[pos]], "landlord_id": _seat_id(data[pos + 1])}
+            pos += 2
+        if flags & FLAG_RESULT:
+            frame["ok"] = bool(flags & FLAG_OK)
+            frame["error"] = None
+            if not frame["ok"]:
+                n = data[pos]
+                frame["error"] = data[pos + 1:pos + 1 + n].decode("utf-8")
+                pos += 1 + n
+        moves = []
+        for _ in range(data[pos]):
+            seat, n = data[pos + 1], data[pos + 2]
+            moves.append([PLAYER_IDS[seat], list(data[pos + 3:pos + 3 + n])])
+            pos += 2 + n
+        frame["moves"] = moves
+        return frame
+
+    if kind == MSG_SYNC:
+        you, landlord, turn, multiplier, mask, *counts = _SYNC.unpack_from(data, pos)
+        pos += _SYNC.size
+        seat, n = data[pos], data[pos + 1]
+        game_over = bool(flags & FLAG_GAME_OVER)
+        return {
+            "type": "sync", "seq": seq, "you": PLAYER_IDS[you], "hand": mask_ids(mask),
+            "landlord_id": _seat_id(landlord), "current_turn": _seat_id(turn),
+            "multiplier": multiplier, "hand_counts": dict(zip(PLAYER_IDS, counts)),
+            "last_non_pass": (
+                None if seat == NO_SEAT
+                else {"player_id": PLAYER_IDS[seat], "cards": list(data[pos + 2:pos + 2 + n])}
+            ),
+            "game_over": game_over,
+            "winner_side": (("farmers" if flags & FLAG_FARMERS_WIN else "landlord") if game_over else None),
+        }
+
+    raise ValueError(f"unknown frame type: {kind}")
@@ -0,0 +1,106 @@
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.game.rooms import Room, rooms
+from app.utils.broadcast import Event, Subscription
+from app.utils.logger import logger
+from app.utils.metrics import SPECTATOR_RESYNCS, SPECTATORS, SPECTATORS_DROPPED
+
+router = APIRouter()
+
+# 每个观战连接的待发事件上限；溢出时清空并合并成一次 resync（全量公开局面）
+SPECTATOR_QUEUE_SIZE = 64
+# 单条消息写不出去超过这么久，认为对方已经卡死，直接断开
+SPECTATOR_SEND_TIMEOUT = 5.0
+# 连续溢出（中间一次都没追平）这么多次，说明对方持续跟不上，断开
+SPECTATOR_MAX_RESYNCS = 3
+# 房间一直没有动静时，多久发一次心跳（顺带发现已经断开的连接）
+SPECTATOR_PING_SECONDS = 30.0
+
+_PING_FRAME = '{"type":"ping"}'
+
+
+@router.websocket("/ws/watch/{room_id}")
+async def ws_watch(websocket: WebSocket, room_id: str):
+    """
+    观战：只读地订阅房间事件。
+    - 连接后先收到 snapshot（公开局面：手牌数、底牌、出牌记录，不含任何人的手牌）
+    - 之后每一手收到 move，开新局收到 new_game；消息格式 {"type", "seq", "data"}
+    - 事件在房间里只编码一次，所有观战者发送同一份文本
+    - 跟不上的观战者：积压的事件被合并成一次 resync；持续跟不上或发送超时则断开，
+      不会拖慢对局本身
+    """
+    await websocket.accept()
+    room = rooms.get(room_id)
+    if room is None:
+        await websocket.close(code=4404, reason="room not found")
+        return
+
+    sub = room.events.subscribe(SPECTATOR_QUEUE_SIZE)
+    room.spectators += 1
+    SPECTATORS.inc()
+    logger.info("Spectator connected room_id=%s spectators=%d", room_id, room.spectators)
+
+    writer = asyncio.create_task(_pump(websocket, room, sub))
+    reader = asyncio.create_task(_drain(websocket))
+    try:
+        done, _ = await asyncio.wait({writer, reader}, return_when=asyncio.FIRST_COMPLETED)
+        if writer in done and writer.exception() is None and writer.result() is not None:
+            reason = writer.result()
+            SPECTATORS_DROPPED.labels(reason).inc()
+            logger.warning("Spectator dropped room_id=%s reason=%s dropped_events=%d",
+                           room_id, reason, sub.dropped)
+            await _close(websocket)
+    finally:
+        writer.cancel()
+        reader.cancel()
+        room.events.unsubscribe(sub)
+        room.spectators -= 1
+        SPECTATORS.dec()
+
+
+async def _pump(websocket: WebSocket, room: Room, sub: Subscription):
+    """把订阅队列里的事件写给观战者；正常断开返回 None，因过慢被断开时返回原因。"""
+    resyncs = 0
+    try:
+        await _send(websocket, Event(room.version, "snapshot", room.public_state()).frame)
+        while True:
+            event = await sub.get(timeout=SPECTATOR_PING_SECONDS)
+            if sub.overflowed:
+                sub.overflowed = False
+                resyncs += 1
+                if resyncs > SPECTATOR_MAX_RESYNCS:
+                    return "overflow"
+                SPECTATOR_RESYNCS.inc()
+                await _send(websocket, Event(room.version, "resync", room.public_state()).frame)
+            elif event is None:
+                await _send(websocket, _PING_FRAME)
+            else:
+                await _send(websocket, event.frame)
+                if sub.queue.empty():
+                    resyncs = 0
+    except asyncio.TimeoutError:
+        return "send_timeout"
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        return None
+
+
+async def _send(websocket: WebSocket, text: str) -> None:
+    await asyncio.wait_for(websocket.send_text(text), SPECTATOR_SEND_TIMEOUT)
+
+
+async def _drain(websocket: WebSocket) -> None:
+    """观战者不需要发消息；这里只是为了及时发现对方断开。"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+    except RuntimeError:
+        return
+
+
+async def _close(websocket: WebSocket) -> None:
+    try:
+        await asyncio.wait_for(websocket.close(code=1008, reason="too slow"), SPECTATOR_SEND_TIMEOUT)
+    except Exception:
+        pass
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准（固定种子，可复现）
+
+运行并保存结果：
+    python -m app.bench.run_bench --out bench/baseline.json
+
+与基线比较（吞吐下降超过阈值即判为回归，退出码为 1）：
+    python -m app.bench.run_bench --compare bench/baseline.json --threshold 0.10
+
+覆盖：
+- rules.classify_type / rules.can_beat       真实候选动作分布
+- movegen.dealer_moves / movegen.env          动作生成
+- referee.play_cards / referee.get_observation
+- deal.system / deal.seeded / deal.batch  发牌（SystemRandom vs PRNG vs numpy 批量）
+- encoder.encode_state
+- policy.forward[b=N]                         多个 batch 大小（需要 torch）
+- selfplay.random_games                       端到端随机自对弈 局/秒
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from app.bench.workloads import Workload, deal_seeded
+from app.game.constants import PLAYER_IDS
+from app.game.dealer import DealerReferee
+from app.game.dealer_moves import get_all_valid_moves
+from app.game.deck import batch_deals, shuffled_deck
+from app.game.rules import DouDiZhuRules
+from app.models.card import Card
+
+
+POLICY_BATCH_SIZES = (1, 32, 256, 1024)
+
+
+# ---------------------------------------------------------
+# 计时
+# ---------------------------------------------------------
+def measure(fn, n_ops, repeats=5, warmup=1):
+    """
+    fn 每次调用完成 n_ops 次操作；取 repeats 次中最快的一次计算吞吐。
+    """
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    best = min(times)
+    return {
+        "n": n_ops,
+        "repeats": repeats,
+        "best_sec": best,
+        "median_sec": statistics.median(times),
+        "ops_per_sec": n_ops / best if best > 0 else float("inf"),
+        "us_per_op": best / n_ops * 1e6,
+    }
+
+
+# ---------------------------------------------------------
+# 各项基准：返回 (fn, n_ops)
+# ---------------------------------------------------------
+def bench_classify(w):
+    moves = w.candidate_moves
+    classify = DouDiZhuRules.classify_type
+
+    def run():
+        for m in moves:
+            classify(m)
+
+    return run, len(moves)
+
+
+def bench_can_beat(w):
+    pairs = w.beat_pairs
+    can_beat = DouDiZhuRules.can_beat
+
+    def run():
+        for prev, cur in pairs:
+            can_beat(prev, cur)
+
+    return run, len(pairs)
+
+
+def bench_movegen_dealer(w):
+    positions = w.positions
+
+    def run():
+        for dealer in positions:
+            get_all_valid_moves(dealer, dealer.state.current_turn)
+
+    return run, len(positions)
+
+
+def bench_movegen_env(w):
+    from app.ai.rl.env_doudizhu import DouDiZhuEnv
+
+    env = DouDiZhuEnv()
+    observations = [d.get_observation(d.state.current_turn) for d in w.positions]
+
+    def run():
+        for obs in observations:
+            env.generate_legal_moves(obs)
+
+    return run, len(observations)
+
+
+def bench_play_cards(w):
+    games = [
+        (g.deck_order, [(pid, [Card(rank=r, suit=s) for r, s in cards]) for pid, cards in g.actions])
+        for g in w.games
+    ]
+    dealer = DealerReferee()
+
+    def run():
+        for deck_order, actions in games:
+            deal_seeded(dealer, deck_order)
+            for pid, cards in actions:
+                dealer.play_cards(pid, cards)
+
+    return run, w.total_actions()
+
+
+def bench_get_observation(w):
+    positions = w.positions
+
+    def run():
+        for dealer in positions:
+            for pid in PLAYER_IDS:
+                dealer.get_observation(pid)
+
+    return run, len(positions) * len(PLAYER_IDS)
+
+
+def make_bench_deal(kind, num_deals=2000):
+    def bench(w):
+        if kind == "batch":
+            def run():
+                batch_deals(num_deals, seed=w.seed)
+        else:
+            rng = None if kind == "system" else random.Random(w.seed)
+
+            def run():
+                for _ in range(num_deals):
+                    shuffled_deck(rng)
+
+        return run, num_deals
+
+    return bench
+
+
+def bench_encoder(w):
+    from app.ai.rl.encoding import encode_state
+
+    observations = [d.get_observation(pid) for d in w.positions for pid in PLAYER_IDS]
+
+    def run():
+        for obs in observations:
+            encode_state(obs)
+
+    return run, len(observations)
+
+
+def make_bench_policy_forward(batch_size, iters=20):
+    def bench(w):
+        import numpy as np
+        import torch
+        from app.ai.rl.model_ppo import PPOPolicy
+        from app.ai.rl.encoding import STATE_DIM
+
+        torch.manual_seed(w.seed)
+        policy = PPOPolicy()
+        policy.eval()
+        device = next(policy.parameters()).device
+
+        rng = np.random.default_rng(w.seed)
+        states = torch.from_numpy(
+            rng.integers(0, 18, size=(batch_size, STATE_DIM), dtype=np.uint8)
+        ).to(device)
+
+        def run():
+            with torch.no_grad():
+                for _ in range(iters):
+                    policy.forward(states)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+
+        return run, batch_size * iters
+
+    return bench
+
+
+def bench_selfplay(w, num_games=50):
+    decks = []
+    rng = random.Random(w.seed + 1)
+    for _ in range(num_games):
+        decks.append([(c.rank, c.suit) for c in shuffled_deck(rng)])
+
+    def run():
+        play_rng = random.Random(w.seed + 2)
+        dealer = DealerReferee()
+        for deck_order in decks:
+            deal_seeded(dealer, deck_order)
+            while not dealer.state.game_over:
+                pid = dealer.state.current_turn
+                moves = get_all_valid_moves(dealer, pid)
+                dealer.play_cards(pid, moves[play_rng.randrange(len(moves))])
+
+    return run, num_games
+
+
+BENCHMARKS = [
+    ("rules.classify_type", bench_classify),
+    ("rules.can_beat", bench_can_beat),
+    ("movegen.dealer_moves", bench_movegen_dealer),
+    ("movegen.env", bench_movegen_env),
+    ("referee.play_cards", bench_play_cards),
+    ("referee.get_observation", bench_get_observation),
+    ("deal.system", make_bench_deal("system")),
+    ("deal.seeded", make_bench_deal("seeded")),
+    ("deal.batch", make_bench_deal("batch")),
+    ("encoder.encode_state", bench_encoder),
+] + [
+    (f"policy.forward[b={b}]", make_bench_policy_forward(b)) for b in POLICY_BATCH_SIZES
+] + [
+    ("selfplay.random_games", bench_selfplay),
+]
+
+
+# ---------------------------------------------------------
+# 运行 / 比较
+# ---------------------------------------------------------
+def run_all(seed=2024, num_games=200, repeats=5, only=None):
+    t0 = time.perf_counter()
+    w = Workload(seed=seed, num_games=num_games)
+    print(f"[INFO] Workload ready: {num_games} games, {time.perf_counter() - t0:.1f}s")
+
+    results = {}
+    for name, factory in BENCHMARKS:
+        if only and not any(key in name for key in only):
+            continue
+        try:
+            fn, n_ops = factory(w)
+        except ImportError as e:
+            print(f"[SKIP] {name}: {e}")
+            continue
+        results[name] = measure(fn, n_ops, repeats=repeats)
+        r = results[name]
+        print(f"{name:<28} {r['ops_per_sec']:>14,.0f} ops/s  {r['us_per_op']:>10.2f} us/op")
+
+    return {
+        "meta": {
+            "seed": seed,
+            "num_games": num_games,
+            "repeats": repeats,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.10):
+    """返回回归项名称列表；同时打印对比表。"""
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>14} {cur['ops_per_sec']:>14,.0f} {'new':>9}")
+            continue
+        ratio = cur["ops_per_sec"] / base["ops_per_sec"]
+        flag = ""
+        if ratio < 1.0 - threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<28} {base['ops_per_sec']:>14,.0f} {cur['ops_per_sec']:>14,.0f} "
+            f"{(ratio - 1.0) * 100:>+8.1f}%{flag}"
+        )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DouDiZhu 性能基准")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--games", type=int, default=200, help="录制多少局作为工作负载")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="只运行名称包含这些子串的基准")
+    parser.add_argument("--out", help="结果 JSON 输出路径")
+    parser.add_argument("--compare", help="基线 JSON 路径")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="吞吐下降超过该比例判为回归"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # 裁判每步都会打 INFO 日志，基准里全部关掉
+    logging.disable(logging.CRITICAL)
+
+    report = run_all(seed=args.seed, num_games=args.games, repeats=args.repeats, only=args.only)
+
+    if args.out:
+        out_dir = os.path.dirname(args.out)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Results saved: {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"[WARN] {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("[INFO] No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准的固定工作负载（全部由种子决定，可复现）
+- 用带种子的随机自对弈录制若干局：发牌顺序 + 每一步出牌 + 每个局面的候选动作
+- 各个基准从录制数据中取“真实分布”的输入：牌型识别、压牌比较、动作生成、出牌、观测、编码、前向
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+from app.game.constants import PLAYER_IDS, PlayerRole
+from app.game.dealer import DealerReferee
+from app.game.dealer_moves import get_all_valid_moves
+from app.game.deck import shuffled_deck
+from app.game.rules import DouDiZhuRules
+from app.game.state import GameState
+from app.models.card import Card
+
+
+# ---------------------------------------------------------
+# 带种子的发牌（与 DealerReferee.start_new_game 相同的布局：human 为地主）
+# ---------------------------------------------------------
+def deal_seeded(dealer: DealerReferee, deck_order: List[Tuple[int, str]]) -> None:
+    deck = [Card(rank=r, suit=s) for r, s in deck_order]
+    state = GameState.initial()
+    for i, pid in enumerate(PLAYER_IDS):
+        state.players[pid].hand = deck[17 * i : 17 * (i + 1)]
+        state.players[pid].role = PlayerRole.FARMER
+    state.bottom_cards = deck[51:]
+
+    state.landlord_id = "human"
+    state.players["human"].role = PlayerRole.LANDLORD
+    state.players["human"].hand.extend(state.bottom_cards)
+    state.current_turn = "human"
+    dealer.state = state
+
+
+class RecordedGame:
+    """一局随机自对弈的完整记录。"""
+
+    __slots__ = ("deck_order", "actions")
+
+    def __init__(self, deck_order, actions):
+        self.deck_order = deck_order   # [(rank, suit)] * 54
+        self.actions = actions         # [(player_id, [(rank, suit), ...])]
+
+
+class Workload:
+    """
+    由录制的对局派生出的各基准输入。
+    """
+
+    def __init__(self, seed: int = 2024, num_games: int = 200):
+        self.seed = seed
+        self.num_games = num_games
+        rng = random.Random(seed)
+
+        self.games: List[RecordedGame] = []
+        self.candidate_moves: List[List[Card]] = []    # 动作生成阶段需要识别的所有候选
+        self.beat_pairs: List[Tuple] = []               # (上一手牌型, 候选牌型)
+        self.positions: List[DealerReferee] = []        # 对局中途的局面（用于观测 / 动作生成）
+
+        for _ in range(num_games):
+            self.games.append(self._record_game(rng))
+
+    # ---------------------------------------------------------
+    def _record_game(self, rng: random.Random) -> RecordedGame:
+        deck_order = [(c.rank, c.suit) for c in shuffled_deck(rng)]
+
+        dealer = DealerReferee()
+        deal_seeded(dealer, deck_order)
+
+        # 随机选一个中途局面留作观测 / 动作生成基准
+        snapshot_turn = rng.randrange(1, 30)
+
+        actions = []
+        turn = 0
+        while not dealer.state.game_over:
+            pid = dealer.state.current_turn
+            self._collect_candidates(dealer, pid)
+
+            moves = get_all_valid_moves(dealer, pid)
+            choice = moves[rng.randrange(len(moves))]
+            dealer.play_cards(pid, choice)
+            actions.append((pid, [(c.rank, c.suit) for c in choice]))
+
+            turn += 1
+            if turn == snapshot_turn and not dealer.state.game_over:
+                self.positions.append(self.replay(deck_order, actions))
+
+        return RecordedGame(deck_order, actions)
+
+    def _collect_candidates(self, dealer: DealerReferee, pid: str) -> None:
+        """与 generate_legal_moves 相同的候选枚举；需要压牌时同时记录 (上一手, 候选) 牌型对。"""
+        hand = sorted(dealer.state.players[pid].hand, key=lambda c: (c.rank, c.suit))
+        ranks: Dict[int, List[Card]] = {}
+        candidates = []
+        for c in hand:
+            candidates.append([c])
+            ranks.setdefault(c.rank, []).append(c)
+        for lst in ranks.values():
+            for n in (2, 3, 4):
+                if len(lst) >= n:
+                    candidates.append(lst[:n])
+        self.candidate_moves.extend(candidates)
+
+        last = dealer.state.last_non_pass
+        if last is not None and last.player_id != pid:
+            prev_ct = DouDiZhuRules.classify_type(last.cards)
+            for m in candidates:
+                ct = DouDiZhuRules.classify_type(m)
+                if ct is not None:
+                    self.beat_pairs.append((prev_ct, ct))
+
+    # ---------------------------------------------------------
+    @staticmethod
+    def replay(deck_order, actions) -> DealerReferee:
+        """按记录重放一局（或一局的前若干步），返回对应局面的 DealerReferee。"""
+        dealer = DealerReferee()
+        deal_seeded(dealer, deck_order)
+        for pid, cards in actions:
+            dealer.play_cards(pid, [Card(rank=r, suit=s) for r, s in cards])
+        return dealer
+
+    def total_actions(self) -> int:
+        return sum(len(g.actions) for g in self.games)
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 压测：模拟大量人类玩家连接 /ws/game/{room_id}（只在本机跑）
+
+每个模拟客户端：
+- 连接后根据 init 里的手牌自己维护手牌 / 上一手牌，轮到自己时从合法动作中随机出一手（压不住就 pass）
+- 一局结束后换一个新 room_id 重连，继续下一局；room_id 带本次运行的随机前缀，
+  不会续上之前压测留在对局日志里的旧局（万一碰上续局，按 init + sync 接着打，并计入 errors["resumed"]）
+- 记录从发出 play/pass 开始的耗时：
+    ack       收到 play_result
+    bot_play  收到第一条 bot_play
+    turn      再次轮到自己（最后一条 bot_play）
+    game_over 收到 game_over
+按阶段逐级加压（例如 50 → 200 → 1000 个并发客户端），每个阶段输出吞吐和 p50/p95/p99/max，
+以及每手平均收到的帧数 / 字节数。
+--protocol 2 时使用合并增量帧协议（见 app.api.ws_protocol）：一次操作只回一帧 update，
+ack / turn / game_over 都以收到这一帧为准，没有单独的 bot_play。
+--binary 时协商 ddz.bin.v1 二进制子协议（语义同 v2）。
+
+示例：
+    # 自动拉起一个 uvicorn 实例并压测
+    python -m app.bench.ws_load --spawn --stages 50 200 500 1000 --stage-seconds 20
+
+    # 压已经在跑的服务
+    python -m app.bench.ws_load --url ws://127.0.0.1:8080 --stages 100 300
+
+    # 对比 v2 协议 / 二进制子协议
+    python -m app.bench.ws_load --spawn --stages 200 --protocol 2
+    python -m app.bench.ws_load --spawn --stages 200 --binary
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+from app.api.ws_protocol import BINARY_SUBPROTOCOL, decode_frame, encode_command
+from app.eval.arena import percentiles
+from app.game.dealer_moves import get_valid_moves_from_obs
+from app.game.deck import card_id, cards_from_ids
+from app.models.card import ActionRecord, Card, Observation
+
+
+LATENCY_KINDS = ("connect", "ack", "bot_play", "turn", "game_over")
+RECV_TIMEOUT = 10.0   # 单条消息等待上限；超时记为错误并放弃这一局
+MAX_TURNS = 200
+
+
+# ---------------------------------------------------------
+# 统计
+# ---------------------------------------------------------
+class LoadStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.moves = 0
+        self.games = 0
+        self.frames = 0
+        self.bytes = 0
+        self.started_at = time.perf_counter()
+
+    def add(self, kind, seconds):
+        self.latencies[kind].append(seconds)
+
+    def snapshot(self, clients):
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "clients": clients,
+            "elapsed_sec": elapsed,
+            "games": self.games,
+            "moves": self.moves,
+            "games_per_sec": self.games / elapsed if elapsed > 0 else 0.0,
+            "moves_per_sec": self.moves / elapsed if elapsed > 0 else 0.0,
+            "frames_per_move": self.frames / self.moves if self.moves else 0.0,
+            "bytes_per_move": self.bytes / self.moves if self.moves else 0.0,
+            "errors": dict(self.errors),
+            "latency_ms": {
+                kind: dict(
+                    count=len(self.latencies[kind]),
+                    max=max(self.latencies[kind]) * 1000.0 if self.latencies[kind] else None,
+                    **percentiles(self.latencies[kind]),
+                )
+                for kind in LATENCY_KINDS
+            },
+        }
+
+
+# ---------------------------------------------------------
+# 模拟客户端
+# ---------------------------------------------------------
+def _cards(data):
+    return [Card(**c) for c in data]
+
+
+def _apply_sync(msg, decode=_cards):
+    """sync 消息 -> (hand, last_non_pass, current_turn, game_over)；v2 的牌是 id，decode 传 cards_from_ids"""
+    last = msg.get("last_non_pass")
+    last_non_pass = ActionRecord(last["player_id"], decode(last["cards"]), "play") if last else None
+    return decode(msg["hand"]), last_non_pass, msg["current_turn"], msg["game_over"]
+
+
+def _apply_update(frame, my_id, hand, last_non_pass):
+    """v2 update 帧 -> (hand, last_non_pass)"""
+    for pid, ids in frame["moves"]:
+        if not ids:
+            continue
+        if pid == my_id:
+            played = set(ids)
+            hand = [c for c in hand if card_id(c) not in played]
+        last_non_pass = ActionRecord(pid, cards_from_ids(ids), "play")
+    return hand, last_non_pass
+
+
+class SimulatedClient:
+    def __init__(self, client_id, base_url, stats, stop_event, think_ms=0.0, seed=0, protocol=1,
+                 binary=False, run_id=""):
+        self.client_id = client_id
+        self.run_id = run_id
+        self.base_url = base_url
+        self.stats = stats
+        self.stop_event = stop_event
+        self.think = think_ms / 1000.0
+        self.rng = random.Random(seed * 100003 + client_id)
+        self.game_no = 0
+        self.protocol = 2 if binary else protocol
+        self.binary = binary
+
+    async def run(self):
+        import websockets
+
+        while not self.stop_event.is_set():
+            room_id = f"load-{self.run_id}-{self.client_id}-{self.game_no}"
+            self.game_no += 1
+            t0 = time.perf_counter()
+            try:
+                query = f"?v={self.protocol}" if self.protocol != 1 else ""
+                subprotocols = [BINARY_SUBPROTOCOL] if self.binary else None
+                async with websockets.connect(
+                    f"{self.base_url}/ws/game/{room_id}{query}", max_size=None, subprotocols=subprotocols
+                ) as ws:
+                    if self.binary and ws.subprotocol != BINARY_SUBPROTOCOL:
+                        self.stats.errors["no_binary"] += 1
+                        return
+                    self.stats.add("connect", time.perf_counter() - t0)
+                    if self.protocol == 2:
+                        await self.play_one_game_v2(ws)
+                    else:
+                        await self.play_one_game(ws)
+            except asyncio.TimeoutError:
+                self.stats.errors["timeout"] += 1
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                self.stats.errors[type(e).__name__] += 1
+                await asyncio.sleep(0.5)
+
+    async def recv(self, ws):
+        raw = await asyncio.wait_for(ws.recv(), RECV_TIMEOUT)
+        self.stats.frames += 1
+        self.stats.bytes += len(raw)
+        if isinstance(raw, bytes):
+            return decode_frame(raw)
+        return json.loads(raw)
+
+    async def send_command(self, ws, kind, ids=()):
+        """v2 / 二进制上行"""
+        if self.binary:
+            await ws.send(encode_command(kind, ids))
+        elif kind == "play":
+            await ws.send(json.dumps({"type": "play", "cards": list(ids)}))
+        else:
+            await ws.send(json.dumps({"type": kind}))
+
+    def choose(self, my_id, hand, landlord_id, current_turn, last_non_pass):
+        obs = Observation(my_id, hand, [], landlord_id, current_turn, None, last_non_pass)
+        moves = get_valid_moves_from_obs(obs) or [[]]
+        return moves[self.rng.randrange(len(moves))]
+
+    async def play_one_game(self, ws):
+        init = await self.recv(ws)
+        if init.get("type") != "init":
+            self.stats.errors["bad_init"] += 1
+            return
+
+        my_id = init["you"]
+        hand = _cards(init["hand"])
+        landlord_id = init["landlord_id"]
+        last_non_pass = None
+        current_turn = init["current_turn"]
+        game_over = False
+        if init.get("resume"):
+            # 续局：紧跟的 sync 才带上一手牌
+            msg = await self.recv(ws)
+            if msg.get("type") != "sync":
+                self.stats.errors["bad_resume"] += 1
+                return
+            self.stats.errors["resumed"] += 1
+            hand, last_non_pass, current_turn, game_over = _apply_sync(msg)
+
+        # 开局就轮到 AI 时，先把 AI 的出牌收完
+        while current_turn != my_id and not game_over:
+            msg = await self.recv(ws)
+            if msg["type"] == "bot_play":
+                if msg["ok"] and msg["cards"]:
+                    last_non_pass = ActionRecord(msg["player_id"], _cards(msg["cards"]), "play")
+                current_turn = msg["current_turn"]
+            elif msg["type"] == "game_over":
+                game_over = True
+            elif msg["type"] == "sync":
+                hand, last_non_pass, current_turn, game_over = _apply_sync(msg)
+
+        for _ in range(MAX_TURNS):
+            if game_over or self.stop_event.is_set():
+                break
+            if self.think:
+                await asyncio.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+            cards = self.choose(my_id, hand, landlord_id, current_turn, last_non_pass)
+
+            t_send = time.perf_counter()
+            if cards:
+                await ws.send(json.dumps({"type": "play", "cards": [c.dict() for c in cards]}))
+            else:
+                await ws.send(json.dumps({"type": "pass"}))
+
+            first_bot = True
+            while True:
+                msg = await self.recv(ws)
+                now = time.perf_counter()
+                kind = msg.get("type")
+
+                if kind == "play_result":
+                    self.stats.add("ack", now - t_send)
+                    self.stats.moves += 1
+                    if not msg["ok"]:
+                        # 多数是服务端状态和本地不一致；放弃这一局，换新房间
+                        self.stats.errors[f"rejected:{msg['error']}"] += 1
+                        return
+
+                elif kind == "human_play":
+                    if msg["ok"] and cards:
+                        hand = [c for c in hand if not any(c.rank == x.rank and c.suit == x.suit for x in cards)]
+                        last_non_pass = ActionRecord(my_id, cards, "play")
+                    current_turn = msg["current_turn"]
+
+                elif kind == "bot_play":
+                    if first_bot:
+                        self.stats.add("bot_play", now - t_send)
+                        first_bot = False
+                    if msg["ok"] and msg["cards"]:
+                        last_non_pass = ActionRecord(msg["player_id"], _cards(msg["cards"]), "play")
+                    current_turn = msg["current_turn"]
+                    if current_turn == my_id:
+                        self.stats.add("turn", now - t_send)
+                        break
+
+                elif kind == "game_over":
+                    self.stats.add("game_over", now - t_send)
+                    self.stats.games += 1
+                    game_over = True
+                    break
+
+                elif kind == "sync":
+                    # 服务端觉得我们读得太慢，积压被合并成了一条完整局面
+                    self.stats.errors["coalesced"] += 1
+                    hand, last_non_pass, current_turn, game_over = _apply_sync(msg)
+                    if game_over or current_turn == my_id:
+                        break
+
+                if kind == "human_play" and current_turn == my_id:
+                    # 两家 AI 都不在场（或本方连续出牌）时直接又轮到自己
+                    break
+
+
+    async def play_one_game_v2(self, ws):
+        init = await self.recv(ws)
+        if init.get("type") != "init":
+            self.stats.errors["bad_init"] += 1
+            return
+
+        my_id = init["you"]
+        hand = cards_from_ids(init["hand"])
+        landlord_id = init["landlord_id"]
+        last_non_pass = None
+        current_turn = init["current_turn"]
+        game_over = False
+        seq = init["seq"]
+        if init.get("resume"):
+            frame = await self.recv(ws)
+            if frame.get("type") != "sync":
+                self.stats.errors["bad_resume"] += 1
+                return
+            self.stats.errors["resumed"] += 1
+            hand, last_non_pass, current_turn, game_over = _apply_sync(frame, cards_from_ids)
+            seq = frame["seq"]
+
+        t_send = None
+        for _ in range(MAX_TURNS + 1):
+            if current_turn != my_id and not game_over:
+                # 开局 AI 先出，或者上一帧之后还没轮到自己：等下一帧
+                frame = await self.recv(ws)
+                now = time.perf_counter()
+                if frame["type"] == "sync":
+                    self.stats.errors["coalesced"] += 1
+                    hand, last_non_pass, current_turn, game_over = _apply_sync(frame, cards_from_ids)
+                    seq = frame["seq"]
+                    continue
+                if frame["seq"] != seq + 1:
+                    self.stats.errors["seq_gap"] += 1
+                    await self.send_command(ws, "resync")
+                seq = frame["seq"]
+
+                if t_send is not None:
+                    self.stats.add("ack", now - t_send)
+                    self.stats.moves += 1
+                    if not frame.get("ok", True):
+                        self.stats.errors[f"rejected:{frame['error']}"] += 1
+                        return
+                hand, last_non_pass = _apply_update(frame, my_id, hand, last_non_pass)
+                current_turn = frame["turn"]
+                if "game_over" in frame:
+                    if t_send is not None:
+                        self.stats.add("game_over", now - t_send)
+                    self.stats.games += 1
+                    game_over = True
+                elif t_send is not None:
+                    self.stats.add("turn", now - t_send)
+
+            if game_over or self.stop_event.is_set():
+                break
+            if current_turn != my_id:
+                continue
+            if self.think:
+                await asyncio.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+            cards = self.choose(my_id, hand, landlord_id, current_turn, last_non_pass)
+            t_send = time.perf_counter()
+            if cards:
+                await self.send_command(ws, "play", [card_id(c) for c in cards])
+            else:
+                await self.send_command(ws, "pass")
+            # 回帧之前不知道下一家是谁；先标记为"不是自己"，上面的分支去收这一帧
+            current_turn = None
+
+
+# ---------------------------------------------------------
+# 服务端
+# ---------------------------------------------------------
+def spawn_server(port, log_path=None):
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become healthy in 60s")
+
+
+def raise_fd_limit():
+    """上千个连接需要的文件描述符通常超过默认软上限。"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+# ---------------------------------------------------------
+# 阶段式加压
+# ---------------------------------------------------------
+async def run_stages(base_url, stages, stage_seconds, ramp_seconds, think_ms, seed, protocol=1,
+                     binary=False):
+    stats = LoadStats()
+    stop_event = asyncio.Event()
+    tasks = []
+    results = []
+    # 每次运行一个随机前缀：同一个 DATA_DIR 上反复压测时，room_id 不会撞上对局日志里的旧局
+    run_id = os.urandom(4).hex()
+
+    for target in stages:
+        to_add = max(0, target - len(tasks))
+        for i in range(to_add):
+            client = SimulatedClient(len(tasks), base_url, stats, stop_event, think_ms, seed, protocol, binary,
+                                     run_id)
+            tasks.append(asyncio.ensure_future(client.run()))
+            if ramp_seconds > 0:
+                await asyncio.sleep(ramp_seconds / to_add)
+
+        stats.reset()
+        await asyncio.sleep(stage_seconds)
+        snap = stats.snapshot(len(tasks))
+        results.append(snap)
+        print_stage(snap)
+
+    stop_event.set()
+    _, pending = await asyncio.wait(tasks, timeout=RECV_TIMEOUT + 1)
+    for t in pending:
+        t.cancel()
+    return results
+
+
+def print_stage(snap):
+    print(
+        f"\n[{snap['clients']:>5} clients] {snap['games_per_sec']:8.1f} games/s "
+        f"{snap['moves_per_sec']:9.1f} moves/s  errors={sum(snap['errors'].values())}  "
+        f"{snap['frames_per_move']:.2f} frames/move {snap['bytes_per_move']:.0f} B/move"
+    )
+    for kind, lat in snap["latency_ms"].items():
+        if not lat["count"]:
+            continue
+        print(
+            f"    {kind:<10} n={lat['count']:<8} p50={lat['p50']:8.2f}ms p95={lat['p95']:8.2f}ms "
+            f"p99={lat['p99']:8.2f}ms max={lat['max']:8.2f}ms"
+        )
+    for name, n in sorted(snap["errors"].items()):
+        print(f"    error {name}: {n}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="游戏 WebSocket 压测")
+    parser.add_argument("--url", default=None, help="服务地址，默认 ws://127.0.0.1:<port>")
+    parser.add_argument("--port", type=int, default=8765, help="--spawn 时 uvicorn 监听的端口")
+    parser.add_argument("--spawn", action="store_true", help="自动启动本地 uvicorn 实例")
+    parser.add_argument("--server-log", help="--spawn 时服务端输出写到该文件")
+    parser.add_argument("--stages", type=int, nargs="+", default=[50, 200, 500], help="各阶段并发客户端数")
+    parser.add_argument("--stage-seconds", type=float, default=20.0)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="每个阶段内新增客户端的爬坡时间")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="模拟人类思考时间（均值）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--protocol", type=int, choices=(1, 2), default=1, help="下行帧协议版本")
+    parser.add_argument("--binary", action="store_true", help="使用二进制子协议（隐含 --protocol 2）")
+    parser.add_argument("--out", help="结果 JSON 输出路径")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        print("[ERROR] 需要 websockets 包：pip install websockets")
+        sys.exit(1)
+
+    raise_fd_limit()
+    base_url = args.url or f"ws://127.0.0.1:{args.port}"
+    server = spawn_server(args.port, args.server_log) if args.spawn else None
+
+    try:
+        results = asyncio.run(
+            run_stages(
+                base_url, args.stages, args.stage_seconds, args.ramp_seconds, args.think_ms, args.seed,
+                args.protocol, args.binary,
+            )
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.out:
+        out_dir = os.path.dirname(args.out)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"url": base_url, "stages": results}, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Results saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,12 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR = BASE_DIR.parent / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# 对局日志（DATA_DIR 下 append-only 文件）：重启后恢复进行中的对局，断线重连续局
+GAME_JOURNAL_ENABLED = True
+
+# 对局回放归档目录（app.game.replay 格式）：日志压缩时已结束的对局转存到这里
+REPLAY_DIR = DATA_DIR / "replays"
+
 # 管理员访问 token（控制面板用）
 ADMIN_TOKEN = "admin"
 
@@ -20,3 +26,13 @@ PORT = 8080
 
 # AI 设备：'cpu' 或 'cuda'（后续可扩展）
 AI_DEVICE = "cpu"
+
+# 日志输出格式：True 时控制台 / 文件都写 JSON（每行一个对象，方便采集）
+LOG_JSON = False
+
+# 日志采样（只作用于 INFO 及以下；WARNING 及以上永远保留）
+# 按模块名（record.module）设置保留比例，例如 {"dealer": 0.01, "engine_smart": 0.1}
+LOG_SAMPLE_RATES = {}
+
+# 按房间设置保留比例：同一房间的 INFO 日志每 1/rate 条保留一条（1.0 = 全部保留）
+LOG_ROOM_SAMPLE_RATE = 1.0
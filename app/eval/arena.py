@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+AI 引擎对战竞技场（多进程）
+
+示例：
+    # 深度模型 vs 规则 AI，3000 局，8 个进程
+    python -m app.eval.arena --engines smart rule --games 3000 --workers 8
+
+    # 指定 checkpoint、自定义引擎（module:Class）
+    python -m app.eval.arena --engines smart@model/ppo_checkpoint_50000.pt app.ai.engine_random:RandomAIEngine
+
+    # 顺带把每一局存成回放文件（app.game.replay 格式，离线分析 / 训练用）
+    python -m app.eval.arena --engines rule --games 100000 --record data/replays/selfplay_rule.ddzr
+
+引擎写法：别名（rule / smart / random）或 "模块:类名"，可用 "@checkpoint路径" 指定模型文件。
+座位轮换：
+- 2 个引擎 A、B：A 当地主 vs B+B 当农民，再反过来
+- 3 个引擎：三个座位的全部 6 种排列
+输出：各引擎胜率（Wilson 95% 置信区间，分地主/农民）+ 每次决策耗时 p50/p95/p99（按引擎、按牌型）。
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from app.game.constants import PLAYER_IDS
+from app.game.dealer import DealerReferee
+from app.game.dealer_moves import get_valid_moves_from_obs
+from app.game.replay import ReplayWriter, record_from_state
+from app.game.rules import DouDiZhuRules
+
+
+ENGINE_ALIASES = {
+    "rule": "app.ai.engine_rule:RuleBasedAIEngine",
+    "smart": "app.ai.engine_smart:SmartAIEngine",
+    "random": "app.ai.engine_random:RandomAIEngine",
+}
+
+MAX_TURNS = 500  # 防御：极端情况下避免死循环
+
+
+# ---------------------------------------------------------
+# 引擎构造
+# ---------------------------------------------------------
+def make_engine(spec, seed=None):
+    """
+    spec: "rule" / "smart@model/ppo_final.pt" / "pkg.module:ClassName"
+    """
+    target, _, checkpoint = spec.partition("@")
+    target = ENGINE_ALIASES.get(target, target)
+    module_name, _, cls_name = target.partition(":")
+    cls = getattr(importlib.import_module(module_name), cls_name)
+
+    kwargs = {}
+    if checkpoint:
+        kwargs["checkpoint"] = checkpoint
+    engine = cls(**kwargs)
+
+    # 带随机性的引擎（如 RandomAIEngine）按进程播种
+    if seed is not None and hasattr(engine, "rng"):
+        engine.rng.seed(seed)
+    return engine
+
+
+def default_lineups(engines):
+    """返回 [(地主引擎, 农民1引擎, 农民2引擎), ...]"""
+    if len(engines) == 1:
+        a = engines[0]
+        return [(a, a, a)]
+    if len(engines) == 2:
+        a, b = engines
+        return [(a, b, b), (b, a, a)]
+    if len(engines) == 3:
+        return list(itertools.permutations(engines))
+    raise ValueError("超过 3 个引擎时请用 --lineup 显式指定座位")
+
+
+def move_type_of(cards):
+    if not cards:
+        return "pass"
+    ct = DouDiZhuRules.classify_type(cards)
+    return ct.type.value if ct is not None else "invalid"
+
+
+# ---------------------------------------------------------
+# 单局
+# ---------------------------------------------------------
+def play_game(dealer, lineup, engines, latencies, illegal):
+    """
+    lineup: (地主引擎, 农民1引擎, 农民2引擎)
+    engines: {engine: (地主座位实例, 农民1座位实例, 农民2座位实例)}，每个座位一个独立实例，
+             同一引擎坐两个座位时循环状态也不会混在一起
+    latencies: {(engine, move_type): [秒, ...]}，原地追加
+    illegal: {engine: 次数}，引擎给出非法动作时用第一个合法动作兜底并计数
+    开局前对每个座位的实例调用 reset()（有的话），带循环状态的引擎（smart）不会把上一局的隐藏状态带进来，
+    同一副牌的每个结果只取决于这副牌本身，与 worker 之前打过哪些局无关。
+    返回 (winner_side, {player_id: engine})
+    """
+    state = dealer.state
+    landlord = state.landlord_id
+    farmers = [pid for pid in PLAYER_IDS if pid != landlord]
+    seat_engine = {landlord: lineup[0], farmers[0]: lineup[1], farmers[1]: lineup[2]}
+    seat_instance = {
+        pid: engines[lineup[k]][k] for k, pid in enumerate((landlord, farmers[0], farmers[1]))
+    }
+    for engine in seat_instance.values():
+        if hasattr(engine, "reset"):
+            engine.reset()
+
+    for _ in range(MAX_TURNS):
+        if dealer.state.game_over:
+            break
+        pid = dealer.state.current_turn
+        spec = seat_engine[pid]
+        obs = dealer.get_observation(pid)
+
+        t0 = time.perf_counter()
+        cards = seat_instance[pid].choose_action(obs)
+        elapsed = time.perf_counter() - t0
+
+        ok, _ = dealer.play_cards(pid, cards)
+        if not ok:
+            illegal[spec] = illegal.get(spec, 0) + 1
+            cards = get_valid_moves_from_obs(obs)[0]
+            dealer.play_cards(pid, cards)
+
+        latencies[(spec, move_type_of(cards))].append(elapsed)
+
+    return dealer.state.winner_side, seat_engine
+
+
+# ---------------------------------------------------------
+# 进程池 worker
+# ---------------------------------------------------------
+_WORKER_ENGINES = {}            # {spec: (座位 0 实例, 座位 1 实例, 座位 2 实例)}
+_WORKER_RNG = random.Random()  # 发牌用的快速 PRNG，每个任务开始时重新播种
+
+
+def _init_worker(specs, seed):
+    logging.disable(logging.CRITICAL)
+    try:
+        import torch
+
+        torch.set_num_threads(1)
+        # 没有 checkpoint 的模型引擎用随机权重，按 --seed 初始化，各进程一致
+        torch.manual_seed(seed)
+    except ImportError:
+        pass
+
+    for i, spec in enumerate(specs):
+        _WORKER_ENGINES[spec] = tuple(make_engine(spec, seed=(seed * 8 + i) * 3 + k) for k in range(3))
+
+
+def _seed_engines(seed):
+    """给所有带随机性的引擎实例重新播种（每个任务 / 每局开始时调用）"""
+    for i, engine in enumerate(e for seats in _WORKER_ENGINES.values() for e in seats):
+        if hasattr(engine, "rng"):
+            engine.rng.seed(seed * 32 + i)
+
+
+def _play_chunk(lineup, num_games, task_seed, record=False):
+    """
+    task_seed 由 --seed 和任务序号决定：每个任务开始时重新播种（发牌 + 带随机性的引擎），
+    结果与进程数、任务被哪个进程执行无关。
+    record=True 时额外返回每局编码好的回放（在 worker 里编码，主进程只写文件）
+    """
+    random.seed(task_seed)
+    _WORKER_RNG.seed(task_seed)
+    _seed_engines(task_seed)
+
+    dealer = DealerReferee()
+    latencies = defaultdict(list)
+    illegal = {}
+    results = []
+    records = []
+    for _ in range(num_games):
+        dealer.start_new_game(rng=_WORKER_RNG)
+        winner_side, _ = play_game(dealer, lineup, _WORKER_ENGINES, latencies, illegal)
+        results.append(winner_side)
+        if record:
+            records.append(record_from_state(dealer.state).encode())
+    return lineup, results, dict(latencies), illegal, records
+
+
+# ---------------------------------------------------------
+# 统计
+# ---------------------------------------------------------
+def wilson_interval(wins, n, z=1.96):
+    if n == 0:
+        return 0.0, 0.0
+    p = wins / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    if not values:
+        return {f"p{q}": None for q in qs}
+    values = sorted(values)
+    out = {}
+    for q in qs:
+        idx = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+        out[f"p{q}"] = values[idx] * 1000.0  # ms
+    return out
+
+
+class ArenaStats:
+    def __init__(self):
+        # record[engine][role] = [games, wins]
+        self.record = defaultdict(lambda: {"landlord": [0, 0], "farmer": [0, 0]})
+        self.latencies = defaultdict(list)
+        self.illegal = defaultdict(int)
+        self.games = 0
+
+    def add_chunk(self, lineup, results, latencies, illegal):
+        for winner_side in results:
+            self.games += 1
+            sides = {"landlord": {lineup[0]}, "farmer": {lineup[1], lineup[2]}}
+            for role, engines in sides.items():
+                won = (winner_side == "landlord") == (role == "landlord") and winner_side is not None
+                for spec in engines:
+                    self.record[spec][role][0] += 1
+                    self.record[spec][role][1] += int(won)
+        for key, values in latencies.items():
+            self.latencies[key].extend(values)
+        for spec, n in illegal.items():
+            self.illegal[spec] += n
+
+    def summary(self):
+        engines = {}
+        for spec, roles in self.record.items():
+            games = sum(r[0] for r in roles.values())
+            wins = sum(r[1] for r in roles.values())
+            entry = {
+                "games": games,
+                "wins": wins,
+                "win_rate": wins / games if games else 0.0,
+                "ci95": wilson_interval(wins, games),
+                "illegal_moves": self.illegal.get(spec, 0),
+            }
+            for role, (g, w) in roles.items():
+                entry[role] = {
+                    "games": g,
+                    "wins": w,
+                    "win_rate": w / g if g else 0.0,
+                    "ci95": wilson_interval(w, g),
+                }
+
+            all_lat = []
+            by_type = {}
+            for (s, move_type), values in self.latencies.items():
+                if s != spec:
+                    continue
+                all_lat.extend(values)
+                by_type[move_type] = dict(count=len(values), **percentiles(values))
+            entry["latency_ms"] = dict(count=len(all_lat), **percentiles(all_lat))
+            entry["latency_ms_by_type"] = by_type
+            engines[spec] = entry
+        return {"games": self.games, "engines": engines}
+
+
+def print_summary(summary):
+    print(f"\n对局数：{summary['games']}")
+    print(f"{'engine':<36} {'win%':>7} {'95% CI':>17} {'LL win%':>8} {'F win%':>8} "
+          f"{'p50ms':>8} {'p95ms':>8} {'p99ms':>8}")
+    for spec, e in summary["engines"].items():
+        lo, hi = e["ci95"]
+        lat = e["latency_ms"]
+        print(
+            f"{spec:<36} {e['win_rate'] * 100:>6.1f}% [{lo * 100:>5.1f}, {hi * 100:>5.1f}]% "
+            f"{e['landlord']['win_rate'] * 100:>7.1f}% {e['farmer']['win_rate'] * 100:>7.1f}% "
+            f"{lat['p50'] or 0:>8.3f} {lat['p95'] or 0:>8.3f} {lat['p99'] or 0:>8.3f}"
+        )
+        for move_type, t in sorted(e["latency_ms_by_type"].items()):
+            print(
+                f"    {move_type:<32} n={t['count']:<8} "
+                f"p50={t['p50']:.3f} p95={t['p95']:.3f} p99={t['p99']:.3f}"
+            )
+        if e["illegal_moves"]:
+            print(f"    非法动作（已兜底）：{e['illegal_moves']}")
+
+
+# ---------------------------------------------------------
+# 入口
+# ---------------------------------------------------------
+def run_arena(lineups, num_games, workers=None, chunk_size=50, seed=0, record=None):
+    specs = sorted({spec for lineup in lineups for spec in lineup})
+    per_lineup = max(1, num_games // len(lineups))
+
+    tasks = []
+    for lineup in lineups:
+        remaining = per_lineup
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            tasks.append((lineup, n))
+            remaining -= n
+
+    stats = ArenaStats()
+    writer = ReplayWriter(record) if record else None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(specs, seed),
+        ) as pool:
+            futures = [
+                pool.submit(_play_chunk, lineup, n, seed * 1000003 + idx, writer is not None)
+                for idx, (lineup, n) in enumerate(tasks)
+            ]
+            # 按任务顺序收结果：回放文件里的对局顺序也可复现
+            for fut in futures:
+                lineup, results, latencies, illegal, records = fut.result()
+                stats.add_chunk(lineup, results, latencies, illegal)
+                for data in records:
+                    writer.add_encoded(data)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return stats.summary()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI 引擎对战竞技场")
+    parser.add_argument("--engines", nargs="+", help="参赛引擎（1~3 个），自动轮换座位")
+    parser.add_argument(
+        "--lineup",
+        nargs=3,
+        action="append",
+        metavar=("LANDLORD", "FARMER1", "FARMER2"),
+        help="显式指定一组座位，可重复",
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="结果 JSON 输出路径")
+    parser.add_argument("--record", help="把每一局写入该回放文件（.ddzr）")
+    args = parser.parse_args()
+    if not args.engines and not args.lineup:
+        parser.error("需要 --engines 或 --lineup")
+    return args
+
+
+def main():
+    args = parse_args()
+    lineups = [tuple(l) for l in args.lineup] if args.lineup else default_lineups(args.engines)
+
+    t0 = time.perf_counter()
+    summary = run_arena(
+        lineups, args.games, workers=args.workers, chunk_size=args.chunk_size, seed=args.seed,
+        record=args.record,
+    )
+    summary["wall_sec"] = time.perf_counter() - t0
+    summary["lineups"] = lineups
+
+    print_summary(summary)
+    print(f"\n耗时 {summary['wall_sec']:.1f}s（{summary['games'] / summary['wall_sec']:.1f} 局/秒）")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Results saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+复式（duplicate deal）评测：降低发牌运气带来的方差
+
+做法：
+- 按种子预先生成一批牌局（每局 54 张牌的顺序）
+- 每一副牌都让参赛引擎轮换坐遍所有座位/身份（与 arena 相同的座位轮换）各打一遍
+- 以“同一副牌上两个引擎的得分差”为样本做配对统计，发牌好坏在差值里相互抵消
+
+示例：
+    python -m app.eval.duplicate --engines smart rule --deals 500 --workers 8
+    python -m app.eval.duplicate --engines smart rule --deals-file data/deals_500.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+from app.eval.arena import (
+    _WORKER_ENGINES,
+    _init_worker,
+    _seed_engines,
+    default_lineups,
+    percentiles,
+    play_game,
+)
+from app.game.dealer import DealerReferee
+from app.game.deck import batch_deals, cards_from_ids
+
+
+# ---------------------------------------------------------
+# 牌局池
+# ---------------------------------------------------------
+def generate_deal_pool(num_deals, seed=0):
+    """返回 [[牌 ID] * 54, ...]（见 deck.card_id），完全由 seed 决定。"""
+    return batch_deals(num_deals, seed=seed).tolist()
+
+
+def save_deal_pool(deals, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(deals, f)
+
+
+def load_deal_pool(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------------
+# worker：每副牌把所有座位排列都打一遍
+# ---------------------------------------------------------
+def _play_deals(deal_items, lineups, seed):
+    dealer = DealerReferee()
+    latencies = defaultdict(list)
+    illegal = {}
+    per_deal = []
+
+    for deal_idx, card_ids in deal_items:
+        games = []
+        for lineup_idx, lineup in enumerate(lineups):
+            # 每局重新播种（裁判里选地主 + 带随机性的引擎），保证同一副牌的结果可复现
+            game_seed = (seed * 1000003 + deal_idx) * 16 + lineup_idx
+            _seed_engines(game_seed)
+
+            dealer.start_new_game(deck=cards_from_ids(card_ids), seed=game_seed)
+            winner_side, _ = play_game(dealer, lineup, _WORKER_ENGINES, latencies, illegal)
+            games.append((lineup, winner_side))
+        per_deal.append((deal_idx, games))
+
+    return per_deal, dict(latencies), illegal
+
+
+def deal_points(games, engines):
+    """
+    一副牌上每个引擎的得分：引擎所在一方获胜记 1 分（同一局两个农民座位是同一引擎时只记一次）。
+    """
+    points = {e: 0.0 for e in engines}
+    for lineup, winner_side in games:
+        if winner_side is None:
+            continue
+        winners = {lineup[0]} if winner_side == "landlord" else {lineup[1], lineup[2]}
+        for e in winners:
+            points[e] += 1.0
+    return points
+
+
+def paired_stats(diffs, z=1.96):
+    n = len(diffs)
+    if n == 0:
+        return {"n": 0, "mean": 0.0, "stderr": 0.0, "ci95": (0.0, 0.0), "z": 0.0}
+    mean = sum(diffs) / n
+    var = sum((d - mean) ** 2 for d in diffs) / (n - 1) if n > 1 else 0.0
+    stderr = math.sqrt(var / n)
+    return {
+        "n": n,
+        "mean": mean,
+        "stderr": stderr,
+        "ci95": (mean - z * stderr, mean + z * stderr),
+        "z": mean / stderr if stderr > 0 else 0.0,
+    }
+
+
+# ---------------------------------------------------------
+# 入口
+# ---------------------------------------------------------
+def run_duplicate(engines, deals, workers=None, chunk_size=20, seed=0):
+    lineups = default_lineups(engines)
+    items = list(enumerate(deals))
+    chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    points = {}
+    latencies = defaultdict(list)
+    illegal = defaultdict(int)
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(sorted(set(engines)), seed),
+    ) as pool:
+        futures = [pool.submit(_play_deals, chunk, lineups, seed) for chunk in chunks]
+        for fut in as_completed(futures):
+            per_deal, lat, ill = fut.result()
+            for deal_idx, games in per_deal:
+                points[deal_idx] = deal_points(games, engines)
+            for key, values in lat.items():
+                latencies[key].extend(values)
+            for spec, n in ill.items():
+                illegal[spec] += n
+
+    ordered = [points[i] for i in sorted(points)]
+    games_per_deal = len(lineups)
+
+    summary = {
+        "deals": len(ordered),
+        "games": len(ordered) * games_per_deal,
+        "games_per_deal": games_per_deal,
+        "engines": {},
+        "pairs": {},
+    }
+    for e in engines:
+        total = sum(p[e] for p in ordered)
+        all_lat = [v for (s, _), values in latencies.items() if s == e for v in values]
+        summary["engines"][e] = {
+            "points_per_deal": total / len(ordered) if ordered else 0.0,
+            "illegal_moves": illegal.get(e, 0),
+            "latency_ms": dict(count=len(all_lat), **percentiles(all_lat)),
+        }
+    for a, b in combinations(engines, 2):
+        diffs = [p[a] - p[b] for p in ordered]
+        summary["pairs"][f"{a} - {b}"] = paired_stats(diffs)
+    return summary
+
+
+def print_summary(summary):
+    print(
+        f"\n牌局数：{summary['deals']}（每副牌 {summary['games_per_deal']} 局，共 {summary['games']} 局）"
+    )
+    for e, s in summary["engines"].items():
+        lat = s["latency_ms"]
+        print(
+            f"{e:<36} 每副牌得分 {s['points_per_deal']:.3f}  "
+            f"p50={lat['p50'] or 0:.3f}ms p99={lat['p99'] or 0:.3f}ms"
+        )
+    print("\n配对差值（每副牌得分差，正数表示前者更强）：")
+    for pair, st in summary["pairs"].items():
+        lo, hi = st["ci95"]
+        print(
+            f"{pair:<60} mean={st['mean']:+.3f}  95% CI [{lo:+.3f}, {hi:+.3f}]  z={st['z']:+.2f}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="复式牌局评测")
+    parser.add_argument("--engines", nargs="+", required=True, help="参赛引擎（2~3 个）")
+    parser.add_argument("--deals", type=int, default=500, help="生成多少副牌")
+    parser.add_argument("--deals-file", help="牌局池 JSON；存在则读取，不存在则生成后写入")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="结果 JSON 输出路径")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.CRITICAL)
+
+    if args.deals_file and os.path.exists(args.deals_file):
+        deals = load_deal_pool(args.deals_file)
+    else:
+        deals = generate_deal_pool(args.deals, seed=args.seed)
+        if args.deals_file:
+            save_deal_pool(deals, args.deals_file)
+
+    t0 = time.perf_counter()
+    summary = run_duplicate(
+        args.engines, deals, workers=args.workers, chunk_size=args.chunk_size, seed=args.seed
+    )
+    summary["wall_sec"] = time.perf_counter() - t0
+
+    print_summary(summary)
+    print(f"\n耗时 {summary['wall_sec']:.1f}s")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Results saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
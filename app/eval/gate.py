@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+新 checkpoint 的后台评测门禁
+
+train_ppo.py 会周期性写出 model/ppo_checkpoint_*.pt，训练结束时写出 model/ppo_candidate.pt。本脚本常驻后台：
+- 轮询发现新的 checkpoint / 候选（已写入台账的不再重复评测，重启后可续跑；
+  ppo_candidate.pt 每次训练都会被覆盖，按文件修改时间区分）
+- 以低优先级、少量进程跑固定预算的复式评测（同一牌局池，结果可横向比较）：
+    * 候选 vs 当前冠军 model/ppo_final.pt
+    * 候选 vs 规则 AI 基线
+- 只有显著赢过冠军（配对差值 95% CI 下界 > 0）且对规则 AI 不落下风时才晋升：
+  原冠军备份为 ppo_final.prev.pt，候选原子替换为 ppo_final.pt
+- 每次评测结果追加写入台账 model/eval_ledger.jsonl
+
+示例：
+    python -m app.eval.gate                       # 常驻
+    python -m app.eval.gate --once --deals 300    # 处理完现有 checkpoint 后退出
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+from app.eval.duplicate import generate_deal_pool, run_duplicate
+
+
+MODEL_DIR = "model"
+CHECKPOINT_GLOB = "ppo_checkpoint_*.pt"
+CANDIDATE_NAME = "ppo_candidate.pt"
+CHAMPION_NAME = "ppo_final.pt"
+LEDGER_NAME = "eval_ledger.jsonl"
+
+BASELINE_ENGINE = "rule"
+EVAL_DEALS = 400           # 固定评测预算：每个对手 EVAL_DEALS 副牌 × 2 种座位
+EVAL_SEED = 20240601       # 固定牌局池，保证各次评测可比
+POLL_SECONDS = 60
+NICE_INCREMENT = 10
+
+
+# ---------------------------------------------------------
+# 低优先级
+# ---------------------------------------------------------
+def lower_priority(increment=NICE_INCREMENT):
+    """
+    降低本进程优先级（之后创建的评测子进程会继承），让训练进程优先拿到 CPU。
+    Linux / macOS 用 os.nice；Windows 上有 psutil 时改为 BELOW_NORMAL，否则跳过。
+    """
+    if hasattr(os, "nice"):
+        try:
+            os.nice(increment)
+        except OSError:
+            pass
+        return
+    try:
+        import psutil
+
+        psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+    except (ImportError, AttributeError, OSError):
+        pass
+
+
+def default_workers():
+    """只占用约四分之一的核，把其余留给训练。"""
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+# ---------------------------------------------------------
+# 台账
+# ---------------------------------------------------------
+def load_ledger(path):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def append_ledger(path, entry):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ---------------------------------------------------------
+# checkpoint 发现
+# ---------------------------------------------------------
+def checkpoint_step(path):
+    m = re.search(r"ppo_checkpoint_(\d+)\.pt$", path)
+    return int(m.group(1)) if m else -1
+
+
+def checkpoint_key(path):
+    """台账去重用的键：ppo_candidate.pt 会被反复覆盖，带上修改时间；其它 checkpoint 就是路径"""
+    if os.path.basename(path) == CANDIDATE_NAME:
+        return f"{path}@{int(os.path.getmtime(path))}"
+    return path
+
+
+def pending_checkpoints(model_dir, evaluated):
+    """按训练进度排序的未评测 checkpoint，候选排最后（训练端以 os.replace 落盘，出现即完整）。"""
+    paths = glob.glob(os.path.join(model_dir, CHECKPOINT_GLOB))
+    candidate = os.path.join(model_dir, CANDIDATE_NAME)
+    if os.path.exists(candidate):
+        paths.append(candidate)
+    pending = [p for p in paths if checkpoint_key(p) not in evaluated]
+    return sorted(pending, key=lambda p: (os.path.basename(p) == CANDIDATE_NAME, checkpoint_step(p)))
+
+
+# ---------------------------------------------------------
+# 评测 + 晋升
+# ---------------------------------------------------------
+def evaluate_candidate(candidate, champion, deals, workers, seed):
+    cand_spec = f"smart@{candidate}"
+    result = {}
+
+    if champion is not None:
+        summary = run_duplicate([cand_spec, f"smart@{champion}"], deals, workers=workers, seed=seed)
+        result["vs_champion"] = next(iter(summary["pairs"].values()))
+
+    summary = run_duplicate([cand_spec, BASELINE_ENGINE], deals, workers=workers, seed=seed)
+    result["vs_baseline"] = next(iter(summary["pairs"].values()))
+    result["latency_ms"] = summary["engines"][cand_spec]["latency_ms"]
+    return result
+
+
+def should_promote(result):
+    """
+    有冠军：对冠军的配对差值 95% CI 下界 > 0，且对规则 AI 的平均差值不为负
+    无冠军：对规则 AI 的 95% CI 下界 > 0
+    """
+    vs_base = result["vs_baseline"]
+    vs_champ = result.get("vs_champion")
+    if vs_champ is None:
+        return vs_base["ci95"][0] > 0
+    return vs_champ["ci95"][0] > 0 and vs_base["mean"] >= 0
+
+
+def promote(candidate, champion_path):
+    """原冠军备份为 *.prev.pt；候选先拷到临时文件再 os.replace，推理端不会读到半个文件。"""
+    if os.path.exists(champion_path):
+        root, ext = os.path.splitext(champion_path)
+        shutil.copyfile(champion_path, root + ".prev" + ext)
+    tmp = champion_path + ".tmp"
+    shutil.copyfile(candidate, tmp)
+    os.replace(tmp, champion_path)
+
+
+def process_checkpoint(candidate, model_dir, deals, workers, seed, ledger_path):
+    champion_path = os.path.join(model_dir, CHAMPION_NAME)
+    champion = champion_path if os.path.exists(champion_path) else None
+    # 评测开始前取键：评测期间候选被新一轮训练覆盖时，新文件仍会被当成未评测
+    key = checkpoint_key(candidate)
+
+    print(f"[INFO] Evaluating {candidate} (champion={champion})")
+    t0 = time.perf_counter()
+    result = evaluate_candidate(candidate, champion, deals, workers, seed)
+    promoted = should_promote(result)
+    if promoted:
+        promote(candidate, champion_path)
+
+    entry = {
+        "checkpoint": candidate,
+        "key": key,
+        "step": checkpoint_step(candidate),
+        "evaluated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "champion": champion,
+        "deals": len(deals),
+        "seed": seed,
+        "promoted": promoted,
+        "wall_sec": time.perf_counter() - t0,
+        **result,
+    }
+    append_ledger(ledger_path, entry)
+
+    vs_champ = result.get("vs_champion")
+    champ_str = f"{vs_champ['mean']:+.3f} (z={vs_champ['z']:+.2f})" if vs_champ else "-"
+    print(
+        f"[INFO] {candidate}: vs champion {champ_str}, "
+        f"vs {BASELINE_ENGINE} {result['vs_baseline']['mean']:+.3f}, "
+        f"{'PROMOTED' if promoted else 'kept champion'} ({entry['wall_sec']:.1f}s)"
+    )
+    return entry
+
+
+# ---------------------------------------------------------
+# 入口
+# ---------------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="checkpoint 后台评测门禁")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--deals", type=int, default=EVAL_DEALS)
+    parser.add_argument("--seed", type=int, default=EVAL_SEED)
+    parser.add_argument("--workers", type=int, default=None, help="默认 CPU 核数的 1/4")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="轮询间隔（秒）")
+    parser.add_argument("--once", action="store_true", help="处理完现有 checkpoint 后退出")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.CRITICAL)
+    lower_priority()
+
+    ledger_path = os.path.join(args.model_dir, LEDGER_NAME)
+    evaluated = {e.get("key", e["checkpoint"]) for e in load_ledger(ledger_path)}
+    deals = generate_deal_pool(args.deals, seed=args.seed)
+    workers = args.workers or default_workers()
+
+    print(f"[INFO] Watching {os.path.join(args.model_dir, CHECKPOINT_GLOB)} "
+          f"({len(evaluated)} already evaluated, {workers} workers)")
+    try:
+        while True:
+            for candidate in pending_checkpoints(args.model_dir, evaluated):
+                entry = process_checkpoint(candidate, args.model_dir, deals, workers, args.seed, ledger_path)
+                evaluated.add(entry["key"])
+            if args.once:
+                break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print("[INFO] Gate stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from typing import List, Optional
 from app.game.constants import PLAYER_IDS, PlayerRole, CardType
 from app.game.state import GameState
-from app.game.deck import new_deck, shuffle_deck
+import random
+from app.game.deck import make_rng, shuffled_deck
 from app.game.rules import DouDiZhuRules
 from app.models.card import Card, ActionRecord, Observation
 from app.utils.logger import logger
@@ -18,14 +19,44 @@ class DealerReferee:
 
     # ---------- 发牌与开局 ----------
 
-    def start_new_game(self) -> None:
-        """重新开始一局，洗牌+发牌+确定地主（这里先固定 human 为地主，再根据配置做调整）。"""
+    def start_new_game(
+        self,
+        deck: Optional[List[Card]] = None,
+        seed: Optional[int] = None,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        """
+        重新开始一局，洗牌+发牌+确定地主（这里先固定 human 为地主，再根据配置做调整）。
+        deck: 指定 54 张牌的顺序（评测复盘用）；为 None 时重新洗牌。
+        seed: 用带种子的 PRNG 洗牌（复现 bug / 基准）；为 None 时用 SystemRandom。
+        rng:  直接传入随机源（训练环境复用自己的 PRNG），优先于 seed。
+        洗牌和“人类当农民时挑哪个机器人当地主”用的是同一个随机源。
+        """
         logger.info("Starting new game...")
         self.state = GameState.initial()
 
-        deck = new_deck()
-        shuffle_deck(deck)
+        if rng is None:
+            rng = make_rng(seed)
+        if deck is None:
+            deck = shuffled_deck(rng)
+        else:
+            deck = list(deck)
+
+        # 叫地主逻辑暂简化为 human，当地主（后面可能会被 _adjust_roles_for_human_choice 改掉）
+        self._deal(deck, "human")
+
+        # ★★ 根据人类选择（地主/农民）调整身份和手牌 ★★
+        self._adjust_roles_for_human_choice(rng)
+
+        # 最终日志（使用可能已被调整过的 landlord_id）
+        logger.info(
+            "New game started. Landlord=%s, bottom=%s",
+            self.state.landlord_id,
+            cards_to_str(self.state.bottom_cards),
+        )
 
+    def _deal(self, deck: List[Card], landlord_id: str) -> None:
+        """按 deck 顺序发牌，landlord_id 拿底牌并先出"""
         # 17 + 17 + 17 + 3 底牌
         hands = {
             "human": deck[0:17],
@@ -39,8 +70,6 @@ class DealerReferee:
 
         self.state.bottom_cards = bottom
 
-        # 叫地主逻辑暂简化为 human，当地主（后面可能会被 _adjust_roles_for_human_choice 改掉）
-        landlord_id = "human"
         self.state.landlord_id = landlord_id
         self.state.players[landlord_id].role = PlayerRole.LANDLORD
         for pid in PLAYER_IDS:
@@ -55,20 +84,29 @@ class DealerReferee:
         self.state.last_play = None
         self.state.last_non_pass = None
 
-        # ★★ 根据人类选择（地主/农民）调整身份和手牌 ★★
-        self._adjust_roles_for_human_choice()
+    def restore_game(self, deck: List[Card], landlord_id: str) -> None:
+        """
+        按 deal_order() 记下的发牌顺序和地主，恢复一局的开局局面（日志回放用）。
+        不再按人类身份配置调整——记录里的地主就是当时调整之后的结果。
+        """
+        self.state = GameState.initial()
+        self._deal(list(deck), landlord_id)
 
-        # 最终日志（使用可能已被调整过的 landlord_id）
-        logger.info(
-            "New game started. Landlord=%s, bottom=%s",
-            self.state.landlord_id,
-            cards_to_str(self.state.bottom_cards),
-        )
+    def deal_order(self) -> List[Card]:
+        """
+        本局开局时的等效发牌顺序：human / bot1 / bot2 各 17 张 + 3 张底牌
+        （地主的手牌 = 自己的 17 张 + 末尾追加的底牌）。只在开局后、第一手出牌前调用。
+        """
+        order = []
+        for pid in PLAYER_IDS:
+            order.extend(self.state.players[pid].hand[:17])
+        order.extend(self.state.bottom_cards)
+        return order
 
     # =========================================================
     # 按当前配置调整：人类当农民时，地主改为机器人 + 手牌互换
     # =========================================================
-    def _adjust_roles_for_human_choice(self):
+    def _adjust_roles_for_human_choice(self, rng: Optional[random.Random] = None):
         """
         默认发牌逻辑仍然把人类当地主（兼容历史逻辑）：
 
@@ -105,9 +143,7 @@ class DealerReferee:
         if not candidate_ids:
             return
 
-        import random
-
-        new_landlord = random.choice(candidate_ids)
+        new_landlord = (rng or random).choice(candidate_ids)
 
         if "human" not in self.state.players or new_landlord not in self.state.players:
             return
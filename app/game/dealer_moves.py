@@ -16,6 +16,14 @@ def get_all_valid_moves(dealer, player_id):
     """
 
     obs = dealer.get_observation(player_id)
+    return get_valid_moves_from_obs(obs)
+
+
+def get_valid_moves_from_obs(obs):
+    """
+    只根据 Observation 生成合法动作（AI 引擎 / 评测脚本手里只有 obs 时使用）。
+    """
+    player_id = obs.my_id
     hand = obs.my_hand
 
     # 列举所有可能组合（与 env.enumerate_all_moves 完全一致）
@@ -1,10 +1,14 @@
-from typing import List
+import random
+from typing import List, Optional, Sequence
 from secrets import SystemRandom
 from app.models.card import Card
 
 
+# 线上对局默认使用密码学安全随机源；训练 / 基准 / 复现用带种子的快速 PRNG（见 make_rng）
 _rng = SystemRandom()
 
+DECK_SIZE = 54
+
 
 def new_deck() -> List[Card]:
     """
@@ -30,6 +34,55 @@ def new_deck() -> List[Card]:
     return deck
 
 
-def shuffle_deck(deck: List[Card]) -> None:
-    """原地洗牌。"""
-    _rng.shuffle(deck)
+def make_rng(seed: Optional[int] = None) -> random.Random:
+    """
+    seed 为 None：返回共享的 SystemRandom（线上对局，不可预测）
+    否则：返回 random.Random(seed)（梅森旋转，纯用户态，可复现）
+    """
+    if seed is None:
+        return _rng
+    return random.Random(seed)
+
+
+def shuffle_deck(deck: List[Card], rng: Optional[random.Random] = None) -> None:
+    """原地洗牌；rng 为 None 时使用 SystemRandom。"""
+    (rng or _rng).shuffle(deck)
+
+
+# ---------------------------------------------------------
+# 牌 ID（0..53，与 new_deck() 的顺序一致）
+# ---------------------------------------------------------
+_SUIT_INDEX = {"S": 0, "H": 1, "D": 2, "C": 3}
+
+# 按 ID 索引的共享 Card 实例。Card 创建后不会被修改，发牌时直接复用，省掉每局 54 次构造
+CARDS_BY_ID = tuple(new_deck())
+
+
+def card_id(card: Card) -> int:
+    if card.rank >= 16:
+        return 36 + card.rank  # 16 -> 52（小王）, 17 -> 53（大王）
+    return (card.rank - 3) * 4 + _SUIT_INDEX[card.suit]
+
+
+def cards_from_ids(ids: Sequence[int]) -> List[Card]:
+    return [CARDS_BY_ID[i] for i in ids]
+
+
+def shuffled_deck(rng: Optional[random.Random] = None) -> List[Card]:
+    """返回一副洗好的新牌（列表是新的，Card 实例共享）。"""
+    deck = list(CARDS_BY_ID)
+    (rng or _rng).shuffle(deck)
+    return deck
+
+
+def batch_deals(num_deals: int, seed: Optional[int] = None):
+    """
+    一次生成 num_deals 副牌：返回形状 (num_deals, 54) 的 uint8 数组，每一行是 0..53 的一个排列。
+    用 numpy 的 PCG64 按行独立打乱，seed 相同则结果相同；seed 为 None 时由系统熵播种。
+    前 51 张依次是 human / bot1 / bot2 的 17 张，最后 3 张是底牌（与 start_new_game 一致）。
+    """
+    import numpy as np
+
+    gen = np.random.default_rng(seed)
+    deals = np.tile(np.arange(DECK_SIZE, dtype=np.uint8), (num_deals, 1))
+    return gen.permuted(deals, axis=1)
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+对局日志（append-only，崩溃恢复 / 断线续局用）
+
+每行一条紧凑的 JSON 数组：
+    ["d", room_id, game_no, landlord_seat, "<54 张牌的 card_id，hex>"]   开局（deal_order 的发牌顺序）
+    ["a", room_id, game_no, seat, "<出的牌的 card_id，hex>"]             一手合法出牌（PASS 为 ""）
+    ["x", room_id]                                                      房间被清理，之后不再恢复
+座位号 = PLAYER_IDS 下标。
+
+- 事件循环里只是拼一行字符串放进内存队列；后台线程成批写入，每批一次 fsync（group commit）
+  一批最多等 flush_interval 秒，因此崩溃时最多丢最后这一小段时间内的记录
+- 启动时 recover()：逐行回放，只恢复每个房间最新一局里还没结束的对局；
+  随后把日志压缩成只包含这些对局的新文件（原子替换）
+- 运行中文件超过 compact_bytes 时，写线程用同一套压缩逻辑就地压缩：每个房间只留最新一局
+  （还不知道它是否结束，留到下次开局 / 房间被清理 / 重启时再处理），长期运行的服务日志也不会无限增长
+- 压缩时丢掉的对局（已结束 / 被新一局覆盖 / 房间被清理）如果给了 archive_dir，
+  先转存成回放文件（app.game.replay 格式），线上对局也能进离线分析 / 训练；
+  运行中压缩的转存放在单独的线程里，不耽误写日志
+- 最后一行可能因为崩溃只写了一半，回放时忽略解析失败的行
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.game.constants import PLAYER_IDS
+from app.game.deck import card_id, cards_from_ids
+from app.game.replay import REPLAY_SUFFIX, ReplayGame, ReplayWriter, record_from_state
+from app.utils.logger import logger
+from app.utils.metrics import registry
+
+
+JOURNAL_NAME = "game_journal.jsonl"
+FLUSH_INTERVAL = 0.05   # 一批最多攒这么久再 fsync
+MAX_BATCH = 4096        # 一批最多这么多行
+COMPACT_BYTES = 32 * 1024 * 1024   # 运行中日志超过这么大就压缩一次
+
+_SEAT = {pid: i for i, pid in enumerate(PLAYER_IDS)}
+
+JOURNAL_RECORDS = registry.counter("doudizhu_journal_records_total", "写入对局日志的记录数")
+JOURNAL_FSYNC_SECONDS = registry.histogram(
+    "doudizhu_journal_fsync_seconds", "对局日志每批 write + fsync 耗时"
+)
+JOURNAL_COMPACTIONS = registry.counter("doudizhu_journal_compactions_total", "运行中压缩对局日志的次数")
+
+
+def _hex(cards) -> str:
+    return bytes(card_id(c) for c in cards).hex()
+
+
+def _cards(hex_ids: str):
+    return cards_from_ids(bytes.fromhex(hex_ids))
+
+
+def _game_lines(room_id: str, game) -> List[str]:
+    """一局（_load 返回的四元组） -> 日志行（不含换行）"""
+    game_no, landlord_seat, deck_hex, actions = game
+    lines = [json.dumps(["d", room_id, game_no, landlord_seat, deck_hex], separators=(",", ":"))]
+    lines.extend(
+        json.dumps(["a", room_id, game_no, seat, ids], separators=(",", ":")) for seat, ids in actions
+    )
+    return lines
+
+
+class GameJournal:
+    def __init__(self, path: Path, flush_interval: float = FLUSH_INTERVAL,
+                 archive_dir: Optional[Path] = None, compact_bytes: int = COMPACT_BYTES):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.archive_dir = archive_dir
+        self.compact_bytes = compact_bytes
+        self._compact_at = compact_bytes
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._archiver: Optional[threading.Thread] = None
+        self._file = None
+
+    # ---------------------------------------------------------
+    # 写入（事件循环线程调用，不阻塞）
+    # ---------------------------------------------------------
+    def deal(self, room_id: str, game_no: int, landlord_id: str, deck) -> None:
+        self._put(["d", room_id, game_no, _SEAT[landlord_id], _hex(deck)])
+
+    def action(self, room_id: str, game_no: int, player_id: str, cards) -> None:
+        self._put(["a", room_id, game_no, _SEAT[player_id], _hex(cards)])
+
+    def drop(self, room_id: str) -> None:
+        self._put(["x", room_id])
+
+    def _put(self, record: List) -> None:
+        self._queue.put(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    # ---------------------------------------------------------
+    # 后台写线程
+    # ---------------------------------------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="game-journal", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """写完队列里剩下的记录再返回（应用关闭时调用）"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        self._file = None
+        if self._archiver is not None:
+            self._archiver.join()
+            self._archiver = None
+
+    def _run(self) -> None:
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            batch = [line]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < MAX_BATCH:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    line = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if line is None:
+                    stop = True
+                    break
+                batch.append(line)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[str]) -> None:
+        t0 = time.perf_counter()
+        try:
+            self._file.write("".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error("Journal write failed (%d records lost): %s", len(batch), e)
+            return
+        JOURNAL_FSYNC_SECONDS.observe(time.perf_counter() - t0)
+        JOURNAL_RECORDS.inc(len(batch))
+        if self._file.tell() >= self._compact_at:
+            self._compact_live()
+
+    # ---------------------------------------------------------
+    # 运行中压缩（写线程调用：文件只有这个线程在写，读到的就是全部已写入的记录）
+    # ---------------------------------------------------------
+    def _compact_live(self) -> None:
+        t0 = time.perf_counter()
+        size = self._file.tell()
+        games, retired = self._load()
+        self._file.close()
+        try:
+            self._compact([line for room_id, game in games.items() for line in _game_lines(room_id, game)])
+        except OSError as e:
+            logger.error("Journal compaction failed: %s", e)
+        self._file = open(self.path, "a", encoding="utf-8")
+        # 压缩后还很大（活跃房间本身就多）时放宽阈值，避免每批都压缩一次
+        self._compact_at = max(self.compact_bytes, 2 * self._file.tell())
+        JOURNAL_COMPACTIONS.inc()
+        logger.info(
+            "Journal: compacted %s %d -> %d bytes (%d room(s) kept, %d game(s) retired) in %.2fs",
+            self.path, size, self._file.tell(), len(games), len(retired), time.perf_counter() - t0,
+        )
+
+        if self.archive_dir is not None and retired:
+            if self._archiver is not None:
+                self._archiver.join()
+            self._archiver = threading.Thread(
+                target=self._archive_retired, args=(retired,), name="game-journal-archive", daemon=True,
+            )
+            self._archiver.start()
+
+    def _archive_retired(self, retired) -> None:
+        try:
+            self._archive([g for g in map(self._replay_game, retired) if g is not None], self.archive_dir)
+        except Exception as e:
+            logger.error("Journal: archiving %d retired game(s) failed: %r", len(retired), e)
+
+    # ---------------------------------------------------------
+    # 启动恢复
+    # ---------------------------------------------------------
+    def recover(self, registry, archive_dir: Optional[Path] = None) -> int:
+        """
+        回放日志，把还没结束的对局恢复进 registry（RoomRegistry），然后压缩日志。
+        必须在 start() 之前调用。返回恢复的房间数。archive_dir 不传时用构造时给的。
+        """
+        if archive_dir is None:
+            archive_dir = self.archive_dir
+        games, retired = self._load()
+        restored = 0
+        kept: List[str] = []
+        archive: List[ReplayGame] = [g for g in map(self._replay_game, retired) if g is not None]
+        for room_id, game in games.items():
+            game_no, landlord_seat, deck_hex, actions = game
+            room = registry.get_or_create(room_id)
+            ok = room.restore(
+                game_no,
+                _cards(deck_hex),
+                PLAYER_IDS[landlord_seat],
+                [(PLAYER_IDS[seat], _cards(ids)) for seat, ids in actions],
+            )
+            if not ok or room.state.game_over:
+                if ok:
+                    archive.append(record_from_state(room.state))
+                registry.remove(room_id)
+                continue
+            restored += 1
+            kept.extend(_game_lines(room_id, game))
+
+        if archive_dir is not None:
+            self._archive(archive, archive_dir)
+
+        self._compact(kept)
+        if restored:
+            logger.info("Journal: restored %d in-progress game(s) from %s", restored, self.path)
+        return restored
+
+    @staticmethod
+    def _archive(archive: List[ReplayGame], archive_dir: Path) -> None:
+        if not archive:
+            return
+        stem = f"journal-{time.strftime('%Y%m%d-%H%M%S')}"
+        path = Path(archive_dir) / f"{stem}{REPLAY_SUFFIX}"
+        n = 1
+        while path.exists():
+            # 同一秒里又压缩了一次：不覆盖已有的归档
+            path = Path(archive_dir) / f"{stem}-{n}{REPLAY_SUFFIX}"
+            n += 1
+        with ReplayWriter(path) as writer:
+            for game in archive:
+                writer.add(game)
+        logger.info("Journal: archived %d finished game(s) to %s", len(archive), path)
+
+    @staticmethod
+    def _replay_game(game) -> Optional[ReplayGame]:
+        """日志里的一局 -> ReplayGame（在裁判上重放以得到胜负 / 倍数）；没有出牌或重放失败时返回 None"""
+        _, landlord_seat, deck_hex, actions = game
+        if not actions:
+            return None
+        replay = ReplayGame(
+            bytes.fromhex(deck_hex), landlord_seat,
+            actions=[(seat, bytes.fromhex(ids)) for seat, ids in actions],
+        )
+        try:
+            state = replay.to_dealer().state
+        except ValueError:
+            return None
+        return record_from_state(state)
+
+    def _load(self):
+        """
+        返回 (games, retired)：
+            games   room_id -> (game_no, landlord_seat, deck_hex, [(seat, ids_hex)])，每个房间的最新一局
+            retired 被新一局覆盖、或房间已被清理的对局（同样的四元组）
+        """
+        games: Dict[str, Tuple[int, int, str, List]] = {}
+        retired: List[Tuple[int, int, str, List]] = []
+        if not self.path.exists():
+            return games, retired
+        bad = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    kind, room_id = rec[0], rec[1]
+                except (ValueError, IndexError):
+                    bad += 1
+                    continue
+                if kind == "d":
+                    if room_id in games:
+                        retired.append(games[room_id])
+                    games[room_id] = (rec[2], rec[3], rec[4], [])
+                elif kind == "a":
+                    game = games.get(room_id)
+                    if game is not None and game[0] == rec[2]:
+                        game[3].append((rec[3], rec[4]))
+                elif kind == "x":
+                    if room_id in games:
+                        retired.append(games.pop(room_id))
+        if bad:
+            logger.warning("Journal: skipped %d unreadable line(s) in %s", bad, self.path)
+        return games, retired
+
+    def _compact(self, lines: List[str]) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的二进制对局回放格式（离线分析 / 训练数据用）
+
+一局 = 开局发牌 + 按顺序的出牌流：
+    <BBHH  landlord_seat, winner(0=地主 1=农民 0xFF=未结束), multiplier, 出牌数
+    54 字节 deal：DealerReferee.deal_order() 的发牌顺序（card_id），human/bot1/bot2 各 17 + 底牌 3
+    每手 1 字节 (seat << 6 | 张数) + 张数个 card_id，PASS 为 0 张
+座位号 = PLAYER_IDS 下标；card_id 见 app.game.deck。一局通常 100~200 字节，压缩后 1/3 左右。
+
+文件（.ddzr）：
+    文件头 <4sHH  "DDZR", 版本, 保留
+    若干 chunk：<4sIII "DDZC", 压缩长度, 原始长度, 局数 + zlib(若干局首尾相接)
+    索引：每个 chunk 一条 <QIIIQ  payload 偏移, 压缩长度, 原始长度, 局数, 首局序号
+    文件尾 <QIQ4s  索引偏移, chunk 数, 总局数, "DDZI"
+- 写入时先写 .tmp，close() 写完索引后原子改名；没有正常关闭的文件没有索引，读取时顺序扫描 chunk 头重建
+- 读取用 mmap：只有正在解压的那个 chunk 会被读进内存，可以顺序扫过上百万局
+
+示例：
+    python -m app.game.replay info data/replays/*.ddzr
+    python -m app.game.replay dump data/replays/selfplay.ddzr --limit 3
+"""
+
+import argparse
+import bisect
+import glob
+import mmap
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.game.constants import PLAYER_IDS
+from app.game.deck import DECK_SIZE, card_id, cards_from_ids
+
+
+FILE_MAGIC = b"DDZR"
+CHUNK_MAGIC = b"DDZC"
+INDEX_MAGIC = b"DDZI"
+FORMAT_VERSION = 1
+REPLAY_SUFFIX = ".ddzr"
+
+CHUNK_GAMES = 4096        # 每个 chunk 最多这么多局
+COMPRESS_LEVEL = 6
+
+NO_WINNER = 0xFF
+_WINNER = {"landlord": 0, "farmers": 1}
+_WINNER_NAME = {v: k for k, v in _WINNER.items()}
+_SEAT = {pid: i for i, pid in enumerate(PLAYER_IDS)}
+
+_FILE_HEADER = struct.Struct("<4sHH")
+_CHUNK_HEADER = struct.Struct("<4sIII")
+_INDEX_ENTRY = struct.Struct("<QIIIQ")
+_FOOTER = struct.Struct("<QIQ4s")
+_GAME = struct.Struct("<BBHH")
+
+
+# ---------------------------------------------------------
+# 单局
+# ---------------------------------------------------------
+class ReplayGame:
+    __slots__ = ("deal", "landlord_seat", "winner", "multiplier", "actions")
+
+    def __init__(self, deal: bytes, landlord_seat: int, winner: int = NO_WINNER, multiplier: int = 1,
+                 actions: Optional[List[Tuple[int, bytes]]] = None):
+        self.deal = deal                  # 54 个 card_id
+        self.landlord_seat = landlord_seat
+        self.winner = winner
+        self.multiplier = multiplier
+        self.actions = actions if actions is not None else []   # [(seat, card_id bytes)]
+
+    @property
+    def landlord_id(self) -> str:
+        return PLAYER_IDS[self.landlord_seat]
+
+    @property
+    def winner_side(self) -> Optional[str]:
+        return _WINNER_NAME.get(self.winner)
+
+    def deck(self):
+        return cards_from_ids(self.deal)
+
+    def moves(self) -> Iterator[Tuple[str, list]]:
+        """(player_id, [Card]) 流"""
+        for seat, ids in self.actions:
+            yield PLAYER_IDS[seat], cards_from_ids(ids)
+
+    def to_dealer(self, dealer=None):
+        """在裁判上重放整局（逐手校验），返回 DealerReferee；有一手不合法时抛 ValueError。"""
+        if dealer is None:
+            from app.game.dealer import DealerReferee
+            dealer = DealerReferee()
+        dealer.restore_game(self.deck(), self.landlord_id)
+        for pid, cards in self.moves():
+            ok, err = dealer.play_cards(pid, cards)
+            if not ok:
+                raise ValueError(f"illegal move in replay: {pid} {err}")
+        return dealer
+
+    def encode(self) -> bytes:
+        parts = [_GAME.pack(self.landlord_seat, self.winner, self.multiplier, len(self.actions)), self.deal]
+        for seat, ids in self.actions:
+            parts.append(bytes((seat << 6 | len(ids),)))
+            parts.append(ids)
+        return b"".join(parts)
+
+    def __repr__(self) -> str:
+        return (f"ReplayGame(landlord={self.landlord_id}, winner={self.winner_side}, "
+                f"multiplier={self.multiplier}, actions={len(self.actions)})")
+
+
+def decode_games(raw: bytes) -> List[ReplayGame]:
+    """解压后的 chunk -> [ReplayGame]"""
+    games = []
+    pos = 0
+    end = len(raw)
+    unpack = _GAME.unpack_from
+    while pos < end:
+        landlord, winner, multiplier, n = unpack(raw, pos)
+        pos += _GAME.size
+        deal = raw[pos:pos + DECK_SIZE]
+        pos += DECK_SIZE
+        actions = []
+        for _ in range(n):
+            head = raw[pos]
+            k = head & 0x3F
+            actions.append((head >> 6, raw[pos + 1:pos + 1 + k]))
+            pos += 1 + k
+        games.append(ReplayGame(deal, landlord, winner, multiplier, actions))
+    return games
+
+
+def record_from_state(state) -> ReplayGame:
+    """
+    GameState（含 history）-> ReplayGame。
+    开局手牌 = 剩余手牌 + 打出去的牌（地主再去掉底牌），所以对局进行到任何时候都能转换。
+    """
+    played = {pid: [] for pid in PLAYER_IDS}
+    actions = []
+    for rec in state.history:
+        ids = bytes(card_id(c) for c in rec.cards)
+        actions.append((_SEAT[rec.player_id], ids))
+        played[rec.player_id].extend(ids)
+
+    bottom = [card_id(c) for c in state.bottom_cards]
+    deal = []
+    for pid in PLAYER_IDS:
+        ids = played[pid] + [card_id(c) for c in state.players[pid].hand]
+        if pid == state.landlord_id:
+            for i in bottom:
+                ids.remove(i)
+        deal.extend(sorted(ids))
+    deal.extend(bottom)
+    if len(deal) != DECK_SIZE:
+        raise ValueError(f"cannot rebuild deal from state ({len(deal)} cards)")
+
+    winner = _WINNER[state.winner_side] if state.game_over else NO_WINNER
+    return ReplayGame(bytes(deal), _SEAT[state.landlord_id], winner, state.multiplier, actions)
+
+
+# ---------------------------------------------------------
+# 写入
+# ---------------------------------------------------------
+class ReplayWriter:
+    """
+    with ReplayWriter("data/replays/x.ddzr") as w:
+        w.add_state(dealer.state)
+    """
+
+    def __init__(self, path, chunk_games: int = CHUNK_GAMES, level: int = COMPRESS_LEVEL):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.chunk_games = chunk_games
+        self.level = level
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.tmp_path, "wb")
+        self._f.write(_FILE_HEADER.pack(FILE_MAGIC, FORMAT_VERSION, 0))
+        self._buf = bytearray()
+        self._buf_games = 0
+        self._index: List[Tuple[int, int, int, int, int]] = []
+        self.games = 0
+        self.raw_bytes = 0
+
+    def add(self, game: ReplayGame) -> None:
+        self.add_encoded(game.encode())
+
+    def add_state(self, state) -> None:
+        self.add(record_from_state(state))
+
+    def add_encoded(self, data: bytes) -> None:
+        """已经 encode() 好的一局（多进程 worker 里编码，主进程只负责写）"""
+        self._buf += data
+        self._buf_games += 1
+        if self._buf_games >= self.chunk_games:
+            self._flush_chunk()
+
+    def _flush_chunk(self) -> None:
+        if not self._buf_games:
+            return
+        raw = bytes(self._buf)
+        payload = zlib.compress(raw, self.level)
+        self._f.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, len(payload), len(raw), self._buf_games))
+        offset = self._f.tell()
+        self._f.write(payload)
+        self._index.append((offset, len(payload), len(raw), self._buf_games, self.games))
+        self.games += self._buf_games
+        self.raw_bytes += len(raw)
+        self._buf = bytearray()
+        self._buf_games = 0
+
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._flush_chunk()
+        index_offset = self._f.tell()
+        for entry in self._index:
+            self._f.write(_INDEX_ENTRY.pack(*entry))
+        self._f.write(_FOOTER.pack(index_offset, len(self._index), self.games, INDEX_MAGIC))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        self._f = None
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+# ---------------------------------------------------------
+# 读取
+# ---------------------------------------------------------
+class ReplayReader:
+    """
+    for game in ReplayReader(path): ...
+    按 chunk 处理（多 worker 切分用）：reader.num_chunks / reader.chunk(i)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = _FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"not a replay file: {self.path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"unsupported replay version {version}: {self.path}")
+        self.index = self._read_index()
+        self._firsts = [entry[4] for entry in self.index]
+        self.num_games = sum(entry[3] for entry in self.index)
+
+    def _read_index(self) -> List[Tuple[int, int, int, int, int]]:
+        size = len(self._mm)
+        if size >= _FILE_HEADER.size + _FOOTER.size:
+            index_offset, n_chunks, _, magic = _FOOTER.unpack_from(self._mm, size - _FOOTER.size)
+            if magic == INDEX_MAGIC:
+                return [_INDEX_ENTRY.unpack_from(self._mm, index_offset + i * _INDEX_ENTRY.size)
+                        for i in range(n_chunks)]
+        return self._scan()
+
+    def _scan(self) -> List[Tuple[int, int, int, int, int]]:
+        """没有索引（写入中途退出）：顺序扫描 chunk 头；末尾不完整的 chunk 丢弃"""
+        index = []
+        pos = _FILE_HEADER.size
+        first = 0
+        size = len(self._mm)
+        while pos + _CHUNK_HEADER.size <= size:
+            magic, clen, rlen, n = _CHUNK_HEADER.unpack_from(self._mm, pos)
+            offset = pos + _CHUNK_HEADER.size
+            if magic != CHUNK_MAGIC or offset + clen > size:
+                break
+            index.append((offset, clen, rlen, n, first))
+            first += n
+            pos = offset + clen
+        return index
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self.index)
+
+    def __len__(self) -> int:
+        return self.num_games
+
+    def chunk(self, i: int) -> List[ReplayGame]:
+        offset, clen, _, _, _ = self.index[i]
+        return decode_games(zlib.decompress(self._mm[offset:offset + clen]))
+
+    def __iter__(self) -> Iterator[ReplayGame]:
+        for i in range(len(self.index)):
+            yield from self.chunk(i)
+
+    def game(self, n: int) -> ReplayGame:
+        """按全局序号随机访问（解压所在的整个 chunk）"""
+        if not 0 <= n < self.num_games:
+            raise IndexError(n)
+        i = bisect.bisect_right(self._firsts, n) - 1
+        return self.chunk(i)[n - self._firsts[i]]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def expand_paths(paths: Sequence[str]) -> List[Path]:
+    """文件 / 目录 / 通配符 -> 排好序的 .ddzr 文件列表"""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(sorted(Path(p).glob(f"*{REPLAY_SUFFIX}")))
+        elif any(ch in p for ch in "*?["):
+            out.extend(Path(x) for x in sorted(glob.glob(p)))
+        else:
+            out.append(Path(p))
+    return out
+
+
+def iter_replays(paths: Iterable) -> Iterator[ReplayGame]:
+    for path in expand_paths([str(p) for p in paths]):
+        with ReplayReader(path) as reader:
+            yield from reader
+
+
+# ---------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------
+def _cmd_info(args) -> None:
+    total_games = 0
+    total_bytes = 0
+    t0 = time.perf_counter()
+    for path in expand_paths(args.paths):
+        with ReplayReader(path) as reader:
+            size = path.stat().st_size
+            raw = sum(entry[2] for entry in reader.index)
+            actions = winners = 0
+            for game in reader:
+                actions += len(game.actions)
+                winners += game.winner == _WINNER["landlord"]
+            n = len(reader)
+            print(
+                f"{path}: {n} games, {reader.num_chunks} chunks, {size} bytes "
+                f"({size / max(n, 1):.1f} B/game, raw {raw / max(n, 1):.1f} B/game), "
+                f"{actions / max(n, 1):.1f} actions/game, landlord wins {winners / max(n, 1):.1%}"
+            )
+            total_games += n
+            total_bytes += size
+    elapsed = time.perf_counter() - t0
+    print(f"total: {total_games} games, {total_bytes} bytes, read {total_games / max(elapsed, 1e-9):.0f} games/s")
+
+
+def _cmd_dump(args) -> None:
+    from app.utils.helpers import cards_to_str
+
+    shown = 0
+    for game in iter_replays(args.paths):
+        print(game)
+        for pid, cards in game.moves():
+            print(f"    {pid}: {cards_to_str(cards)}")
+        shown += 1
+        if shown >= args.limit:
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对局回放文件工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("info", help="统计局数 / 大小 / 读取速度")
+    p.add_argument("paths", nargs="+")
+    p.set_defaults(func=_cmd_info)
+    p = sub.add_parser("dump", help="打印前几局")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--limit", type=int, default=1)
+    p.set_defaults(func=_cmd_dump)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
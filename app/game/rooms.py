@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+房间：每个 room_id 一个独立的 DealerReferee
+
+- ws_game 按 room_id 取房间，在房间自己的裁判上开局 / 出牌
+- 每次局面变化调用 touch()，version 递增；admin 接口的快照按 version 缓存，ETag 也由它生成
+- 每一手出牌通过 record_move() 以增量事件的形式发给订阅者（admin SSE、观战连接），有订阅者时才编码
+- 玩家和观战者都断开、且空闲超过 ROOM_IDLE_TTL 秒的房间在创建新房间时顺带清理
+- 挂了对局日志（GameJournal）时，开局和每一手都记一条；重启后由日志 restore() 回来
+"""
+
+import json
+import time
+from typing import Dict, List, Optional
+
+from app.game.dealer import DealerReferee
+from app.utils.broadcast import Broadcaster, Event
+from app.utils.helpers import cards_to_str
+from app.utils.logger import logger
+
+
+ROOM_IDLE_TTL = 600.0
+
+
+class Room:
+    def __init__(self, room_id: str, journal=None):
+        self.room_id = room_id
+        self.journal = journal
+        self.dealer = DealerReferee()
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # 房间实例标识（微秒级创建时间）：同一 room_id 被清理后重建、或服务重启后，version 会从头计数，
+        # ETag 带上它才不会和旧实例的 ETag 撞上
+        self.instance = f"{int(self.created_at * 1_000_000):x}"
+        self.connections = 0
+        self.spectators = 0
+        self.game_no = 0      # 第几局（start_new_game 时 +1）
+        self.version = 0      # 每次局面变化 +1，跨局单调递增
+        self._snapshot = None  # (version, etag, body_bytes)
+        self.events = Broadcaster()
+
+    # ---------------------------------------------------------
+    def start_new_game(self, **kwargs) -> None:
+        self.dealer.start_new_game(**kwargs)
+        self.game_no += 1
+        self.touch()
+        if self.journal is not None:
+            self.journal.deal(self.room_id, self.game_no, self.state.landlord_id, self.dealer.deal_order())
+        if self.events.subscribers:
+            self.events.publish(Event(self.version, "new_game", self.public_state()))
+
+    def touch(self) -> None:
+        self.version += 1
+        self.updated_at = time.time()
+
+    def record_move(self, player_id: str, cards) -> None:
+        """一手合法出牌 / PASS 之后调用"""
+        self.touch()
+        if self.journal is not None:
+            self.journal.action(self.room_id, self.game_no, player_id, cards)
+        if self.events.subscribers:
+            self.events.publish(Event(self.version, "move", self.move_diff(player_id, cards)))
+
+    def move_diff(self, player_id: str, cards) -> Dict:
+        state = self.state
+        return {
+            "seq": self.version,
+            "game_no": self.game_no,
+            "player_id": player_id,
+            "action_type": "play" if cards else "pass",
+            "cards": [c.dict() for c in cards],
+            "cards_str": cards_to_str(cards),
+            "hand_counts": state.hands_left(),
+            "current_turn": state.current_turn,
+            "multiplier": state.multiplier,
+            "game_over": state.game_over,
+            "winner_side": state.winner_side,
+        }
+
+    def restore(self, game_no: int, deck, landlord_id: str, actions) -> bool:
+        """
+        从日志恢复一局：按记录的发牌顺序开局，再依次重放出牌。
+        重放中有一手不合法（日志和代码版本不一致等）时返回 False。
+        """
+        self.dealer.restore_game(deck, landlord_id)
+        self.game_no = game_no
+        for player_id, cards in actions:
+            ok, err = self.dealer.play_cards(player_id, cards)
+            if not ok:
+                logger.warning("Journal replay failed room_id=%s game_no=%s: %s", self.room_id, game_no, err)
+                return False
+        self.version += len(actions)
+        self.touch()
+        return True
+
+    @property
+    def in_progress(self) -> bool:
+        """已经开过局且还没结束（断线重连时续局）"""
+        return self.game_no > 0 and not self.state.game_over
+
+    @property
+    def state(self):
+        return self.dealer.state
+
+    # ---------------------------------------------------------
+    def summary(self) -> Dict:
+        state = self.state
+        return {
+            "room_id": self.room_id,
+            "connections": self.connections,
+            "spectators": self.spectators,
+            "game_no": self.game_no,
+            "version": self.version,
+            "landlord_id": state.landlord_id,
+            "current_turn": state.current_turn,
+            "hand_counts": state.hands_left(),
+            "moves": len(state.history),
+            "multiplier": state.multiplier,
+            "game_over": state.game_over,
+            "winner_side": state.winner_side,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def public_state(self) -> Dict:
+        """观战者能看到的局面：不含任何人的手牌"""
+        data = self.summary()
+        data["bottom_cards"] = [c.dict() for c in self.state.bottom_cards]
+        data["history"] = self.history_entries(0)
+        return data
+
+    def full_state(self) -> Dict:
+        """与 /admin/state 相同的结构"""
+        state = self.state
+        players_info = {}
+        for pid, ps in state.players.items():
+            players_info[pid] = {
+                "role": ps.role.value,
+                "hand_count": len(ps.hand),
+                "hand": [c.dict() for c in ps.hand],
+            }
+
+        return {
+            "players": players_info,
+            "bottom_cards": [c.dict() for c in state.bottom_cards],
+            "landlord_id": state.landlord_id,
+            "current_turn": state.current_turn,
+            "history": self.history_entries(0),
+            "multiplier": state.multiplier,
+            "game_over": state.game_over,
+            "winner_side": state.winner_side,
+        }
+
+    def history_entries(self, start: int, end: Optional[int] = None) -> List[Dict]:
+        return [
+            {"player_id": r.player_id, "cards": cards_to_str(r.cards), "action_type": r.action_type}
+            for r in self.state.history[start:end]
+        ]
+
+    def etag(self) -> str:
+        return f'"{self.room_id}-{self.instance}-{self.version}"'
+
+    def snapshot(self):
+        """
+        返回 (etag, JSON bytes)。同一 version 只序列化一次，直到下一次 touch()。
+        """
+        cached = self._snapshot
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+        body = json.dumps(self.full_state(), ensure_ascii=False).encode("utf-8")
+        self._snapshot = (self.version, self.etag(), body)
+        return self._snapshot[1], body
+
+
+class RoomRegistry:
+    def __init__(self, idle_ttl: float = ROOM_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self.journal = None
+        self._rooms: Dict[str, Room] = {}
+
+    def attach_journal(self, journal) -> None:
+        """之后开局 / 出牌都写进 journal（已有的房间也一起挂上）"""
+        self.journal = journal
+        for room in self._rooms.values():
+            room.journal = journal
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self._rooms.get(room_id)
+
+    def get_or_create(self, room_id: str) -> Room:
+        room = self._rooms.get(room_id)
+        if room is None:
+            self.prune()
+            room = Room(room_id, self.journal)
+            self._rooms[room_id] = room
+        return room
+
+    def remove(self, room_id: str) -> None:
+        self._rooms.pop(room_id, None)
+
+    def list(self) -> List[Room]:
+        return sorted(self._rooms.values(), key=lambda r: r.updated_at, reverse=True)
+
+    def latest(self) -> Optional[Room]:
+        if not self._rooms:
+            return None
+        return max(self._rooms.values(), key=lambda r: r.updated_at)
+
+    def prune(self) -> int:
+        """清理没有连接且空闲超过 idle_ttl 的房间，返回清理数量。"""
+        cutoff = time.time() - self.idle_ttl
+        stale = [
+            rid for rid, r in self._rooms.items()
+            if r.connections == 0 and r.spectators == 0 and r.updated_at < cutoff
+        ]
+        for rid in stale:
+            del self._rooms[rid]
+            if self.journal is not None:
+                self.journal.drop(rid)
+        return len(stale)
+
+
+# 进程内唯一的房间表
+rooms = RoomRegistry()
@@ -1,10 +1,38 @@
 # -*- coding: utf-8 -*-
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import http_misc, http_admin, ws_game, http_role
+from app.api import http_misc, http_admin, ws_game, ws_spectate, http_role
+from app.config import DATA_DIR, GAME_JOURNAL_ENABLED, REPLAY_DIR
+from app.game.journal import JOURNAL_NAME, GameJournal
+from app.game.rooms import rooms
+from app.utils.metrics import monitor_event_loop_lag
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 先回放对局日志恢复进行中的对局，再开始记录新的
+    journal = None
+    if GAME_JOURNAL_ENABLED:
+        journal = GameJournal(DATA_DIR / JOURNAL_NAME, archive_dir=REPLAY_DIR)
+        journal.recover(rooms)
+        rooms.attach_journal(journal)
+        journal.start()
+
+    # 后台测量事件循环延迟（/metrics 中的 doudizhu_event_loop_lag_seconds）
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
+    try:
+        yield
+    finally:
+        lag_task.cancel()
+        if journal is not None:
+            journal.close()
+
 
-app = FastAPI(title="DouDiZhuAI")
+app = FastAPI(title="DouDiZhuAI", lifespan=lifespan)
 
 # 简单放开 CORS，方便前端本地调试
 app.add_middleware(
@@ -19,6 +47,7 @@ app.add_middleware(
 app.include_router(http_misc.router)
 app.include_router(http_admin.router)
 app.include_router(ws_game.router)
+app.include_router(ws_spectate.router)
 
 # 新加的人类身份配置路由
 app.include_router(http_role.router)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+一对多事件分发（序列化一次，所有订阅者共用）
+
+- publish() 时把事件 JSON 编码一次；SSE / WebSocket 帧也只在第一次用到时拼一次
+- 每个订阅者一个有界队列；队列满说明对方太慢：清空队列并标记 overflowed，
+  由消费方补发一次全量（resync），绝不阻塞发布方
+- 只在事件循环线程里使用
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Set
+
+
+DEFAULT_QUEUE_SIZE = 256
+
+
+class Event:
+    __slots__ = ("seq", "kind", "text", "_sse", "_frame")
+
+    def __init__(self, seq: int, kind: str, payload: Dict):
+        self.seq = seq
+        self.kind = kind
+        self.text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        self._sse: Optional[str] = None
+        self._frame: Optional[str] = None
+
+    @property
+    def sse(self) -> str:
+        if self._sse is None:
+            self._sse = f"id: {self.seq}\nevent: {self.kind}\ndata: {self.text}\n\n"
+        return self._sse
+
+    @property
+    def frame(self) -> str:
+        """WebSocket 文本帧：{"type": kind, "seq": seq, "data": payload}"""
+        if self._frame is None:
+            self._frame = f'{{"type":{json.dumps(self.kind)},"seq":{self.seq},"data":{self.text}}}'
+        return self._frame
+
+
+class Subscription:
+    __slots__ = ("queue", "overflowed", "dropped")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.dropped = 0
+
+    def offer(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = True
+            # 唤醒可能正在等待的消费方，让它尽快发现 overflowed
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """超时返回 None；overflowed 时同样会收到一个 None。"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscription] = set()
+
+    def subscribe(self, queue_size: Optional[int] = None) -> Subscription:
+        sub = Subscription(queue_size or self.queue_size)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.subscribers.discard(sub)
+
+    def publish(self, event: Event) -> None:
+        for sub in self.subscribers:
+            sub.offer(event)
@@ -1,13 +1,133 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from . import __init__ as _  # 只是确保包加载
-from app.config import LOG_DIR
+from app.config import LOG_DIR, LOG_JSON, LOG_ROOM_SAMPLE_RATE, LOG_SAMPLE_RATES
 
 LOG_FILE = LOG_DIR / "app.log"
 
+# 当前房间（ws_game 在每个连接的任务里设置一次；asyncio 任务之间互不影响）
+log_room: ContextVar = ContextVar("log_room", default=None)
+
+_listener = None
+
+
+def set_log_room(room_id) -> None:
+    log_room.set(room_id)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "msg": record.getMessage(),
+        }
+        room_id = getattr(record, "room_id", None)
+        if room_id is not None:
+            payload["room_id"] = room_id
+        # 经过 ExcTextQueueHandler 的记录只剩 exc_text（exc_info 已清空）
+        exc = record.exc_text
+        if record.exc_info and not exc:
+            exc = self.formatException(record.exc_info)
+        if exc:
+            payload["exc"] = exc
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class ExcTextQueueHandler(QueueHandler):
+    """
+    标准 QueueHandler.prepare 会用自己的 formatter 把整条日志（连同 traceback）拼进 msg，
+    再把 exc_info / exc_text 清空，下游的 JsonFormatter 就拿不到异常了。
+    这里只把 msg 和 args 合成好、traceback 单独格式化成 exc_text（traceback 对象不能可靠地跨线程保留），
+    输出成什么样交给 listener 上各 handler 自己的 formatter。
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    挂在 QueueHandler 上：被丢弃的日志连队列都不进。
+    - 给每条日志补上 room_id（来自 log_room）
+    - WARNING 及以上全部保留
+    - INFO 及以下：先按模块、再按房间做 1/N 计数采样（确定性，不用随机数）
+    """
+
+    def __init__(self, module_rates=None, room_rate=1.0):
+        super().__init__()
+        self.module_every = {m: self._every(r) for m, r in (module_rates or {}).items()}
+        self.room_every = self._every(room_rate)
+        self._counts = {}
+
+    @staticmethod
+    def _every(rate):
+        if rate <= 0:
+            return 0  # 全部丢弃
+        return max(1, int(round(1.0 / rate)))
+
+    def _keep(self, key, every):
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        n = self._counts.get(key, 0)
+        self._counts[key] = n + 1
+        return n % every == 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        room_id = log_room.get()
+        record.room_id = room_id
+        if record.levelno >= logging.WARNING:
+            return True
+
+        every = self.module_every.get(record.module)
+        if every is not None and not self._keep(("module", record.module), every):
+            return False
+        if room_id is not None and not self._keep(("room", room_id), self.room_every):
+            return False
+        return True
+
+    def forget_room(self, room_id) -> None:
+        self._counts.pop(("room", room_id), None)
+
+
+def _make_formatter():
+    if LOG_JSON:
+        return JsonFormatter()
+    return logging.Formatter(
+        "[%(asctime)s] [%(levelname)s] %(name)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
 
 def get_logger(name: str = "doudizhu") -> logging.Logger:
+    """
+    调用方只往内存队列里放一条记录；真正的控制台 / 文件写入（以及文件滚动）
+    都在 QueueListener 的后台线程里完成，不会卡住事件循环。
+    """
+    global _listener
+
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
@@ -17,29 +137,37 @@ def get_logger(name: str = "doudizhu") -> logging.Logger:
     # 控制台输出
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_fmt = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] %(name)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    console_handler.setFormatter(console_fmt)
+    console_handler.setFormatter(_make_formatter())
 
     # 文件输出（滚动）
     file_handler = RotatingFileHandler(
         LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8"
     )
     file_handler.setLevel(logging.INFO)
-    file_fmt = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] %(name)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    file_handler.setFormatter(file_fmt)
+    file_handler.setFormatter(_make_formatter())
+
+    # 队列：无界，调用方永远不阻塞
+    log_queue = queue.SimpleQueue()
+    queue_handler = ExcTextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES, LOG_ROOM_SAMPLE_RATE))
+    logger.addHandler(queue_handler)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
 
     logger.info("Logger initialized. Log file: %s", LOG_FILE)
     return logger
 
 
+def sampling_filter():
+    """返回 doudizhu logger 上的采样过滤器（供房间结束时清理计数等）"""
+    for handler in logging.getLogger("doudizhu").handlers:
+        for f in handler.filters:
+            if isinstance(f, SamplingFilter):
+                return f
+    return None
+
+
 # 默认 logger
 logger = get_logger()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标注册表（Prometheus 文本格式，见 GET /metrics）
+
+热路径上只有一次加法 / 一次 bisect，不加锁：
+服务端所有埋点都在事件循环线程里，CPython 下 += 本身也不会把数值写坏，最多在渲染时读到略旧的值。
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# 默认桶（秒）：覆盖 0.1ms ~ 10s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values):
+        """返回对应标签组合的子指标（首次调用时创建，之后是一次字典查找）。"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._new_child()
+            self._children[key] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self):
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(child._render_samples(self.name, self.labelnames, values))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def _render_samples(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+        self._func = func  # 渲染时回调取值（如当前房间数），热路径上零开销
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set_function(self, func) -> None:
+        """改为渲染时回调取值（定义指标的模块拿不到数据源时，由使用方事后挂上）"""
+        self._func = func
+
+    def _render_samples(self, name, labelnames, values):
+        value = self._func() if self._func is not None else self.value
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def _render_samples(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), func=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, func))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+registry = Registry()
+
+
+# ---------------------------------------------------------
+# 游戏服务的指标
+# ---------------------------------------------------------
+WS_CONNECTIONS = registry.gauge("doudizhu_ws_connections", "当前打开的游戏 WebSocket 连接数")
+GAMES_STARTED = registry.counter("doudizhu_games_started_total", "已开局数")
+GAMES_FINISHED = registry.counter(
+    "doudizhu_games_finished_total", "已结束的对局数", labelnames=("winner_side",)
+)
+AI_DECISIONS = registry.counter(
+    "doudizhu_ai_decisions_total", "AI 决策次数（rate() 即每秒决策数）", labelnames=("engine",)
+)
+AI_DECISION_SECONDS = registry.histogram(
+    "doudizhu_ai_choose_action_seconds", "choose_action 耗时", labelnames=("engine",)
+)
+PLAY_CARDS_SECONDS = registry.histogram("doudizhu_play_cards_seconds", "DealerReferee.play_cards 耗时")
+WS_SEND_PENDING = registry.gauge(
+    "doudizhu_ws_send_pending", "各房间下行队列中等待写出的 WebSocket 消息总数（发送积压）"
+)
+WS_SEND_SECONDS = registry.histogram("doudizhu_ws_send_seconds", "单条 WebSocket 消息的发送耗时")
+SPECTATORS = registry.gauge("doudizhu_spectators", "当前观战连接数")
+SPECTATORS_DROPPED = registry.counter(
+    "doudizhu_spectators_dropped_total", "因过慢被断开的观战连接数", labelnames=("reason",)
+)
+SPECTATOR_RESYNCS = registry.counter(
+    "doudizhu_spectator_resyncs_total", "观战队列溢出后合并为一次全量补发的次数"
+)
+EVENT_LOOP_LAG = registry.gauge("doudizhu_event_loop_lag_seconds", "最近一次测得的事件循环延迟")
+EVENT_LOOP_LAG_HIST = registry.histogram(
+    "doudizhu_event_loop_lag_seconds_hist", "事件循环延迟分布"
+)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    每 interval 秒睡一次，实际醒来时间比预期晚多少就是事件循环被阻塞的时长。
+    作为后台任务在应用启动时创建。
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HIST.observe(lag)
+
+
+class timed:
+    """
+    with timed(HISTOGRAM): ...   记录代码块耗时到直方图
+    """
+
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+        self.t0: Optional[float] = None
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+        return False
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+按需采样分析器（不依赖外部工具）
+
+后台线程按固定间隔读取 sys._current_frames()，把各线程的调用栈累计成 collapsed stack 格式：
+    root;child;leaf 次数
+可直接交给 flamegraph.pl / speedscope / inferno 生成火焰图。
+
+- 不启动时没有任何开销（没有钩子、没有埋点）
+- 过滤：
+    ai_only=True   只保留调用栈中含有 choose_action 的样本（AI 决策）
+    rooms={...}    只保留指定房间的样本：执行方用 `with room_scope(room_id):` 声明“这个线程此刻在处理哪个房间”，
+                   采样时按线程查这张表，不去翻栈帧的局部变量
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+
+MAX_DURATION = 300.0      # 单次采样最长秒数
+MIN_INTERVAL = 0.001      # 最小采样间隔（秒）
+AI_DECISION_FUNC = "choose_action"
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 线程 ident -> 该线程当前正在处理的房间（room_scope 维护，采样线程只读）
+_thread_rooms: Dict[int, str] = {}
+
+
+@contextmanager
+def room_scope(room_id: str):
+    """
+    声明当前线程接下来执行的代码属于 room_id，退出时恢复外层的值（可以嵌套）。
+    asyncio 下同一个线程轮流跑多个房间，所以只能包住中间没有 await 的同步片段。
+    """
+    tid = threading.get_ident()
+    previous = _thread_rooms.get(tid)
+    _thread_rooms[tid] = room_id
+    try:
+        yield
+    finally:
+        if previous is None:
+            _thread_rooms.pop(tid, None)
+        else:
+            _thread_rooms[tid] = previous
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    if path.startswith(_ROOT):
+        path = os.path.relpath(path, _ROOT)
+    elif "site-packages" in path:
+        path = path.split("site-packages", 1)[1].lstrip("/\\")
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.matched = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.options: Dict = {}
+
+    # ---------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, interval: float = 0.005, ai_only: bool = False,
+              rooms: Optional[Iterable[str]] = None) -> bool:
+        """开始一次限时采样；已有采样在跑时返回 False。"""
+        with self._lock:
+            if self.running:
+                return False
+            duration = min(max(duration, 0.1), MAX_DURATION)
+            interval = max(interval, MIN_INTERVAL)
+            rooms = set(rooms) if rooms else None
+
+            self.stacks = Counter()
+            self.samples = 0
+            self.matched = 0
+            self.started_at = time.time()
+            self.finished_at = None
+            self.options = {
+                "duration": duration,
+                "interval": interval,
+                "ai_only": ai_only,
+                "rooms": sorted(rooms) if rooms else None,
+            }
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(duration, interval, ai_only, rooms),
+                name="sampling-profiler", daemon=True,
+            )
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "samples": self.samples,
+            "matched": self.matched,
+            "unique_stacks": len(self.stacks),
+            "options": self.options,
+        }
+
+    def collapsed(self) -> str:
+        """collapsed stack 文本（按次数降序）"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    # ---------------------------------------------------------
+    def _run(self, duration, interval, ai_only, rooms):
+        me = threading.get_ident()
+        deadline = time.perf_counter() + duration
+        try:
+            while not self._stop.is_set() and time.perf_counter() < deadline:
+                for tid, frame in sys._current_frames().items():
+                    if tid == me:
+                        continue
+                    self.samples += 1
+                    if rooms is not None and _thread_rooms.get(tid) not in rooms:
+                        continue
+                    stack = self._collect(frame, ai_only)
+                    if stack is not None:
+                        self.matched += 1
+                        self.stacks[stack] += 1
+                self._stop.wait(interval)
+        finally:
+            self.finished_at = time.time()
+
+    @staticmethod
+    def _collect(frame, ai_only) -> Optional[str]:
+        labels = []
+        saw_ai = not ai_only
+        while frame is not None:
+            code = frame.f_code
+            if not saw_ai and code.co_name == AI_DECISION_FUNC:
+                saw_ai = True
+            labels.append(_frame_label(code))
+            frame = frame.f_back
+        if not saw_ai:
+            return None
+        labels.reverse()
+        return ";".join(labels)
+
+
+# 进程内唯一实例（admin 接口使用）
+profiler = SamplingProfiler()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+单次 AI 决策的耗时拆解（span trace）
+
+一次机器人出牌 = 一条 DecisionTrace，依次记录各阶段耗时：
+    get_observation -> movegen -> encode -> queue_wait -> forward -> fallback -> play_cards
+（queue_wait 预留给批量推理队列；没有排队的引擎不会产生这一段）
+
+- 调用方（ws_game）用 `with tracer.trace(...)` 包住一次决策（等价于 begin() + try/finally finish()）；
+  即使引擎抛异常，当前 trace 也会被复原，不会残留在上下文里让之后的 span 挂错地方
+- 引擎内部用 `with span("encode"):` 打点；当前没有进行中的 trace 时只是一次 ContextVar 读取
+- 最近 capacity 条保存在环形缓冲区里，另外单独保留总耗时最慢的 slowest_n 条
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+STAGES = (
+    "get_observation",
+    "movegen",
+    "encode",
+    "queue_wait",
+    "forward",
+    "fallback",
+    "play_cards",
+)
+
+_current: ContextVar = ContextVar("decision_trace", default=None)
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    """秒 -> 毫秒分位数"""
+    if not values:
+        return {f"p{q}": None for q in qs}
+    values = sorted(values)
+    return {
+        f"p{q}": values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))] * 1000.0
+        for q in qs
+    }
+
+
+class DecisionTrace:
+    __slots__ = ("trace_id", "room_id", "player_id", "engine", "started_at", "t0", "spans", "total", "token")
+
+    def __init__(self, trace_id, room_id, player_id, engine):
+        self.trace_id = trace_id
+        self.room_id = room_id
+        self.player_id = player_id
+        self.engine = engine
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List = []   # [(阶段名, 秒)]，按发生顺序
+        self.total = 0.0
+        self.token = None       # begin() 时 ContextVar.set 的 token，finish() 用它复原
+
+    def add(self, name, seconds):
+        self.spans.append((name, seconds))
+
+    def dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "room_id": self.room_id,
+            "player_id": self.player_id,
+            "engine": self.engine,
+            "started_at": self.started_at,
+            "total_ms": self.total * 1000.0,
+            "spans": [{"name": n, "ms": s * 1000.0} for n, s in self.spans],
+        }
+
+
+class span:
+    """with span("forward"): ...   —— 没有进行中的 trace 时什么都不做"""
+
+    __slots__ = ("name", "trace", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+class DecisionTracer:
+    def __init__(self, capacity: int = 2048, slowest_n: int = 50):
+        self.capacity = capacity
+        self.slowest_n = slowest_n
+        self._recent: deque = deque(maxlen=capacity)
+        self._slowest: List = []            # 最小堆 [(total, trace_id, trace)]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()       # admin 接口可能在线程池里读
+
+    def begin(self, room_id: Optional[str], player_id: str, engine: str) -> DecisionTrace:
+        """必须和 finish() 成对调用（放在 try/finally 里）；优先用 trace() 上下文管理器"""
+        trace = DecisionTrace(next(self._ids), room_id, player_id, engine)
+        trace.token = _current.set(trace)
+        return trace
+
+    def finish(self, trace: DecisionTrace) -> None:
+        trace.total = time.perf_counter() - trace.t0
+        if trace.token is not None:
+            _current.reset(trace.token)
+            trace.token = None
+        with self._lock:
+            self._recent.append(trace)
+            item = (trace.total, trace.trace_id, trace)
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, item)
+            elif trace.total > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    @contextmanager
+    def trace(self, room_id: Optional[str], player_id: str, engine: str):
+        """with tracer.trace(room_id, pid, engine): ...   —— 异常时同样结束并记录这条 trace"""
+        trace = self.begin(room_id, player_id, engine)
+        try:
+            yield trace
+        finally:
+            self.finish(trace)
+
+    # ---------------------------------------------------------
+    def recent(self, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            traces = list(self._recent)[-limit:]
+        return [t.dict() for t in reversed(traces)]
+
+    def slowest(self) -> List[Dict]:
+        with self._lock:
+            items = sorted(self._slowest, reverse=True)
+        return [t.dict() for _, _, t in items]
+
+    def summary(self) -> Dict:
+        """环形缓冲区内各阶段的耗时分布（毫秒）"""
+        with self._lock:
+            traces = list(self._recent)
+        by_stage: Dict[str, List[float]] = {}
+        for t in traces:
+            for name, seconds in t.spans:
+                by_stage.setdefault(name, []).append(seconds)
+        order = {name: i for i, name in enumerate(STAGES)}
+        stages = {
+            name: dict(count=len(values), mean=sum(values) / len(values) * 1000.0, **percentiles(values))
+            for name, values in sorted(by_stage.items(), key=lambda kv: order.get(kv[0], len(order)))
+        }
+        totals = [t.total for t in traces]
+        return {
+            "decisions": len(traces),
+            "total": dict(count=len(totals), **percentiles(totals)),
+            "stages": stages,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._slowest = []
+
+
+# 进程内唯一实例
+tracer = DecisionTracer()
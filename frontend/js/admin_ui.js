@@ -47,25 +47,113 @@ function cardIsRed(card) {
     return card.suit === "H" || card.suit === "D";
 }
 
-async function fetchAdminState() {
+// ---------------------------------------------------------
+// 房间选择 + SSE 增量更新（不再每秒轮询整份状态）
+// ---------------------------------------------------------
+let currentRoomId = null;
+let currentState = null;     // 最近一次全量快照，收到增量后原地修改
+let currentSeq = 0;          // 快照 / 已应用增量对应的房间 version
+let eventSource = null;
+
+function adminUrl(path) {
+    const sep = path.includes("?") ? "&" : "?";
+    return `${BACKEND_HTTP_BASE}/admin${path}${sep}token=${encodeURIComponent(ADMIN_TOKEN)}`;
+}
+
+function setStatus(text, ok) {
+    const el = $("admin-refresh-status");
+    el.textContent = "状态：" + text;
+    el.classList.toggle("status-ok", ok);
+    el.classList.toggle("status-bad", !ok);
+}
+
+async function loadRooms() {
     try {
-        const url = `${BACKEND_HTTP_BASE}/admin/state?token=${encodeURIComponent(ADMIN_TOKEN)}`;
-        const res = await fetch(url);
+        const res = await fetch(adminUrl("/rooms"));
         if (!res.ok) {
-            $("admin-refresh-status").textContent = "状态：请求失败 " + res.status;
-            $("admin-refresh-status").classList.add("status-bad");
+            setStatus("房间列表请求失败 " + res.status, false);
             return;
         }
         const data = await res.json();
-        renderAdminState(data);
-        $("admin-refresh-status").textContent = "状态：已刷新 " + new Date().toLocaleTimeString();
-        $("admin-refresh-status").classList.remove("status-bad");
-        $("admin-refresh-status").classList.add("status-ok");
+        const select = $("admin-room-select");
+        select.innerHTML = "";
+        (data.rooms || []).forEach(r => {
+            const opt = document.createElement("option");
+            opt.value = r.room_id;
+            opt.textContent = `${r.room_id}（${r.connections ? "在线" : "离线"}，${r.moves} 手${r.game_over ? "，已结束" : ""}）`;
+            select.appendChild(opt);
+        });
+        if (currentRoomId && (data.rooms || []).some(r => r.room_id === currentRoomId)) {
+            select.value = currentRoomId;
+        } else if (data.rooms && data.rooms.length) {
+            selectRoom(data.rooms[0].room_id);
+        } else {
+            setStatus("暂无房间", true);
+        }
+    } catch (e) {
+        console.error("Admin rooms error:", e);
+        setStatus("错误", false);
+    }
+}
+
+async function fetchRoomState() {
+    if (!currentRoomId) return;
+    try {
+        const res = await fetch(adminUrl(`/rooms/${encodeURIComponent(currentRoomId)}/state`));
+        if (!res.ok) {
+            setStatus("请求失败 " + res.status, false);
+            return;
+        }
+        // ETag 形如 "<room_id>-<instance>-<version>"，version 在最后一段
+        const etag = (res.headers.get("ETag") || "").replace(/"/g, "");
+        currentSeq = parseInt(etag.slice(etag.lastIndexOf("-") + 1), 10) || 0;
+        currentState = await res.json();
+        renderAdminState(currentState);
+        setStatus("已同步 " + new Date().toLocaleTimeString(), true);
     } catch (e) {
         console.error("Admin fetch error:", e);
-        $("admin-refresh-status").textContent = "状态：错误";
-        $("admin-refresh-status").classList.add("status-bad");
+        setStatus("错误", false);
+    }
+}
+
+function applyMove(diff) {
+    if (!currentState || diff.seq <= currentSeq) return;
+    const player = (currentState.players || {})[diff.player_id];
+    if (player && diff.cards.length) {
+        const played = new Set(diff.cards.map(c => c.rank + c.suit));
+        player.hand = (player.hand || []).filter(c => !played.has(c.rank + c.suit));
     }
+    Object.keys(diff.hand_counts).forEach(pid => {
+        if (currentState.players[pid]) currentState.players[pid].hand_count = diff.hand_counts[pid];
+    });
+    currentState.history.push({
+        player_id: diff.player_id,
+        cards: diff.cards_str,
+        action_type: diff.action_type,
+    });
+    currentState.current_turn = diff.current_turn;
+    currentState.multiplier = diff.multiplier;
+    currentState.game_over = diff.game_over;
+    currentState.winner_side = diff.winner_side;
+    currentSeq = diff.seq;
+    renderAdminState(currentState);
+    setStatus("实时 " + new Date().toLocaleTimeString(), true);
+}
+
+function selectRoom(roomId) {
+    if (eventSource) eventSource.close();
+    currentRoomId = roomId;
+    currentState = null;
+    currentSeq = 0;
+    $("admin-room-select").value = roomId;
+
+    eventSource = new EventSource(adminUrl(`/rooms/${encodeURIComponent(roomId)}/events`));
+    // hello / new_game / resync：拉一次全量；move：原地应用增量
+    ["hello", "new_game", "resync"].forEach(kind => {
+        eventSource.addEventListener(kind, fetchRoomState);
+    });
+    eventSource.addEventListener("move", e => applyMove(JSON.parse(e.data)));
+    eventSource.onerror = () => setStatus("连接中断，重连中…", false);
 }
 
 function renderAdminState(data) {
@@ -135,7 +223,7 @@ function renderAdminState(data) {
 }
 
 window.addEventListener("load", () => {
-    // 每秒刷新一次状态
-    fetchAdminState();
-    setInterval(fetchAdminState, 1000);
+    $("admin-room-select").addEventListener("change", e => selectRoom(e.target.value));
+    $("admin-rooms-refresh").addEventListener("click", loadRooms);
+    loadRooms();
 });
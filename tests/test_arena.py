@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+arena 可复现性：同一个 --seed、同样的任务切分，换进程数结果必须一样
+"""
+
+import logging
+
+from app.ai.engine_base import AIEngineBase
+from app.eval.arena import default_lineups, run_arena
+from app.game.dealer_moves import get_valid_moves_from_obs
+
+
+class CountingEngine(AIEngineBase):
+    """
+    带内部状态的测试引擎：按“本局已经决策了几次”轮流挑候选动作。
+    和 smart 的 LSTM 一样，状态要是跨局、跨座位漏过去，结果就会随 worker 的调度变化。
+    """
+
+    def __init__(self, device: str = "cpu") -> None:
+        super().__init__(device)
+        self.turns = 0
+
+    def reset(self) -> None:
+        self.turns = 0
+
+    def choose_action(self, obs):
+        moves = get_valid_moves_from_obs(obs)
+        if not moves:
+            return []
+        self.turns += 1
+        return moves[self.turns % len(moves)]
+
+
+COUNTING = f"{__name__}:CountingEngine"
+
+
+def _outcomes(summary):
+    # 耗时每次都不一样，只比胜负和非法动作
+    return {
+        spec: (e["games"], e["wins"], e["landlord"]["wins"], e["farmer"]["wins"], e["illegal_moves"])
+        for spec, e in summary["engines"].items()
+    }
+
+
+def test_same_seed_is_reproducible_across_worker_counts():
+    logging.disable(logging.CRITICAL)
+    try:
+        lineups = default_lineups([COUNTING, "random"])
+        serial = run_arena(lineups, 80, workers=1, chunk_size=7, seed=11)
+        parallel = run_arena(lineups, 80, workers=3, chunk_size=7, seed=11)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert serial["games"] == parallel["games"] == 80
+    assert _outcomes(serial) == _outcomes(parallel)
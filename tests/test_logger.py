@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+日志队列：异常的 traceback 经过 QueueHandler -> QueueListener 之后仍然要出现在输出里
+"""
+
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from app.utils import logger as logger_mod
+
+
+def _log_exception_through_queue():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logger_mod._make_formatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    log = logging.getLogger("doudizhu.test_logger")
+    log.propagate = False
+    queue_handler = logger_mod.ExcTextQueueHandler(log_queue)
+    queue_handler.addFilter(logger_mod.SamplingFilter())
+    log.addHandler(queue_handler)
+    listener.start()
+    try:
+        try:
+            raise ZeroDivisionError("boom")
+        except ZeroDivisionError:
+            log.exception("step %s failed", 3)
+    finally:
+        listener.stop()
+        log.removeHandler(queue_handler)
+    return stream.getvalue()
+
+
+def test_json_output_keeps_traceback(monkeypatch):
+    monkeypatch.setattr(logger_mod, "LOG_JSON", True)
+    lines = _log_exception_through_queue().splitlines()
+
+    assert len(lines) == 1
+    payload = json.loads(lines[0])
+    assert payload["msg"] == "step 3 failed"
+    assert "Traceback (most recent call last)" in payload["exc"]
+    assert "ZeroDivisionError: boom" in payload["exc"]
+
+
+def test_text_output_keeps_traceback(monkeypatch):
+    monkeypatch.setattr(logger_mod, "LOG_JSON", False)
+    out = _log_exception_through_queue()
+
+    assert "step 3 failed" in out
+    assert "ZeroDivisionError: boom" in out